@@ -0,0 +1,4 @@
+"""
+Offline performance tooling: synthetic fleet data, provider stubs and the
+benchmark runner. Nothing here is imported by the app.
+"""
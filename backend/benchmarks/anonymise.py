@@ -0,0 +1,85 @@
+"""
+Anonymised copy of a database for replaying captured traffic
+
+Copies every collection with the same scrubbing rules as request_capture, so
+ids, dates, numbers and statuses survive while names, phones, emails,
+addresses and free text do not. Personal strings become keyed hashes rather
+than blanks, which keeps unique indexes (emails, registrations) unique.
+
+    python -m benchmarks.anonymise --source-url mongodb://prod-replica --source-db cjbooking \\
+        --target-url mongodb://localhost:27017 --target-db cjs_replay
+"""
+
+import os
+import hmac
+import asyncio
+import hashlib
+import argparse
+
+from benchmarks import harness
+
+BATCH_SIZE = 1000
+# GridFS chunks are PDFs and signatures: nothing the replayed queries need
+SKIPPED_SUFFIXES = (".chunks", ".files")
+
+
+def hashed_mask(key: bytes):
+    def mask(value: str) -> str:
+        digest = hmac.new(key, value.encode(), hashlib.sha256).hexdigest()
+        if "@" in value:
+            return f"{digest[:16]}@example.invalid"
+        return (digest * (len(value) // 64 + 1))[:max(len(value), 8)]
+    return mask
+
+
+async def anonymise(source, target, mask) -> dict:
+    from request_capture import scrub_value
+    copied = {}
+    for name in sorted(await source.list_collection_names()):
+        if name.startswith("system.") or name.endswith(SKIPPED_SUFFIXES):
+            continue
+        await target.drop_collection(name)
+        batch, count = [], 0
+        async for document in source[name].find({}):
+            batch.append(scrub_value(document, mask=mask))
+            if len(batch) >= BATCH_SIZE:
+                await target[name].insert_many(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await target[name].insert_many(batch)
+            count += len(batch)
+        copied[name] = count
+    return copied
+
+
+async def main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from db_indexes import apply_index_manifest
+
+    source_client = AsyncIOMotorClient(args.source_url)
+    target_client = AsyncIOMotorClient(args.target_url)
+    try:
+        target = target_client[args.target_db]
+        copied = await anonymise(source_client[args.source_db], target, hashed_mask(os.urandom(32)))
+        await apply_index_manifest(target)
+    finally:
+        source_client.close()
+        target_client.close()
+    for name, count in copied.items():
+        print(f"{name:32s} {count}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Copy a database with personal data scrubbed")
+    parser.add_argument("--source-url", required=True)
+    parser.add_argument("--source-db", required=True)
+    parser.add_argument("--target-url", default=harness.DEFAULT_MONGO_URL)
+    parser.add_argument("--target-db", default="cjs_replay")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    harness.configure(args.target_db)
+    asyncio.run(main(args))
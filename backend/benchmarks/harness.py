@@ -0,0 +1,244 @@
+"""
+Shared plumbing for the offline performance tools
+
+Points the app at a throwaway database, swaps every outbound provider (Google,
+getAddress, Twilio, Vonage, SMTP) for a canned local answer and drives the
+FastAPI app in-process over ASGI, so the numbers measure our code and Mongo
+rather than third-party latency or the preview deployment's load.
+
+configure() and stub_providers() must run before server is imported: server
+reads its settings and builds its Mongo client at import time.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import smtplib
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+LOCAL_HOST = "bench.local"
+DEFAULT_MONGO_URL = "mongodb://localhost:27017"
+
+# Outbound calls answered by the stubs, by provider - reset per measurement as needed
+PROVIDER_CALLS: Counter = Counter()
+
+# Fake credentials so provider code paths run all the way to the (stubbed) transport
+FAKE_CREDENTIALS = {
+    "JWT_SECRET": "bench-secret",
+    "GOOGLE_MAPS_API_KEY": "bench",
+    "GETADDRESS_API_KEY": "bench",
+    "TWILIO_ACCOUNT_SID": "ACbench",
+    "TWILIO_AUTH_TOKEN": "bench",
+    "VONAGE_API_KEY": "bench",
+    "VONAGE_API_SECRET": "bench",
+    "VONAGE_FROM_NUMBER": "CJsTravel",
+    "SMTP_USERNAME": "bench@bench.local",
+    "SMTP_PASSWORD": "bench",
+    "SMTP_FROM_EMAIL": "bench@bench.local",
+}
+
+
+def configure(db_name: str, mongo_url: Optional[str] = None):
+    """Environment for an offline run - call before importing server"""
+    os.environ["MONGO_URL"] = mongo_url or os.environ.get("BENCH_MONGO_URL", DEFAULT_MONGO_URL)
+    os.environ["DB_NAME"] = db_name
+    for key, value in FAKE_CREDENTIALS.items():
+        os.environ[key] = value
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["QUERY_LOG_HEADERS"] = "1"
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+
+# ========== PROVIDER STUBS ==========
+# One body that satisfies every Google endpoint we call: directions,
+# distance matrix, geocode and place details
+GOOGLE_RESPONSE = {
+    "status": "OK",
+    "routes": [{"legs": [{
+        "distance": {"value": 16093, "text": "10.0 mi"},
+        "duration": {"value": 1200, "text": "20 mins"},
+        "duration_in_traffic": {"value": 1320, "text": "22 mins"},
+        "start_location": {"lat": 54.9069, "lng": -1.3838},
+        "end_location": {"lat": 54.9783, "lng": -1.6178},
+    }], "overview_polyline": {"points": ""}}],
+    "rows": [{"elements": [{
+        "status": "OK",
+        "distance": {"value": 16093, "text": "10.0 mi"},
+        "duration": {"value": 1200, "text": "20 mins"},
+        "duration_in_traffic": {"value": 1320, "text": "22 mins"},
+    }]}],
+    "results": [{"geometry": {"location": {"lat": 54.9069, "lng": -1.3838}}, "formatted_address": "Sunderland, UK"}],
+    "result": {"geometry": {"location": {"lat": 54.9069, "lng": -1.3838}}, "formatted_address": "Sunderland, UK"},
+    "predictions": [],
+}
+
+
+def _stub_body(provider: str) -> tuple:
+    if provider == "google_maps":
+        return 200, GOOGLE_RESPONSE
+    if provider == "twilio":
+        return 201, {"sid": f"SM{uuid.uuid4().hex}", "status": "queued", "error_code": None}
+    if provider == "vonage":
+        return 200, {"message-count": "1", "messages": [{"status": "0", "message-id": uuid.uuid4().hex}]}
+    if provider == "getaddress":
+        return 200, {"postcode": "SR1 1AA", "latitude": 54.9069, "longitude": -1.3838, "addresses": [], "suggestions": []}
+    return 200, {}
+
+
+class FakeSMTP:
+    """Accepts and drops mail; stands in for smtplib.SMTP and SMTP_SSL"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _accept(self, *args, **kwargs):
+        PROVIDER_CALLS["smtp"] += 1
+        time.sleep(_provider_latency)
+        return {}
+
+    send_message = sendmail = _accept
+
+    def ehlo(self, *args, **kwargs):
+        return (250, b"ok")
+
+    starttls = login = quit = close = set_debuglevel = ehlo
+
+
+_provider_latency = 0.0
+_stubbed = False
+
+
+def stub_providers(latency_ms: float = 0.0):
+    """
+    Answer every non-local outbound request locally. latency_ms adds a fixed
+    delay per call - asyncio.sleep for httpx, time.sleep for the sync SDKs and
+    SMTP - so blocking providers still block the loop like they do in production.
+    """
+    global _stubbed, _provider_latency
+    _provider_latency = latency_ms / 1000
+    if _stubbed:
+        return
+    _stubbed = True
+
+    import httpx
+    import requests
+    from observability import provider_for
+
+    original_async_send = httpx.AsyncClient.send
+
+    async def stub_async_send(self, request, *args, **kwargs):
+        if request.url.host == LOCAL_HOST:
+            return await original_async_send(self, request, *args, **kwargs)
+        provider = provider_for(request.url)
+        PROVIDER_CALLS[provider] += 1
+        if _provider_latency:
+            await asyncio.sleep(_provider_latency)
+        status, body = _stub_body(provider)
+        return httpx.Response(status, json=body, request=request)
+
+    def stub_sync_send(self, request, **kwargs):
+        provider = provider_for(request.url)
+        PROVIDER_CALLS[provider] += 1
+        time.sleep(_provider_latency)
+        status, body = _stub_body(provider)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    httpx.AsyncClient.send = stub_async_send
+    requests.Session.send = stub_sync_send
+    smtplib.SMTP = FakeSMTP
+    smtplib.SMTP_SSL = FakeSMTP
+
+
+# ========== APP ==========
+def load_server(in_memory: bool = False):
+    """Import server (after configure/stub_providers) and optionally swap in mongomock"""
+    import server
+    if in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        import routes.shared
+        memory_db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+        server.db = memory_db
+        routes.shared._db = memory_db
+    return server
+
+
+def asgi_client(app, timeout: float = 60.0):
+    import httpx
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url=f"http://{LOCAL_HOST}",
+        timeout=timeout,
+    )
+
+
+def admin_headers(server) -> dict:
+    token = server.create_admin_token("bench-admin", "admin@bench.local", "super_admin")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def driver_headers(driver_id: str) -> dict:
+    import jwt
+    token = jwt.encode({
+        "sub": driver_id,
+        "email": f"{driver_id}@bench.local",
+        "type": "driver",
+        "exp": datetime.now(timezone.utc) + timedelta(days=1),
+    }, os.environ["JWT_SECRET"], algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def passenger_headers(server, passenger_id: str, phone: str) -> dict:
+    return {"Authorization": f"Bearer {server.create_token(passenger_id, phone)}"}
+
+
+def mongo_commands(response) -> Optional[int]:
+    """Command count from the Server-Timing header (request it with X-Server-Timing: 1)"""
+    timing = response.headers.get("Server-Timing", "")
+    for part in timing.split(","):
+        if part.strip().startswith("db;"):
+            for attr in part.split(";"):
+                if attr.strip().startswith("desc="):
+                    return int(attr.split("=", 1)[1].strip('" ').split()[0])
+    return None
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def git_commit() -> Optional[str]:
+    import subprocess
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
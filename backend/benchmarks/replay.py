@@ -0,0 +1,234 @@
+"""
+Replay captured production traffic against local builds
+
+Reads the scrubbed .jsonl.gz files written by request_capture (server started
+with REQUEST_CAPTURE_RATE), rebuilds each request from its route template and
+re-mints a token for the same role and account, then sends it on the
+original schedule - or --speed times faster - to every target at once.
+
+    python -m benchmarks.replay captures/capture-20260105-*.jsonl.gz \\
+        --target main=http://127.0.0.1:8010 --target branch=http://127.0.0.1:8011 --speed 4
+
+Each target should be a build running against its own copy of the same
+anonymised snapshot (benchmarks.anonymise - ids in paths and tokens refer to
+real documents), with providers stubbed and the same JWT_SECRET. The report
+gives p50/p95/p99 per route for each target and the deltas against the first.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+
+import httpx
+import jwt
+
+from benchmarks import harness
+
+_PATH_PARAM = re.compile(r"\{(\w+)(:\w+)?\}")
+
+
+def load_records(paths, route_filter=None) -> list:
+    records = []
+    pattern = re.compile(route_filter) if route_filter else None
+    for path in paths:
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if not record.get("route"):
+                    continue
+                if pattern and not pattern.search(record["route"]):
+                    continue
+                records.append(record)
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def build_path(record: dict) -> str:
+    params = record.get("path_params") or {}
+    return _PATH_PARAM.sub(lambda m: str(params.get(m.group(1), m.group(0))), record["route"])
+
+
+def auth_header(identity, secret: str) -> dict:
+    if not identity:
+        return {}
+    kind, sub = identity.get("type"), identity.get("sub")
+    if kind == "invalid" or not sub:
+        return {"Authorization": "Bearer invalid"}
+    exp = datetime.now(timezone.utc) + timedelta(hours=6)
+    if kind == "client":
+        payload = {"client_id": sub, "type": "client", "exp": exp}
+    elif kind == "passenger":
+        payload = {"sub": sub, "phone": "", "exp": exp}
+    else:
+        payload = {"sub": sub, "type": kind, "email": "replay@bench.local", "exp": exp}
+        if identity.get("role"):
+            payload["role"] = identity["role"]
+    return {"Authorization": f"Bearer {jwt.encode(payload, secret, algorithm='HS256')}"}
+
+
+class TargetResults:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_changed = defaultdict(int)
+
+    def add(self, route: str, elapsed_ms: float, status, captured_status):
+        self.latencies[route].append(elapsed_ms)
+        if status is None or status >= 500:
+            self.errors[route] += 1
+        if status != captured_status:
+            self.status_changed[route] += 1
+
+    def summary(self) -> dict:
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            routes[route] = {
+                "n": len(values),
+                "p50_ms": round(harness.percentile(values, 50), 1),
+                "p95_ms": round(harness.percentile(values, 95), 1),
+                "p99_ms": round(harness.percentile(values, 99), 1),
+                "errors": self.errors.get(route, 0),
+                "status_changed": self.status_changed.get(route, 0),
+            }
+        every = [v for values in self.latencies.values() for v in values]
+        return {
+            "requests": len(every),
+            "p50_ms": round(harness.percentile(every, 50), 1),
+            "p95_ms": round(harness.percentile(every, 95), 1),
+            "p99_ms": round(harness.percentile(every, 99), 1),
+            "errors": sum(self.errors.values()),
+            "routes": routes,
+        }
+
+
+async def _send(client, record, headers, results: TargetResults):
+    key = f"{record['method']} {record['route']}"
+    kwargs = {"params": record.get("query") or None, "headers": headers}
+    if "body" in record:
+        kwargs["json"] = record["body"]
+    started = time.perf_counter()
+    try:
+        response = await client.request(record["method"], build_path(record), **kwargs)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None
+    results.add(key, (time.perf_counter() - started) * 1000, status, record.get("status"))
+
+
+async def replay(records, targets: dict, speed: float, secret: str, max_in_flight: int) -> dict:
+    results = {name: TargetResults() for name in targets}
+    clients = {name: httpx.AsyncClient(base_url=url, timeout=60.0) for name, url in targets.items()}
+    semaphore = asyncio.Semaphore(max_in_flight)
+    skipped = 0
+    tasks = []
+
+    async def fire(record):
+        headers = auth_header(record.get("auth"), secret)
+        async with semaphore:
+            await asyncio.gather(*(
+                _send(clients[name], record, headers, results[name]) for name in targets
+            ))
+
+    try:
+        first = records[0]["t"] if records else 0
+        started = time.monotonic()
+        for record in records:
+            # Multipart uploads and oversized bodies were captured as a size only
+            if "body_bytes" in record:
+                skipped += 1
+                continue
+            if speed > 0:
+                delay = started + (record["t"] - first) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(record)))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    finally:
+        for client in clients.values():
+            await client.aclose()
+
+    return {
+        "elapsed_seconds": round(elapsed, 1),
+        "skipped": skipped,
+        "targets": {name: result.summary() for name, result in results.items()},
+    }
+
+
+def captured_summary(records) -> dict:
+    by_route = defaultdict(list)
+    for record in records:
+        by_route[f"{record['method']} {record['route']}"].append(record["duration_ms"])
+    return {
+        route: {"n": len(values), "p50_ms": round(harness.percentile(values, 50), 1),
+                "p95_ms": round(harness.percentile(values, 95), 1)}
+        for route, values in sorted(by_route.items())
+    }
+
+
+def deltas(report: dict) -> dict:
+    """Per-route p50/p95 change of every target against the first"""
+    names = list(report["targets"])
+    if len(names) < 2:
+        return {}
+    baseline = report["targets"][names[0]]["routes"]
+    out = {}
+    for name in names[1:]:
+        rows = {}
+        for route, result in report["targets"][name]["routes"].items():
+            before = baseline.get(route)
+            if not before:
+                continue
+            rows[route] = {
+                "p50_delta_ms": round(result["p50_ms"] - before["p50_ms"], 1),
+                "p95_delta_ms": round(result["p95_ms"] - before["p95_ms"], 1),
+                "p50_change_pct": round((result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100, 1)
+                if before["p50_ms"] else None,
+            }
+        out[f"{name} vs {names[0]}"] = dict(sorted(rows.items(), key=lambda kv: -abs(kv[1]["p95_delta_ms"])))
+    return out
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured requests against one or more local builds")
+    parser.add_argument("captures", nargs="+", help=".jsonl.gz files from REQUEST_CAPTURE_DIR")
+    parser.add_argument("--target", action="append", required=True, help="name=url, repeat to compare builds")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 sends as fast as allowed")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--route-filter", help="regex on the route template")
+    parser.add_argument("--jwt-secret", help="secret the targets verify tokens with (default JWT_SECRET)")
+    parser.add_argument("--out")
+    return parser.parse_args(argv)
+
+
+async def main(args) -> dict:
+    targets = dict(t.split("=", 1) if "=" in t else (t, t) for t in args.target)
+    secret = args.jwt_secret or os.environ.get("JWT_SECRET") or harness.FAKE_CREDENTIALS["JWT_SECRET"]
+    records = load_records(args.captures, args.route_filter)
+    print(f"Replaying {len(records)} requests against {', '.join(targets)} at {args.speed}x", file=sys.stderr)
+    report = await replay(records, targets, args.speed, secret, args.max_in_flight)
+    report["captured"] = captured_summary(records)
+    report["deltas"] = deltas(report)
+    report["meta"] = {"captures": args.captures, "speed": args.speed, "targets": targets}
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
@@ -0,0 +1,230 @@
+"""
+Offline benchmark suite
+
+Seeds a synthetic fleet into a throwaway database, stubs every provider, then
+times the hot endpoints in-process and writes JSON that can be compared with
+a run from another commit.
+
+    cd backend
+    python -m benchmarks.run --vehicles 30 --bookings-per-day 250 --clients 60 --out bench.json
+    python -m benchmarks.run --compare bench-main.json --out bench-branch.json
+
+Needs a local mongod (BENCH_MONGO_URL, default mongodb://localhost:27017), or
+--in-memory with mongomock-motor installed. Invoice generation needs GridFS,
+so it only runs against a real mongod.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+from datetime import datetime, timezone, timedelta
+from statistics import mean
+
+from benchmarks import harness
+
+
+def _assigned_pairs(fleet: dict) -> list:
+    """(pending booking, vehicle already busy at some time that day) for the conflict path"""
+    by_day = {}
+    for booking in fleet["assigned"]:
+        by_day.setdefault(booking["booking_datetime"][:10], []).append(booking)
+    pairs = []
+    for day, pending in fleet["unassigned_by_day"].items():
+        busy = by_day.get(day, [])
+        for i, booking_id in enumerate(pending):
+            if busy:
+                target = busy[i % len(busy)]
+                pairs.append((booking_id, target["vehicle_id"], target["booking_datetime"]))
+    return pairs
+
+
+def build_benchmarks(server, fleet: dict, admin: dict) -> list:
+    """(name, request(client, i), reset(i) or None) for every benchmarked endpoint"""
+    day = fleet["start"]
+    unassigned_today = fleet["unassigned_by_day"].get(day, [])
+    pairs = _assigned_pairs(fleet)
+    drivers = fleet["driver_ids"]
+    clients = fleet["client_ids"]
+    period_end = (datetime.fromisoformat(day) + timedelta(days=len(fleet["unassigned_by_day"]))).date().isoformat()
+
+    async def reset_auto_assign(i):
+        await server.db.bookings.update_many({"id": {"$in": unassigned_today}}, {"$set": {"vehicle_id": None}})
+
+    async def reset_stats(i):
+        server._stats_snapshot["data"] = None
+        server._stats_snapshot["computed_at"] = 0.0
+
+    async def reset_conflict(i):
+        booking_id = pairs[i % len(pairs)][0]
+        await server.db.bookings.update_one({"id": booking_id}, {"$set": {"vehicle_id": None, "driver_id": None}})
+
+    def driver(i):
+        return harness.driver_headers(drivers[i % len(drivers)])
+
+    benchmarks = [
+        ("auto_assign_vehicles",
+         lambda c, i: c.post("/api/scheduling/auto-assign", params={"date": day}, headers=admin),
+         reset_auto_assign),
+        ("check_schedule_availability",
+         lambda c, i: c.post("/api/scheduling/check-availability",
+                             json={"date": day, "time": f"{8 + i % 12:02d}:30", "duration_minutes": 60}, headers=admin),
+         None),
+        ("stats_cold", lambda c, i: c.get("/api/stats", headers=admin), reset_stats),
+        ("stats_cached", lambda c, i: c.get("/api/stats", headers=admin), None),
+        ("get_clients", lambda c, i: c.get("/api/clients", headers=admin), None),
+        ("driver_bookings", lambda c, i: c.get("/api/driver/bookings", headers=driver(i)), None),
+        ("driver_bookings_pending", lambda c, i: c.get("/api/driver/bookings/pending", headers=driver(i)), None),
+        ("driver_profile", lambda c, i: c.get("/api/driver/profile", headers=driver(i)), None),
+        ("driver_stats", lambda c, i: c.get("/api/driver/stats", headers=driver(i)), None),
+        ("driver_location",
+         lambda c, i: c.put("/api/driver/location", json={"latitude": 54.9 + i / 1000, "longitude": -1.38},
+                            headers=driver(i)),
+         None),
+    ]
+    if pairs:
+        benchmarks.append((
+            "update_booking_conflict",
+            lambda c, i: c.put(f"/api/bookings/{pairs[i % len(pairs)][0]}",
+                               json={"vehicle_id": pairs[i % len(pairs)][1],
+                                     "booking_datetime": pairs[i % len(pairs)][2]},
+                               headers=admin),
+            reset_conflict,
+        ))
+    if clients:
+        benchmarks.append((
+            "generate_client_invoice",
+            lambda c, i: c.post(f"/api/clients/{clients[i % len(clients)]}/invoice",
+                                params={"start_date": day, "end_date": period_end}, headers=admin),
+            None,
+        ))
+    return benchmarks
+
+
+async def measure(client, request, reset, repeat: int, warmup: int) -> dict:
+    latencies, commands, statuses = [], [], {}
+    for i in range(warmup + repeat):
+        if reset:
+            await reset(i)
+        started = time.perf_counter()
+        response = await request(client, i)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        count = harness.mongo_commands(response)
+        if count is not None:
+            commands.append(count)
+    return {
+        "n": len(latencies),
+        "mean_ms": round(mean(latencies), 2),
+        "p50_ms": round(harness.percentile(latencies, 50), 2),
+        "p95_ms": round(harness.percentile(latencies, 95), 2),
+        "max_ms": round(max(latencies), 2),
+        "mongo_commands": max(commands) if commands else None,
+        "status_codes": statuses,
+    }
+
+
+def compare(baseline: dict, current: dict) -> list:
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "p50_ms" not in before or "p50_ms" not in result:
+            continue
+        rows.append({
+            "name": name,
+            "p50_before": before["p50_ms"], "p50_after": result["p50_ms"],
+            "p50_change_pct": round((result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100, 1) if before["p50_ms"] else None,
+            "p95_before": before["p95_ms"], "p95_after": result["p95_ms"],
+            "queries_before": before.get("mongo_commands"), "queries_after": result.get("mongo_commands"),
+        })
+    return rows
+
+
+async def main(args) -> dict:
+    db_name = f"cjs_bench_{args.seed}"
+    harness.configure(db_name, args.mongo_url)
+    harness.stub_providers(args.provider_latency_ms)
+    server = harness.load_server(args.in_memory)
+    from db_indexes import apply_index_manifest
+    from benchmarks.synthetic import seed_fleet
+
+    if not args.in_memory:
+        await server.client.drop_database(db_name)
+        await apply_index_manifest(server.db)
+    fleet = await seed_fleet(
+        server.db, vehicles=args.vehicles, bookings_per_day=args.bookings_per_day,
+        clients=args.clients, days=args.days, seed=args.seed,
+    )
+
+    admin = harness.admin_headers(server)
+    results = {}
+    try:
+        async with harness.asgi_client(server.app) as client:
+            client.headers["X-Server-Timing"] = "1"
+            for name, request, reset in build_benchmarks(server, fleet, admin):
+                if args.only and name not in args.only:
+                    continue
+                if args.in_memory and name == "generate_client_invoice":
+                    continue
+                try:
+                    results[name] = await measure(client, request, reset, args.repeat, args.warmup)
+                except Exception as e:
+                    results[name] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"{name:32s} {json.dumps(results[name])}", file=sys.stderr)
+    finally:
+        server.shutdown_pdf_executor()
+        if not args.keep and not args.in_memory:
+            await server.client.drop_database(db_name)
+
+    report = {
+        "meta": {
+            "commit": harness.git_commit(),
+            "run_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "backend": "mongomock" if args.in_memory else "mongod",
+            "fleet": fleet["counts"],
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            "provider_calls": dict(harness.PROVIDER_CALLS),
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(json.load(f), report)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against synthetic fleet data")
+    parser.add_argument("--vehicles", type=int, default=20)
+    parser.add_argument("--bookings-per-day", type=int, default=150)
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--provider-latency-ms", type=float, default=0.0,
+                        help="delay added to every stubbed provider call")
+    parser.add_argument("--only", nargs="*", help="run just these benchmarks")
+    parser.add_argument("--mongo-url", help="defaults to BENCH_MONGO_URL or mongodb://localhost:27017")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--keep", action="store_true", help="leave the benchmark database in place")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
@@ -0,0 +1,52 @@
+"""
+Run the API locally for load tests: synthetic data, stubbed providers
+
+    cd backend
+    python -m benchmarks.serve --vehicles 200 --port 8010 --fleet-file /tmp/fleet.json
+
+The server is a normal uvicorn process (startup hooks and all), so a load
+generator in another process measures it the way the driver app sees it.
+--fleet-file records the seeded ids for benchmarks.simulate.
+"""
+
+import os
+import json
+import asyncio
+import argparse
+
+from benchmarks import harness
+from benchmarks.synthetic import seed_fresh_database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API on synthetic data with stubbed providers")
+    parser.add_argument("--vehicles", type=int, default=100)
+    parser.add_argument("--bookings-per-day", type=int, default=300)
+    parser.add_argument("--clients", type=int, default=60)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-url")
+    parser.add_argument("--provider-latency-ms", type=float, default=0.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--fleet-file", default="fleet.json")
+    args = parser.parse_args(argv)
+
+    harness.configure(f"cjs_load_{args.seed}", args.mongo_url)
+    harness.stub_providers(args.provider_latency_ms)
+    # Seeded on a client of its own: the server's Motor client must first be used on uvicorn's loop
+    fleet = asyncio.run(seed_fresh_database(
+        os.environ["MONGO_URL"], os.environ["DB_NAME"], vehicles=args.vehicles,
+        bookings_per_day=args.bookings_per_day, clients=args.clients, days=args.days, seed=args.seed,
+    ))
+    with open(args.fleet_file, "w") as f:
+        json.dump(fleet, f)
+    print(f"Seeded {fleet['counts']} - fleet written to {args.fleet_file}")
+
+    import uvicorn
+    server = harness.load_server()
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Driver-app traffic simulator
+
+Replays what the fleet does to the API: each online driver sends its location
+every 2-30s, polls /driver/bookings, /driver/bookings/pending and chat every
+5-15s and walks its jobs through on_way -> arrived -> in_progress ->
+completed; passengers poll tracking every 10s. The fleet grows stage by stage
+until the server saturates.
+
+    python -m benchmarks.serve --vehicles 200 --fleet-file /tmp/fleet.json   # in one shell
+    python -m benchmarks.simulate --fleet-file /tmp/fleet.json --stages 10 25 50 100 200
+
+A stage counts as saturated when p95 goes over --p95-limit-ms, errors exceed
+--max-error-rate, or throughput stops growing with the fleet (clients wait
+for each response, so a saturated server shows up as flat requests/second).
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import harness
+
+DRIVER_STATUS_FLOW = ["on_way", "arrived", "in_progress", "completed"]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 500
+        except httpx.HTTPError:
+            response, failed = None, True
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if failed:
+            self.errors[endpoint] += 1
+        return response
+
+    def report(self, seconds: float) -> dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(values) / seconds, 2),
+                "p50_ms": round(harness.percentile(values, 50), 1),
+                "p95_ms": round(harness.percentile(values, 95), 1),
+                "p99_ms": round(harness.percentile(values, 99), 1),
+            }
+        every = [v for values in self.latencies.values() for v in values]
+        completed = len(every)
+        return {
+            "requests": completed,
+            "errors": sum(self.errors.values()),
+            "rps": round(completed / seconds, 2),
+            "p50_ms": round(harness.percentile(every, 50), 1),
+            "p95_ms": round(harness.percentile(every, 95), 1),
+            "p99_ms": round(harness.percentile(every, 99), 1),
+            "endpoints": endpoints,
+        }
+
+
+def _driver_jobs(fleet: dict) -> dict:
+    jobs = defaultdict(list)
+    for booking in fleet["assigned"]:
+        if booking["status"] in ("assigned", "in_progress"):
+            jobs[booking["driver_id"]].append(booking["id"])
+    return jobs
+
+
+async def _every(low: float, high: float, deadline: float, rng: random.Random, action):
+    # Stagger the first call so a stage doesn't start with a thundering herd
+    await asyncio.sleep(rng.uniform(0, low))
+    while time.monotonic() < deadline:
+        await action()
+        await asyncio.sleep(rng.uniform(low, high))
+
+
+async def simulate_driver(client, recorder, driver_id: str, jobs: list, deadline: float, rng: random.Random):
+    headers = harness.driver_headers(driver_id)
+    lat, lng = 54.9 + rng.random() / 10, -1.4 + rng.random() / 10
+    job_state = {job: 0 for job in jobs}
+
+    async def send_location():
+        nonlocal lat, lng
+        lat += rng.uniform(-0.002, 0.002)
+        lng += rng.uniform(-0.002, 0.002)
+        await recorder.call(client, "PUT /driver/location", "PUT", "/api/driver/location",
+                            json={"latitude": lat, "longitude": lng}, headers=headers)
+
+    async def poll():
+        await recorder.call(client, "GET /driver/bookings", "GET", "/api/driver/bookings", headers=headers)
+        await recorder.call(client, "GET /driver/bookings/pending", "GET", "/api/driver/bookings/pending", headers=headers)
+        if jobs:
+            await recorder.call(client, "GET /driver/chat/{booking_id}", "GET",
+                                f"/api/driver/chat/{rng.choice(jobs)}", headers=headers)
+
+    async def advance_job():
+        open_jobs = [job for job, step in job_state.items() if step < len(DRIVER_STATUS_FLOW)]
+        if not open_jobs:
+            return
+        job = open_jobs[0]
+        status = DRIVER_STATUS_FLOW[job_state[job]]
+        job_state[job] += 1
+        await recorder.call(client, "PUT /driver/bookings/{booking_id}/status", "PUT",
+                            f"/api/driver/bookings/{job}/status", params={"status": status}, headers=headers)
+
+    await asyncio.gather(
+        _every(2, 30, deadline, rng, send_location),
+        _every(5, 15, deadline, rng, poll),
+        _every(20, 60, deadline, rng, advance_job),
+    )
+
+
+async def simulate_passenger(client, recorder, booking_id: str, deadline: float, rng: random.Random):
+    async def track():
+        await recorder.call(client, "GET /tracking/{booking_id}/driver-location", "GET",
+                            f"/api/tracking/{booking_id}/driver-location")
+
+    await _every(10, 10, deadline, rng, track)
+
+
+async def run_stage(base_url: str, fleet: dict, drivers: int, passengers: int, seconds: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    recorder = Recorder()
+    jobs = _driver_jobs(fleet)
+    driver_ids = fleet["driver_ids"]
+    tracked = [b["id"] for b in fleet["assigned"] if b["status"] in ("assigned", "in_progress")] or \
+        [b["id"] for b in fleet["assigned"]]
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=max(100, drivers + passengers), max_keepalive_connections=100)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        tasks = []
+        for i in range(drivers):
+            driver_id = driver_ids[i % len(driver_ids)]
+            tasks.append(simulate_driver(client, recorder, driver_id, jobs.get(driver_id, []), deadline,
+                                         random.Random(rng.getrandbits(32))))
+        for i in range(passengers):
+            if tracked:
+                tasks.append(simulate_passenger(client, recorder, tracked[i % len(tracked)], deadline,
+                                                random.Random(rng.getrandbits(32))))
+        started = time.monotonic()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+    report = recorder.report(elapsed)
+    report.update({"drivers": drivers, "passengers": passengers, "seconds": round(elapsed, 1)})
+    return report
+
+
+def saturated(stage: dict, previous: dict, p95_limit_ms: float, max_error_rate: float) -> list:
+    reasons = []
+    if stage["p95_ms"] > p95_limit_ms:
+        reasons.append(f"p95 {stage['p95_ms']}ms > {p95_limit_ms}ms")
+    if stage["requests"] and stage["errors"] / stage["requests"] > max_error_rate:
+        reasons.append(f"error rate {stage['errors'] / stage['requests']:.1%}")
+    if previous and previous["rps"]:
+        expected = previous["rps"] * stage["drivers"] / previous["drivers"]
+        if stage["rps"] < 0.8 * expected:
+            reasons.append(f"throughput {stage['rps']} rps, expected ~{expected:.0f} from the previous stage")
+    return reasons
+
+
+async def main(args) -> dict:
+    harness.configure(f"cjs_load_{args.seed}")
+    with open(args.fleet_file) as f:
+        fleet = json.load(f)
+
+    stages, saturation = [], None
+    for drivers in args.stages:
+        passengers = int(drivers * args.passengers_per_driver)
+        stage = await run_stage(args.base_url, fleet, drivers, passengers, args.stage_seconds, args.seed)
+        stage["saturated_by"] = saturated(stage, stages[-1] if stages else None, args.p95_limit_ms, args.max_error_rate)
+        stages.append(stage)
+        print(f"{drivers:5d} drivers {passengers:5d} passengers  {stage['rps']:8.1f} rps  "
+              f"p50 {stage['p50_ms']:7.1f}  p95 {stage['p95_ms']:7.1f}  p99 {stage['p99_ms']:7.1f}  "
+              f"errors {stage['errors']}  {'; '.join(stage['saturated_by'])}", file=sys.stderr)
+        if stage["saturated_by"]:
+            saturation = {"drivers": drivers, "passengers": passengers, "reasons": stage["saturated_by"]}
+            break
+
+    return {
+        "meta": {"commit": harness.git_commit(), "base_url": args.base_url, "stage_seconds": args.stage_seconds,
+                 "p95_limit_ms": args.p95_limit_ms},
+        "stages": stages,
+        "saturation": saturation,
+        "max_sustained_drivers": next(
+            (s["drivers"] for s in reversed(stages) if not s["saturated_by"]), None),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate driver-app and passenger traffic")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8010")
+    parser.add_argument("--fleet-file", default="fleet.json", help="written by benchmarks.serve")
+    parser.add_argument("--stages", type=int, nargs="+", default=[10, 25, 50, 100, 200, 400])
+    parser.add_argument("--passengers-per-driver", type=float, default=0.5)
+    parser.add_argument("--stage-seconds", type=float, default=60)
+    parser.add_argument("--p95-limit-ms", type=float, default=1000)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
@@ -0,0 +1,230 @@
+"""
+Seeded synthetic fleet data
+
+seed_fleet() fills an empty database with vehicle types, N vehicles (one
+driver each), K clients, passengers and M bookings per day. The same seed
+always produces the same documents, so two commits are measured against
+identical data.
+"""
+
+import random
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone, date
+from typing import Optional
+
+# Sunderland / Tyne & Wear pickups and the usual long-haul drops
+LOCATIONS = [
+    "Sunderland Royal Hospital, Kayll Road, Sunderland SR4 7TP",
+    "Newcastle International Airport, Woolsington, Newcastle upon Tyne NE13 8BZ",
+    "Newcastle Central Station, Neville Street, Newcastle upon Tyne NE1 5DL",
+    "Durham Railway Station, Station Approach, Durham DH1 4RH",
+    "The Bridges Shopping Centre, Sunderland SR1 3LE",
+    "Seaburn Seafront, Whitburn Road, Sunderland SR6 8AA",
+    "Washington Galleries, Washington NE38 7SD",
+    "Houghton-le-Spring Town Centre DH4 4DN",
+    "Stadium of Light, Sunderland SR5 1SU",
+    "Teesside Airport, Darlington DL2 1LU",
+    "Manchester Airport, Manchester M90 1QX",
+    "Leeds Bradford Airport, Leeds LS19 7TU",
+    "Metrocentre, Gateshead NE11 9YG",
+    "Doxford International Business Park, Sunderland SR3 3XB",
+    "Hylton Castle Road, Sunderland SR5 3EB",
+    "Seaham Harbour Marina, Seaham SR7 7EE",
+]
+FIRST_NAMES = ["James", "Olivia", "Harry", "Amelia", "Jack", "Isla", "George", "Ava", "Noah", "Emily",
+               "Leo", "Sophie", "Oscar", "Grace", "Charlie", "Mia", "Thomas", "Lily", "Jacob", "Ella"]
+LAST_NAMES = ["Smith", "Jones", "Taylor", "Brown", "Wilson", "Davies", "Evans", "Thomas", "Johnson", "Roberts",
+              "Walker", "Wright", "Robinson", "Thompson", "White", "Hughes", "Edwards", "Green", "Hall", "Wood"]
+MAKES = [("Mercedes", "V-Class"), ("Skoda", "Octavia"), ("Toyota", "Corolla"), ("Ford", "Tourneo"), ("Mercedes", "Sprinter")]
+
+# Status mix for a day that is partly done
+STATUS_WEIGHTS = [("pending", 30), ("assigned", 30), ("completed", 30), ("cancelled", 5), ("in_progress", 5)]
+
+BENCH_PASSWORD = "bench-password"
+
+
+async def seed_fresh_database(mongo_url: str, db_name: str, **sizes) -> dict:
+    """Drop db_name, apply the index manifest and seed it, on a short-lived client of its own"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from db_indexes import apply_index_manifest
+
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        await client.drop_database(db_name)
+        database = client[db_name]
+        await apply_index_manifest(database)
+        return await seed_fleet(database, **sizes)
+    finally:
+        client.close()
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _phone(rng: random.Random) -> str:
+    return f"07700{rng.randint(900000, 999999)}"
+
+
+def _e164(phone: str) -> str:
+    return "+44" + phone[1:]
+
+
+async def seed_fleet(
+    database,
+    vehicles: int = 20,
+    bookings_per_day: int = 150,
+    clients: int = 40,
+    days: int = 7,
+    seed: int = 1,
+    start: Optional[date] = None,
+) -> dict:
+    """Insert a synthetic fleet and return the ids the benchmarks need"""
+    rng = random.Random(seed)
+    start = start or datetime.now(timezone.utc).date()
+    now = datetime.now(timezone.utc)
+
+    vehicle_types = [
+        {"id": _uuid(rng), "name": "CJ's Taxi", "capacity": 4, "category": "taxi", "has_trailer": False},
+        {"id": _uuid(rng), "name": "CJ's 8 Minibus", "capacity": 8, "category": "taxi", "has_trailer": False},
+        {"id": _uuid(rng), "name": "CJ's 16 PSV", "capacity": 16, "category": "psv", "has_trailer": False},
+    ]
+    for vt in vehicle_types:
+        vt["created_at"] = now
+
+    vehicle_docs, driver_docs = [], []
+    for i in range(vehicles):
+        vehicle_type = vehicle_types[0] if i % 4 < 2 else vehicle_types[1 + i % 2]
+        make, model = rng.choice(MAKES)
+        vehicle_id, driver_id = _uuid(rng), _uuid(rng)
+        vehicle_docs.append({
+            "id": vehicle_id,
+            "registration": f"BN{i % 100:02d} {chr(65 + i % 26)}{chr(65 + (i // 26) % 26)}{chr(65 + rng.randint(0, 25))}",
+            "make": make, "model": model, "year": rng.randint(2016, 2025),
+            "vehicle_type_id": vehicle_type["id"],
+            "is_active": True,
+            "insurance_expiry": (start + timedelta(days=rng.randint(10, 400))).isoformat(),
+            "tax_expiry": (start + timedelta(days=rng.randint(10, 400))).isoformat(),
+            "current_driver_id": driver_id,
+            "created_at": now,
+        })
+        phone = _phone(rng)
+        driver_docs.append({
+            "id": driver_id,
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "phone": phone, "phone_e164": _e164(phone),
+            "email": f"driver{i}@bench.local",
+            "driver_types": ["psv"] if vehicle_type["category"] == "psv" else ["taxi"],
+            "status": "available",
+            "is_online": True, "on_break": False,
+            "selected_vehicle_id": vehicle_id,
+            "password_hash": hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest(),
+            "current_location": {"lat": 54.9 + rng.random() / 10, "lng": -1.4 + rng.random() / 10,
+                                 "updated_at": now.isoformat()},
+            "created_at": now,
+        })
+
+    client_docs = []
+    for i in range(clients):
+        phone = _phone(rng)
+        client_docs.append({
+            "id": _uuid(rng),
+            "account_no": f"E{i + 1:03d}",
+            "name": f"{rng.choice(LAST_NAMES)} {rng.choice(['Ltd', 'Care', 'Schools', 'Group', 'Logistics'])} {i}",
+            "mobile": phone, "phone_e164": _e164(phone),
+            "email": f"accounts{i}@client.bench.local",
+            "client_type": "business", "payment_method": "invoice", "status": "active",
+            "payment_terms": 30,
+            "created_at": now,
+        })
+
+    passenger_docs = []
+    for i in range(max(clients * 5, 50)):
+        phone = _phone(rng)
+        passenger_docs.append({
+            "id": _uuid(rng),
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "phone": phone, "phone_e164": _e164(phone),
+            "email": f"passenger{i}@bench.local",
+            "password_hash": hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest(),
+            "created_at": now,
+        })
+
+    booking_docs, unassigned_by_day = [], {}
+    statuses, weights = zip(*STATUS_WEIGHTS)
+    number = 0
+    for day in range(days):
+        day_date = start + timedelta(days=day)
+        unassigned = unassigned_by_day.setdefault(day_date.isoformat(), [])
+        for _ in range(bookings_per_day):
+            number += 1
+            passenger = rng.choice(passenger_docs)
+            first_name, last_name = passenger["name"].split(" ", 1)
+            pickup, dropoff = rng.sample(LOCATIONS, 2)
+            booking_dt = datetime.combine(day_date, datetime.min.time(), tzinfo=timezone.utc) + timedelta(
+                minutes=rng.randint(5 * 60, 23 * 60) // 5 * 5)
+            status = rng.choices(statuses, weights)[0]
+            passengers = rng.choice([1, 1, 1, 2, 2, 3, 4, 6, 8, 12])
+            distance = round(rng.uniform(1.5, 140.0), 1)
+            booking = {
+                "id": _uuid(rng),
+                "booking_id": f"CJ-{number:05d}",
+                "first_name": first_name, "last_name": last_name,
+                "customer_phone": passenger["phone"], "phone_e164": passenger["phone_e164"],
+                "customer_email": passenger["email"],
+                "pickup_location": pickup, "dropoff_location": dropoff,
+                "additional_stops": [rng.choice(LOCATIONS)] if rng.random() < 0.1 else None,
+                "booking_datetime": booking_dt.isoformat(),
+                "fare": round(8 + distance * 2.1, 2),
+                "distance_miles": distance,
+                "duration_minutes": int(distance * 1.6) + 10,
+                "status": status,
+                "passenger_count": passengers,
+                "luggage_count": rng.randint(0, 4),
+                "vehicle_type": vehicle_types[2]["id"] if passengers > 8 else None,
+                "client_id": rng.choice(client_docs)["id"] if client_docs and rng.random() < 0.3 else None,
+                "booking_source": rng.choice(["Phone", "SMS", "WhatsApp", "Web", "Facebook"]),
+                "created_at": (booking_dt - timedelta(days=rng.randint(0, 14))).isoformat(),
+                "sms_sent": True, "email_sent": False,
+            }
+            if status in ("assigned", "in_progress", "completed"):
+                index = rng.randrange(vehicles) if vehicles else None
+                if index is not None:
+                    booking["vehicle_id"] = vehicle_docs[index]["id"]
+                    booking["driver_id"] = driver_docs[index]["id"]
+                    booking["driver_accepted"] = status != "assigned" or rng.random() < 0.5
+            elif status == "pending":
+                unassigned.append(booking["id"])
+            booking_docs.append(booking)
+
+    for name, docs in (
+        ("vehicle_types", vehicle_types), ("vehicles", vehicle_docs), ("drivers", driver_docs),
+        ("clients", client_docs), ("passengers", passenger_docs), ("bookings", booking_docs),
+    ):
+        if docs:
+            await database[name].insert_many([dict(doc) for doc in docs])
+
+    await database.admin_users.insert_one({
+        "id": "bench-admin", "email": "admin@bench.local", "name": "Bench Admin",
+        "role": "super_admin", "password_hash": hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest(),
+        "created_at": now,
+    })
+
+    return {
+        "start": start.isoformat(),
+        "vehicle_ids": [v["id"] for v in vehicle_docs],
+        "driver_ids": [d["id"] for d in driver_docs],
+        "client_ids": [c["id"] for c in client_docs],
+        "passengers": [{"id": p["id"], "phone": p["phone"]} for p in passenger_docs],
+        "assigned": [
+            {"id": b["id"], "vehicle_id": b["vehicle_id"], "driver_id": b["driver_id"],
+             "booking_datetime": b["booking_datetime"], "status": b["status"]}
+            for b in booking_docs if b.get("vehicle_id")
+        ],
+        "unassigned_by_day": unassigned_by_day,
+        "counts": {
+            "vehicles": len(vehicle_docs), "drivers": len(driver_docs), "clients": len(client_docs),
+            "passengers": len(passenger_docs), "bookings": len(booking_docs),
+        },
+    }
@@ -0,0 +1,329 @@
+"""
+Declared MongoDB indexes for CJ's Executive Travel
+
+INDEX_MANIFEST is the single list of indexes the app expects. Startup applies
+it, the drift report diffs it against the live database, and the advisor runs
+explain() over QUERY_SHAPES - the app's hot queries - to flag collection scans
+and in-memory sorts.
+
+    python db_indexes.py drift     # what differs between manifest and database
+    python db_indexes.py apply     # create anything missing
+    python db_indexes.py advise    # explain() every registered query shape
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger("cjs_travel.indexes")
+
+
+def index(*keys, **options) -> dict:
+    """Declare an index: index("status"), index(("status", 1), ("created_at", -1), unique=True)"""
+    return {
+        "keys": [key if isinstance(key, tuple) else (key, 1) for key in keys],
+        "options": options,
+    }
+
+
+# ========== MANIFEST ==========
+INDEX_MANIFEST: Dict[str, List[dict]] = {
+    "bookings": [
+        index("id", unique=True),
+        index("booking_id", unique=True, sparse=True),
+        index("status"),
+        index("driver_id"),
+        index("created_at"),
+        index("booking_datetime"),
+        index("client_id"),
+        index(("status", 1), ("booking_datetime", -1)),
+        index(("phone_e164", 1), ("created_at", -1)),
+        index("customer_phone"),
+        index(("client_id", 1), ("booking_datetime", 1)),
+        index(("vehicle_id", 1), ("booking_datetime", -1)),
+        index("repeat_group_id", sparse=True),
+    ],
+    "passengers": [
+        index("id", unique=True),
+        index("phone_e164"),
+        index("phone"),
+        index("email", sparse=True),
+    ],
+    "drivers": [
+        index("id", unique=True),
+        index("email", unique=True),
+        index("status"),
+        index("shift_status"),
+        index("phone_e164"),
+    ],
+    "vehicles": [
+        index("id", unique=True),
+        index("registration", unique=True),
+        index("is_active"),
+        index("current_driver_id"),
+    ],
+    "admin_users": [
+        index("id", unique=True),
+        index("email", unique=True),
+    ],
+    "clients": [
+        index("id", unique=True),
+        index("email", unique=True, sparse=True),
+        index("company_name"),
+        index("phone_e164"),
+    ],
+    "chat_messages": [
+        index("booking_id"),
+        index("driver_id"),
+        index("created_at"),
+        index(("booking_id", 1), ("created_at", -1)),
+        index(("booking_id", 1), ("sender_type", 1), ("read", 1)),
+    ],
+    "chat_threads": [
+        index("booking_id", unique=True),
+        index(("driver_id", 1), ("last_message_at", -1)),
+        index(("unread_dispatch", -1), ("last_message_at", -1)),
+    ],
+    "whatsapp_messages": [
+        index(("created_at", -1)),
+        index(("read", 1), ("created_at", -1)),
+    ],
+    "booking_requests": [
+        index("id", unique=True),
+        index(("status", 1), ("created_at", -1)),
+        index(("passenger_id", 1), ("created_at", -1)),
+        index(("client_id", 1), ("created_at", -1)),
+    ],
+    "scheduled_sms": [
+        index(("status", 1), ("send_at", 1)),
+    ],
+    "invoices": [
+        index("id", unique=True),
+        index("invoice_number", unique=True, sparse=True),
+        index("client_id"),
+        index("status"),
+        index("batch_period", sparse=True),
+        # Batch invoice emails waiting to be sent
+        index("email_status", sparse=True),
+    ],
+    "invoice_jobs": [
+        index("id", unique=True),
+        index(("period", 1), ("status", 1)),
+        # One queued/running job per period - the claim in start_invoice_batch relies on it
+        index("period", unique=True, partialFilterExpression={"active": True}),
+    ],
+    # Keyset pagination walks (submitted_at, id) newest first
+    "walkaround_checks": [
+        index("id", unique=True),
+        index(("submitted_at", -1), ("id", -1)),
+        index(("vehicle_id", 1), ("submitted_at", -1), ("id", -1)),
+        index(("driver_id", 1), ("submitted_at", -1), ("id", -1)),
+        index("search_keys"),
+    ],
+    # X-Profile captures are for diagnosis, not history
+    "request_profiles": [
+        index("id", unique=True),
+        index("created_at", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    # Directions results reused by fare quotes and travel-time checks
+    "route_cache": [
+        index("key", unique=True),
+    ],
+    # Address / place / postcode -> lat,lng, looked up when bookings are created
+    "geocodes": [
+        index("key", unique=True),
+    ],
+    "quotes": [
+        index("id", unique=True),
+        index("quote_number", unique=True, sparse=True),
+        index("status"),
+        index("created_at"),
+    ],
+}
+
+# Options that change what an index does; anything else (name, background) is cosmetic
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+# ========== QUERY SHAPES ==========
+# Representative filters/sorts for the hot paths. Values are placeholders - the
+# planner's index choice depends on the shape, not on whether anything matches.
+QUERY_SHAPES: List[dict] = [
+    {"name": "dispatch board by status", "collection": "bookings",
+     "filter": {"status": "pending"}, "sort": {"booking_datetime": -1}},
+    {"name": "driver jobs", "collection": "bookings",
+     "filter": {"driver_id": "x"}, "sort": {"booking_datetime": 1}},
+    {"name": "client invoice period", "collection": "bookings",
+     "filter": {"client_id": "x", "status": "completed",
+                "booking_datetime": {"$gte": "2026-01-01", "$lte": "2026-01-31T23:59:59"}},
+     "sort": {"booking_datetime": 1}},
+    {"name": "bookings by phone", "collection": "bookings",
+     "filter": {"phone_e164": "+447700900000"}, "sort": {"created_at": -1}},
+    {"name": "bookings by raw customer phone", "collection": "bookings",
+     "filter": {"customer_phone": {"$in": ["07700900000", "+447700900000"]}}, "sort": {"booking_datetime": -1}},
+    {"name": "vehicle day schedule", "collection": "bookings",
+     "filter": {"vehicle_id": "x", "booking_datetime": {"$gte": "2026-01-01", "$lt": "2026-01-02"}}},
+    {"name": "repeat group", "collection": "bookings",
+     "filter": {"repeat_group_id": "x"}},
+    {"name": "passenger login", "collection": "passengers",
+     "filter": {"phone_e164": "+447700900000"}},
+    {"name": "passenger by email", "collection": "passengers",
+     "filter": {"email": "someone@example.com"}},
+    {"name": "unread chat for booking", "collection": "chat_messages",
+     "filter": {"booking_id": "x", "sender_type": "dispatch", "read": False}},
+    {"name": "driver chat inbox", "collection": "chat_threads",
+     "filter": {"driver_id": "x"}, "sort": {"last_message_at": -1}},
+    {"name": "whatsapp unread badge", "collection": "whatsapp_messages",
+     "filter": {"read": False, "direction": {"$ne": "outbound"}}},
+    {"name": "whatsapp inbox", "collection": "whatsapp_messages",
+     "filter": {}, "sort": {"created_at": -1}},
+    {"name": "pending booking requests", "collection": "booking_requests",
+     "filter": {"status": "pending"}, "sort": {"created_at": -1}},
+    {"name": "due review sms", "collection": "scheduled_sms",
+     "filter": {"status": "pending", "send_at": {"$lte": "2026-01-01T00:00:00"}}},
+    {"name": "walkaround search", "collection": "walkaround_checks",
+     "filter": {"search_keys": {"$regex": "^AB12"}}, "sort": {"submitted_at": -1, "id": -1}},
+    {"name": "walkaround vehicle history", "collection": "walkaround_checks",
+     "filter": {"vehicle_id": "x"}, "sort": {"submitted_at": -1, "id": -1}},
+    {"name": "client invoices", "collection": "invoices",
+     "filter": {"client_id": "x"}, "sort": {"created_at": -1}},
+]
+
+
+# ========== APPLY / DRIFT ==========
+def _key_tuple(keys) -> tuple:
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys)
+
+
+def _compared_options(options: dict) -> dict:
+    return {name: options[name] for name in COMPARED_OPTIONS if options.get(name) not in (None, False)}
+
+
+async def apply_index_manifest(database) -> dict:
+    """Create every declared index; one failure (e.g. duplicate data) doesn't stop the rest"""
+    created, failed = 0, []
+    for collection_name, specs in INDEX_MANIFEST.items():
+        for spec in specs:
+            try:
+                await database[collection_name].create_index(spec["keys"], **spec["options"])
+                created += 1
+            except Exception as e:
+                failed.append({"collection": collection_name, "keys": spec["keys"], "error": str(e)})
+                logger.warning(f"Could not create index {spec['keys']} on {collection_name}: {e}")
+    return {"applied": created, "failed": failed}
+
+
+async def index_drift(database) -> dict:
+    """Diff the manifest against the live indexes, collection by collection"""
+    existing_collections = set(await database.list_collection_names())
+    report = {}
+    for collection_name in sorted(set(INDEX_MANIFEST) | existing_collections):
+        declared = {_key_tuple(spec["keys"]): _compared_options(spec["options"]) for spec in INDEX_MANIFEST.get(collection_name, [])}
+        live = {}
+        if collection_name in existing_collections:
+            for name, info in (await database[collection_name].index_information()).items():
+                if name != "_id_":
+                    live[_key_tuple(info["key"])] = (name, _compared_options(info))
+
+        missing = [list(keys) for keys in declared if keys not in live]
+        unexpected = [{"name": live[keys][0], "keys": list(keys)} for keys in live if keys not in declared]
+        mismatched = [
+            {"name": live[keys][0], "keys": list(keys), "declared": declared[keys], "live": live[keys][1]}
+            for keys in declared if keys in live and declared[keys] != live[keys][1]
+        ]
+        # GridFS buckets manage their own indexes
+        if collection_name.endswith((".files", ".chunks")):
+            unexpected = []
+        if missing or unexpected or mismatched:
+            report[collection_name] = {"missing": missing, "unexpected": unexpected, "mismatched": mismatched}
+
+    return {
+        "in_sync": not report,
+        "collections": report,
+        "checked_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+# ========== QUERY ADVISOR ==========
+def _plan_stages(plan) -> List[str]:
+    """Every stage name in an explain plan tree (classic or slot-based engine)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def advise_indexes(database) -> dict:
+    """explain() each registered query shape and flag collection scans and blocking sorts"""
+    results = []
+    for shape in QUERY_SHAPES:
+        command = {"find": shape["collection"], "filter": shape["filter"], "limit": 50}
+        if shape.get("sort"):
+            command["sort"] = shape["sort"]
+        try:
+            explained = await database.command({"explain": command, "verbosity": "queryPlanner"})
+        except Exception as e:
+            results.append({"name": shape["name"], "collection": shape["collection"], "error": str(e)})
+            continue
+
+        stages = _plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+        warnings = []
+        if "COLLSCAN" in stages:
+            warnings.append("collection scan")
+        if "SORT" in stages:
+            warnings.append("in-memory sort")
+        results.append({
+            "name": shape["name"],
+            "collection": shape["collection"],
+            "stages": stages,
+            "warnings": warnings,
+        })
+
+    flagged = [r for r in results if r.get("warnings") or r.get("error")]
+    return {"checked": len(results), "flagged": len(flagged), "results": results}
+
+
+# ========== CLI ==========
+async def _main(command: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    database = client[os.environ['DB_NAME']]
+    try:
+        if command == "apply":
+            result = await apply_index_manifest(database)
+        elif command == "advise":
+            result = await advise_indexes(database)
+        else:
+            result = await index_drift(database)
+    finally:
+        client.close()
+    print(json.dumps(result, indent=2, default=str))
+    return result
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "drift"
+    if command not in ("drift", "apply", "advise"):
+        print(__doc__)
+        sys.exit(2)
+    result = asyncio.run(_main(command))
+    # Non-zero exit when there is something to fix, so CI can gate on it
+    if command == "drift" and not result["in_sync"]:
+        sys.exit(1)
+    if command == "advise" and result["flagged"]:
+        sys.exit(1)
@@ -556,6 +556,37 @@ def get_corporate_request_rejected_template(contact_name: str, company_name: str
     return get_base_template(content)
 
 
+def get_corporate_invoice_issued_template(contact_name: str, company_name: str, invoice_details: dict) -> str:
+    content = f"""
+        <h2 style="color: #1a1a1a; margin: 0 0 20px 0; font-size: 22px;">Your Invoice Is Ready</h2>
+        
+        <p style="color: #333333; font-size: 16px; line-height: 1.6;">Dear {contact_name},</p>
+        
+        <p style="color: #555555; font-size: 15px; line-height: 1.6;">
+            Please find below a summary of the invoice for <strong>{company_name}</strong> covering {invoice_details.get('period', 'this period')}.
+        </p>
+        
+        <div style="background-color: #f8f9fa; border-radius: 8px; padding: 20px; margin: 25px 0;">
+            <table style="width: 100%; font-size: 14px; color: #333333;">
+                <tr><td style="padding: 5px 0;"><strong>Reference:</strong></td><td>{invoice_details.get('invoice_ref', '')}</td></tr>
+                <tr><td style="padding: 5px 0;"><strong>Journeys:</strong></td><td>{invoice_details.get('journey_count', 0)}</td></tr>
+                <tr><td style="padding: 5px 0;"><strong>Amount Due:</strong></td><td>£{invoice_details.get('total', 0):.2f}</td></tr>
+                <tr><td style="padding: 5px 0;"><strong>Payment Due:</strong></td><td>{invoice_details.get('due_date', '')}</td></tr>
+            </table>
+        </div>
+        
+        <p style="color: #555555; font-size: 15px; line-height: 1.6;">
+            You can view and download the full invoice by logging into our Client Portal.
+        </p>
+        
+        <p style="color: #333333; font-size: 15px; line-height: 1.6; margin-top: 30px;">
+            Kind regards,<br>
+            <strong style="color: #D4A853;">The CJ's Executive Travel Team</strong>
+        </p>
+    """
+    return get_base_template(content)
+
+
 # ==================== EMAIL SENDING FUNCTION ====================
 
 import re
@@ -711,3 +742,11 @@ def send_corporate_request_rejected_email(email: str, contact_name: str, company
         return False
     html = get_corporate_request_rejected_template(contact_name, company_name, reason)
     return send_email(email, "Booking Request Update - CJ's Executive Travel", html)
+
+
+def send_corporate_invoice_issued_email(email: str, contact_name: str, company_name: str, invoice_details: dict) -> bool:
+    """Send new invoice notification to corporate client"""
+    if not email:
+        return False
+    html = get_corporate_invoice_issued_template(contact_name, company_name, invoice_details)
+    return send_email(email, f"Invoice {invoice_details.get('invoice_ref', '')} - CJ's Executive Travel", html)
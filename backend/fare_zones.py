@@ -0,0 +1,234 @@
+"""
+Compiled fare-zone matcher for CJ's Executive Travel
+
+calculate_fare_from_locations used to walk every zone and substring-test each
+postcode and area name against the dropoff, so "SR1" also matched "SR10" and
+zone boundaries were never checked. FareZoneMatcher compiles the dropoff
+zones once:
+
+- postcodes go into a trie keyed by area / district / sector / unit
+  ("SR", "SR1", "SR1 3", "SR1 3LE"), so a zone matches the postcode it names
+  and everything inside it, and nothing else;
+- area names (and any postcode entry that isn't a postcode) go into one
+  Aho-Corasick automaton, matched case-insensitively on word boundaries;
+- boundary polygons go into a lat/lng grid, and a dropoff with coordinates is
+  tested point-in-polygon against the polygons in its cell only.
+
+When several zones match, the one stored first wins, as before.
+matcher_for(zones) rebuilds only when it is handed a different zones list,
+which with reference_cache means only after the zones are edited.
+"""
+
+import re
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DROPOFF_ZONE_TYPES = ("dropoff", "both")
+GRID_CELL_DEGREES = 0.05
+
+_FULL_POSTCODE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?) ?(\d)([A-Z]{2})\b")
+_TRAILING_OUTWARD = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?)$")
+_TRAILING_COUNTRY = re.compile(r"[,\s]*(UK|GB|UNITED KINGDOM|ENGLAND)\s*$")
+_ZONE_AREA = re.compile(r"^[A-Z]{1,2}$")
+_ZONE_DISTRICT = re.compile(r"^([A-Z]{1,2})\d[A-Z\d]?$")
+_ZONE_SECTOR = re.compile(r"^(([A-Z]{1,2})\d[A-Z\d]?) (\d)$")
+_ZONE_UNIT = re.compile(r"^(([A-Z]{1,2})\d[A-Z\d]?) ?(\d)([A-Z]{2})$")
+_AREA_LETTERS = re.compile(r"^[A-Z]+")
+
+
+# ========== POSTCODES ==========
+def zone_postcode_path(entry: str) -> Optional[Tuple[str, ...]]:
+    """Trie path for a postcode written on a zone - "SR", "SR1", "SR1 3" or "SR1 3LE" - else None"""
+    text = " ".join(entry.upper().split())
+    if _ZONE_AREA.match(text):
+        return (text,)
+    m = _ZONE_DISTRICT.match(text)
+    if m:
+        return (m.group(1), text)
+    m = _ZONE_SECTOR.match(text)
+    if m:
+        return (m.group(2), m.group(1), f"{m.group(1)} {m.group(3)}")
+    m = _ZONE_UNIT.match(text)
+    if m:
+        sector = f"{m.group(1)} {m.group(3)}"
+        return (m.group(2), m.group(1), sector, sector + m.group(4))
+    return None
+
+
+def address_postcode_path(address: str) -> Optional[Tuple[str, ...]]:
+    """Trie path for the postcode in an address, or its outward code when that ends the address"""
+    text = address.upper()
+    matches = _FULL_POSTCODE.findall(text)
+    if matches:
+        outward, sector_digit, unit = matches[-1]
+        sector = f"{outward} {sector_digit}"
+        return (_AREA_LETTERS.match(outward).group(0), outward, sector, sector + unit)
+    text = _TRAILING_COUNTRY.sub("", text.strip())
+    m = _TRAILING_OUTWARD.search(text)
+    if m:
+        return (_AREA_LETTERS.match(m.group(1)).group(0), m.group(1))
+    return None
+
+
+class PostcodeTrie:
+    def __init__(self):
+        self._root: dict = {"children": {}, "zones": []}
+
+    def insert(self, path: Sequence[str], zone_index: int):
+        node = self._root
+        for key in path:
+            node = node["children"].setdefault(key, {"children": {}, "zones": []})
+        node["zones"].append(zone_index)
+
+    def match(self, path: Sequence[str]) -> List[int]:
+        """Zones on any prefix of path"""
+        found, node = [], self._root
+        for key in path:
+            node = node["children"].get(key)
+            if node is None:
+                break
+            found.extend(node["zones"])
+        return found
+
+
+# ========== AREA NAMES ==========
+class AhoCorasick:
+    """Case-insensitive multi-pattern search that only reports whole-word matches"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]  # (pattern length, zone index)
+
+    def add(self, pattern: str, zone_index: int):
+        pattern = " ".join(pattern.lower().split())
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), zone_index))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> List[int]:
+        text = " ".join(text.lower().split())
+        found, state = [], 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, zone_index in self._out[state]:
+                start = end - length
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    found.append(zone_index)
+        return found
+
+
+# ========== BOUNDARIES ==========
+def point_in_polygon(lat: float, lng: float, polygon: Sequence[Tuple[float, float]]) -> bool:
+    """Ray casting; polygon is a list of (lat, lng) vertices"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lng_i = polygon[i]
+        lat_j, lng_j = polygon[j]
+        if (lng_i > lng) != (lng_j > lng) and lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i) + lat_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+class PolygonGrid:
+    def __init__(self, cell: float = GRID_CELL_DEGREES):
+        self.cell = cell
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, list]]] = {}
+
+    def _key(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(lat // self.cell), int(lng // self.cell)
+
+    def insert(self, polygon: list, zone_index: int):
+        lats = [p[0] for p in polygon]
+        lngs = [p[1] for p in polygon]
+        low, high = self._key(min(lats), min(lngs)), self._key(max(lats), max(lngs))
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                self._cells.setdefault((x, y), []).append((zone_index, polygon))
+
+    def match(self, lat: float, lng: float) -> List[int]:
+        return [zone_index for zone_index, polygon in self._cells.get(self._key(lat, lng), ())
+                if point_in_polygon(lat, lng, polygon)]
+
+
+def _boundary_points(boundary) -> Optional[list]:
+    try:
+        points = [(float(p["lat"]), float(p["lng"])) for p in boundary or ()]
+    except (KeyError, TypeError, ValueError):
+        return None
+    return points if len(points) >= 3 else None
+
+
+# ========== MATCHER ==========
+class FareZoneMatcher:
+    def __init__(self, zones: Sequence[dict]):
+        self.zones = [z for z in zones if z.get("zone_type") in DROPOFF_ZONE_TYPES]
+        self.postcodes = PostcodeTrie()
+        self.names = AhoCorasick()
+        self.boundaries = PolygonGrid()
+        # Only then is a dropoff's location worth looking up
+        self.has_boundaries = False
+        for index, zone in enumerate(self.zones):
+            for entry in zone.get("postcodes") or ():
+                path = zone_postcode_path(entry)
+                if path:
+                    self.postcodes.insert(path, index)
+                else:
+                    self.names.add(entry, index)
+            for area in zone.get("areas") or ():
+                self.names.add(area, index)
+            polygon = _boundary_points(zone.get("boundary"))
+            if polygon:
+                self.boundaries.insert(polygon, index)
+                self.has_boundaries = True
+        self.names.build()
+
+    def match(self, dropoff: str, lat: Optional[float] = None, lng: Optional[float] = None) -> Optional[dict]:
+        """First stored zone whose postcodes, areas or boundary contain the dropoff"""
+        candidates = []
+        path = address_postcode_path(dropoff or "")
+        if path:
+            candidates.extend(self.postcodes.match(path))
+        candidates.extend(self.names.search(dropoff or ""))
+        if lat is not None and lng is not None:
+            candidates.extend(self.boundaries.match(lat, lng))
+        return self.zones[min(candidates)] if candidates else None
+
+
+_compiled: Tuple[Optional[list], Optional[FareZoneMatcher]] = (None, None)
+
+
+def matcher_for(zones: list) -> FareZoneMatcher:
+    """The compiled matcher for this zones list, rebuilt only when the list object changes"""
+    global _compiled
+    source, matcher = _compiled
+    if source is not zones:
+        matcher = FareZoneMatcher(zones)
+        _compiled = (zones, matcher)
+    return matcher
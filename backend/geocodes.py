@@ -0,0 +1,182 @@
+"""
+Geocode store for CJ's Executive Travel
+
+Addresses are free text everywhere, so anything spatial had to send the text
+back to Google. The geocodes collection maps what we have already seen to a
+lat/lng:
+
+    addr:<normalised address>   from /directions legs, place details, geocoding
+    place:<google place_id>     from /places/details
+    postcode:<SR13LE>           postcode centroids, fetched after a postcode lookup
+
+Bookings get pickup_coords, dropoff_coords and stop_coords ({lat, lng,
+precision}) when they are created, resolved in one query against this store.
+Only addresses never seen before go to the Geocoding API, and if that fails
+the postcode centroid is used (precision "postcode") when one is known.
+"""
+
+import re
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+from pymongo import UpdateOne
+
+from fare_zones import address_postcode_path
+from route_cache import normalise_address
+
+logger = logging.getLogger("cjs_travel.geocodes")
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+POSTCODES_IO_URL = "https://api.postcodes.io/postcodes/{}"
+GEOCODE_CONCURRENCY = 4
+
+_LAT_LNG_TEXT = re.compile(r"^\s*-?\d{1,3}(\.\d+)?\s*,\s*-?\d{1,3}(\.\d+)?\s*$")
+
+
+def address_key(address: str) -> str:
+    return f"addr:{normalise_address(address)}"
+
+
+def place_key(place_id: str) -> str:
+    return f"place:{place_id}"
+
+
+def postcode_key(postcode: str) -> str:
+    return "postcode:" + postcode.replace(" ", "").upper()
+
+
+def is_lat_lng_text(text: str) -> bool:
+    """The driver app sends "lat,lng" strings as origins - nothing to learn from those"""
+    return bool(_LAT_LNG_TEXT.match(text or ""))
+
+
+def _location(value) -> Optional[dict]:
+    if not isinstance(value, dict):
+        return None
+    lat, lng = value.get("lat", value.get("latitude")), value.get("lng", value.get("longitude"))
+    if lat is None or lng is None:
+        return None
+    return {"lat": float(lat), "lng": float(lng)}
+
+
+async def remember(database, entries: Iterable[tuple]):
+    """Upsert (key, location, source[, address]) entries; ones without a location are skipped"""
+    now = datetime.now(timezone.utc)
+    operations = []
+    for entry in entries:
+        key, location, source = entry[:3]
+        location = _location(location)
+        if not location:
+            continue
+        doc = {"key": key, **location, "source": source, "updated_at": now}
+        if len(entry) > 3 and entry[3]:
+            doc["address"] = entry[3]
+        operations.append(UpdateOne({"key": key}, {"$set": doc}, upsert=True))
+    if operations:
+        try:
+            await database.geocodes.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"Failed to store {len(operations)} geocodes: {e}")
+
+
+async def remember_leg(database, origin: str, destination: str, leg: dict):
+    """Both ends of a Directions API leg, under the text that was asked for"""
+    entries = []
+    if not is_lat_lng_text(origin):
+        entries.append((address_key(origin), leg.get("start_location"), "directions", origin))
+    if not is_lat_lng_text(destination):
+        entries.append((address_key(destination), leg.get("end_location"), "directions", destination))
+    await remember(database, entries)
+
+
+async def remember_postcode_centroid(database, postcode: str):
+    """Fetch and store a postcode's centroid from postcodes.io unless it is already known"""
+    key = postcode_key(postcode)
+    if await database.geocodes.find_one({"key": key}, {"_id": 1}):
+        return
+    try:
+        async with httpx.AsyncClient() as http_client:
+            response = await http_client.get(POSTCODES_IO_URL.format(postcode.replace(" ", "")), timeout=5.0)
+        if response.status_code != 200:
+            return
+        result = response.json().get("result") or {}
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"Postcode centroid lookup failed for {postcode}: {e}")
+        return
+    await remember(database, [(key, {"lat": result.get("latitude"), "lng": result.get("longitude")}, "postcodes_io")])
+
+
+async def geocode_address(http_client: httpx.AsyncClient, address: str, api_key: str) -> Optional[dict]:
+    try:
+        response = await http_client.get(GEOCODE_URL, params={
+            "address": address, "key": api_key, "region": "uk", "components": "country:GB",
+        }, timeout=5.0)
+        data = response.json() if response.status_code == 200 else {}
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"Geocoding failed for an address: {e}")
+        return None
+    if data.get("status") != "OK" or not data.get("results"):
+        return None
+    return _location(data["results"][0].get("geometry", {}).get("location"))
+
+
+def _postcode_of(address: str) -> Optional[str]:
+    path = address_postcode_path(address)
+    return path[3] if path and len(path) == 4 else None
+
+
+async def resolve_coordinates(database, addresses: Iterable[str], api_key: Optional[str]) -> Dict[str, dict]:
+    """address -> {lat, lng, precision} for every address that can be placed"""
+    addresses = {a for a in addresses if a}
+    if not addresses:
+        return {}
+    resolved: Dict[str, dict] = {}
+    for address in addresses:
+        if is_lat_lng_text(address):
+            lat, lng = (float(part) for part in address.split(","))
+            resolved[address] = {"lat": lat, "lng": lng, "precision": "exact"}
+    pending = addresses - set(resolved)
+
+    keys = {address_key(a) for a in pending} | {postcode_key(p) for p in map(_postcode_of, pending) if p}
+    known = {doc["key"]: doc async for doc in database.geocodes.find({"key": {"$in": list(keys)}}, {"_id": 0})}
+    missing = []
+    for address in pending:
+        doc = known.get(address_key(address))
+        if doc:
+            resolved[address] = {"lat": doc["lat"], "lng": doc["lng"], "precision": "address"}
+        else:
+            missing.append(address)
+
+    if missing and api_key:
+        semaphore = asyncio.Semaphore(GEOCODE_CONCURRENCY)
+        async with httpx.AsyncClient() as http_client:
+            async def geocode(address):
+                async with semaphore:
+                    return address, await geocode_address(http_client, address, api_key)
+            results = await asyncio.gather(*(geocode(a) for a in missing))
+        found = [(address, location) for address, location in results if location]
+        await remember(database, [(address_key(a), loc, "geocoding", a) for a, loc in found])
+        for address, location in found:
+            resolved[address] = {**location, "precision": "address"}
+
+    for address in missing:
+        if address in resolved:
+            continue
+        postcode = _postcode_of(address)
+        doc = known.get(postcode_key(postcode)) if postcode else None
+        if doc:
+            resolved[address] = {"lat": doc["lat"], "lng": doc["lng"], "precision": "postcode"}
+    return resolved
+
+
+def booking_coordinates(coordinates: Dict[str, dict], pickup: str, dropoff: str,
+                        stops: Optional[List[str]] = None) -> dict:
+    """The coordinate fields stored on a booking, from resolve_coordinates() output"""
+    return {
+        "pickup_coords": coordinates.get(pickup),
+        "dropoff_coords": coordinates.get(dropoff),
+        "stop_coords": [coordinates.get(stop) for stop in stops] if stops else None,
+    }
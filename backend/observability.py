@@ -0,0 +1,384 @@
+"""
+Request metrics for CJ's Executive Travel
+
+A pymongo CommandListener and the HTTP middleware in server.py record, per
+request: wall time, Mongo command count/time and outbound HTTP time per
+provider. Totals are kept in-process and rendered in the Prometheus text
+format by the /api/metrics endpoint; the same per-request numbers can be
+echoed back as a Server-Timing header.
+
+Import this module before any AsyncIOMotorClient is created - pymongo only
+attaches globally registered listeners to clients built afterwards.
+
+With LOOP_WATCHDOG_MS set, a watchdog thread also watches the event loop and
+logs the stack and route of any callback that blocks it for longer than that.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import contextvars
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from pymongo import monitoring
+
+logger = logging.getLogger("cjs_travel.observability")
+
+# Server-Timing on every response; otherwise only when the request asks for it
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Test/bench deployments only: list each request's Mongo commands and outbound calls in response headers
+QUERY_LOG_HEADERS = os.environ.get('QUERY_LOG_HEADERS', '').lower() in ('1', 'true', 'yes')
+# Event-loop stall threshold; 0 leaves the watchdog off
+LOOP_WATCHDOG_MS = int(os.environ.get('LOOP_WATCHDOG_MS', '0') or 0)
+LOOP_HEARTBEAT_SECONDS = 0.05
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# Driver housekeeping, not application queries
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "ping", "endSessions", "buildInfo"}
+
+# Outbound hosts grouped by the provider they bill to
+PROVIDER_HOSTS = {
+    "googleapis.com": "google_maps",
+    "getaddress.io": "getaddress",
+    "postcodes.io": "postcodes_io",
+    "twilio.com": "twilio",
+    "nexmo.com": "vonage",
+    "vonage.com": "vonage",
+    "stripe.com": "stripe",
+    "aviationstack.com": "aviationstack",
+    "emergentagent.com": "emergent",
+}
+
+
+# ========== METRIC TYPES ==========
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, tuple(buckets)
+        # label values -> [per-bucket counts..., sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.labels, values, le)} {series[i]}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, values, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, values)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, values)} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "cjs_http_request_duration_seconds", "Request wall time by route template", ("method", "route", "status"))
+REQUEST_MONGO_COMMANDS = Histogram(
+    "cjs_http_request_mongo_commands", "Mongo commands issued per request", ("method", "route"), QUERY_COUNT_BUCKETS)
+REQUEST_MONGO_SECONDS = Histogram(
+    "cjs_http_request_mongo_seconds", "Mongo time per request", ("method", "route"))
+MONGO_COMMANDS = Counter(
+    "cjs_mongo_commands_total", "Mongo commands by name", ("command", "outcome"))
+MONGO_SECONDS = Counter(
+    "cjs_mongo_command_seconds_total", "Mongo time by command name", ("command",))
+OUTBOUND_LATENCY = Histogram(
+    "cjs_outbound_http_duration_seconds", "Outbound HTTP time by provider", ("provider", "outcome"))
+LOOP_LAG = Histogram(
+    "cjs_event_loop_lag_seconds", "How late the watchdog heartbeat woke up")
+LOOP_STALLS = Counter(
+    "cjs_event_loop_stalls_total", "Callbacks that blocked the event loop past LOOP_WATCHDOG_MS", ("route",))
+
+METRICS = [
+    REQUEST_LATENCY, REQUEST_MONGO_COMMANDS, REQUEST_MONGO_SECONDS, MONGO_COMMANDS, MONGO_SECONDS,
+    OUTBOUND_LATENCY, LOOP_LAG, LOOP_STALLS,
+]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ========== PER-REQUEST STATS ==========
+class RequestStats:
+    __slots__ = ("mongo_count", "mongo_seconds", "http_seconds", "commands", "http_calls", "_lock")
+
+    def __init__(self):
+        self.mongo_count = 0
+        self.mongo_seconds = 0.0
+        self.http_seconds: Dict[str, float] = {}
+        # "find bookings", "aggregate clients" ... in issue order
+        self.commands: List[str] = []
+        self.http_calls: List[str] = []
+        # Motor runs commands on executor threads
+        self._lock = threading.Lock()
+
+    def add_mongo(self, seconds: float):
+        with self._lock:
+            self.mongo_count += 1
+            self.mongo_seconds += seconds
+
+    def add_command(self, description: str):
+        with self._lock:
+            self.commands.append(description)
+
+    def add_http(self, provider: str, seconds: float):
+        with self._lock:
+            self.http_seconds[provider] = self.http_seconds.get(provider, 0.0) + seconds
+            self.http_calls.append(provider)
+
+    def server_timing(self, total_seconds: float) -> str:
+        parts = [
+            f'db;dur={self.mongo_seconds * 1000:.1f};desc="{self.mongo_count} queries"',
+        ]
+        for provider, seconds in sorted(self.http_seconds.items()):
+            parts.append(f"{provider};dur={seconds * 1000:.1f}")
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+# Motor copies the context onto its executor threads, so listeners see this too
+current_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request_stats", default=None)
+
+
+def route_label(request) -> str:
+    """The matched route template, so /bookings/{id} is one series rather than one per booking"""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def record_request(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    REQUEST_LATENCY.observe(seconds, method, route, str(status))
+    REQUEST_MONGO_COMMANDS.observe(stats.mongo_count, method, route)
+    REQUEST_MONGO_SECONDS.observe(stats.mongo_seconds, method, route)
+
+
+# ========== MONGO ==========
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        stats = current_request_stats.get()
+        if stats is not None:
+            target = event.command.get(event.command_name)
+            stats.add_command(f"{event.command_name} {target}" if isinstance(target, str) else event.command_name)
+
+    def _record(self, event, outcome: str):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMANDS.inc(event.command_name, outcome)
+        MONGO_SECONDS.inc(event.command_name, amount=seconds)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.add_mongo(seconds)
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+
+monitoring.register(MongoCommandListener())
+
+
+# ========== OUTBOUND HTTP ==========
+def provider_for(url) -> str:
+    host = (urlsplit(str(url)).hostname or "").lower()
+    for suffix, provider in PROVIDER_HOSTS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return provider
+    return host or "unknown"
+
+
+def record_outbound(provider: str, seconds: float, outcome: str):
+    OUTBOUND_LATENCY.observe(seconds, provider, outcome)
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.add_http(provider, seconds)
+
+
+_http_instrumented = False
+
+
+def instrument_http_clients():
+    """
+    Time every httpx and requests call. Outbound calls are made from throwaway
+    clients all over the codebase (and inside the Twilio/Vonage SDKs), so the
+    hook goes on the send methods rather than on each client.
+    """
+    global _http_instrumented
+    if _http_instrumented:
+        return
+    _http_instrumented = True
+
+    import httpx
+    import requests
+
+    original_async_send = httpx.AsyncClient.send
+
+    async def timed_async_send(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await original_async_send(self, request, *args, **kwargs)
+            outcome = "ok" if response.status_code < 500 else "error"
+            return response
+        finally:
+            record_outbound(provider_for(request.url), time.perf_counter() - started, outcome)
+
+    httpx.AsyncClient.send = timed_async_send
+
+    original_sync_send = requests.Session.send
+
+    def timed_sync_send(self, request, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = original_sync_send(self, request, **kwargs)
+            outcome = "ok" if response.status_code < 500 else "error"
+            return response
+        finally:
+            record_outbound(provider_for(request.url), time.perf_counter() - started, outcome)
+
+    requests.Session.send = timed_sync_send
+
+
+# ========== EVENT LOOP WATCHDOG ==========
+def _route_from_stack(frame) -> str:
+    """Find the ASGI scope on the blocked stack and name the route it was serving"""
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") in ("http", "websocket"):
+            route = scope.get("route")
+            return getattr(route, "path", None) or scope.get("path", "unmatched")
+        frame = frame.f_back
+    return "background"
+
+
+class LoopWatchdog:
+    """
+    A heartbeat task ticks on the loop; a plain thread checks the tick. If the
+    tick is older than the threshold, whatever is on the loop thread's stack is
+    the blocking call - sync SDKs, smtplib, ReportLab, password hashing.
+    """
+
+    def __init__(self, threshold_seconds: float):
+        self.threshold = threshold_seconds
+        self._beat = time.monotonic()
+        self._reported_beat = None
+        self._stall_route = None
+        self._loop_thread = None
+        self._heartbeat_task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info(f"Event loop watchdog on, threshold {self.threshold * 1000:.0f}ms")
+
+    def stop(self):
+        self._stopped.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    async def _heartbeat(self):
+        while not self._stopped.is_set():
+            expected = time.monotonic() + LOOP_HEARTBEAT_SECONDS
+            await asyncio.sleep(LOOP_HEARTBEAT_SECONDS)
+            now = time.monotonic()
+            LOOP_LAG.observe(max(0.0, now - expected))
+            if self._stall_route is not None:
+                logger.warning(f"Event loop stall in {self._stall_route} lasted {(now - self._beat) * 1000:.0f}ms")
+                self._stall_route = None
+            self._beat = now
+
+    def _watch(self):
+        while not self._stopped.wait(min(self.threshold / 2, LOOP_HEARTBEAT_SECONDS)):
+            beat = self._beat
+            if beat == self._reported_beat or time.monotonic() - beat < self.threshold:
+                continue
+            # One report per stall, taken while the offending call is still on the stack
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            route = _route_from_stack(frame)
+            self._stall_route = route
+            LOOP_STALLS.inc(route)
+            logger.warning(
+                f"Event loop blocked for over {self.threshold * 1000:.0f}ms in {route}:\n"
+                + "".join(traceback.format_stack(frame))
+            )
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog():
+    global _watchdog
+    if LOOP_WATCHDOG_MS > 0 and _watchdog is None:
+        _watchdog = LoopWatchdog(LOOP_WATCHDOG_MS / 1000)
+        _watchdog.start()
+
+
+def stop_loop_watchdog():
+    global _watchdog
+    if _watchdog is not None:
+        _watchdog.stop()
+        _watchdog = None
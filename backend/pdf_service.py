@@ -0,0 +1,643 @@
+"""
+PDF rendering service for CJ's Executive Travel
+
+ReportLab is CPU bound and blocks whichever thread runs it, so documents are
+rendered in a process pool and the finished files are kept in GridFS under a
+hash of the content they were rendered from. An unchanged invoice or
+walkaround certificate is streamed back from storage without re-rendering.
+"""
+
+import os
+import io
+import json
+import base64
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi.responses import StreamingResponse
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.lib.enums import TA_CENTER
+
+logger = logging.getLogger(__name__)
+
+# Bump when a layout changes so previously cached files are rendered again
+PDF_RENDER_VERSION = "2"
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_CACHE_BUCKET = "pdf_cache"
+# Journey rows per ReportLab table; one huge table is laid out far slower than many small ones
+INVOICE_TABLE_CHUNK = 200
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'logo_border.png')
+
+
+# ========== INVOICE PAYLOAD ==========
+def invoice_row(booking: dict, fare: float) -> dict:
+    """Flatten a booking into the fields the invoice journey table prints"""
+    journey_text = f"P: {booking.get('pickup_location', '')}<br/>D: {booking.get('dropoff_location', '')}"
+    for i, stop in enumerate(booking.get('additional_stops') or []):
+        journey_text = journey_text.replace("D:", f"V{i+1}: {stop}<br/>D:")
+
+    return {
+        "ref": booking.get('booking_id', ''),
+        "passenger": f"{booking.get('first_name', '')} {booking.get('last_name', '')}".strip() or "N/A",
+        "journey": journey_text,
+        "fare": fare,
+    }
+
+
+def build_invoice_payload(
+    invoice_ref: str,
+    client: dict,
+    tax_date: datetime,
+    due_date: datetime,
+    payment_terms: int,
+    vat_rate: float,
+    vat_label: str,
+    subtotal: float,
+    vat_amount: float,
+    total: float,
+    rows: List[dict],
+) -> dict:
+    """Everything the invoice renderer prints, as plain JSON-safe values"""
+    address_lines = [line.strip() for line in (client.get('address') or '').split('\n')]
+    return {
+        "invoice_ref": invoice_ref,
+        "account_no": client.get('account_no') or '',
+        "tax_date": tax_date.strftime('%d/%m/%Y'),
+        "due_date": due_date.strftime('%d/%m/%Y'),
+        "payment_terms": payment_terms,
+        "client": {
+            "name": client.get('name') or '',
+            "contact_name": client.get('contact_name') or '',
+            "address_lines": [line for line in address_lines if line],
+            "town_city": client.get('town_city') or '',
+            "post_code": client.get('post_code') or client.get('postcode') or '',
+            "country": client.get('country') or '',
+        },
+        "vat_rate": vat_rate,
+        "vat_label": vat_label,
+        "subtotal": subtotal,
+        "vat_amount": vat_amount,
+        "total": total,
+        "rows": rows,
+    }
+
+
+# ========== RENDERERS ==========
+def render_invoice_pdf(payload: dict) -> bytes:
+    """Render a client invoice - matches CJ's Executive Travel template"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=60)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Gold and Black color scheme
+    header_black = colors.HexColor('#1a1a1a')
+    gold_accent = colors.HexColor('#D4AF37')
+
+    company_style = ParagraphStyle('company', parent=styles['Normal'], fontSize=14, fontName='Helvetica-Bold', textColor=header_black)
+    normal_style = ParagraphStyle('normal', parent=styles['Normal'], fontSize=9, leading=12)
+    small_style = ParagraphStyle('small', parent=styles['Normal'], fontSize=8, leading=10, textColor=colors.grey)
+    label_style = ParagraphStyle('label', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
+    value_style = ParagraphStyle('value', parent=styles['Normal'], fontSize=9, fontName='Helvetica-Bold')
+
+    client = payload['client']
+    rows = payload['rows']
+    vat_rate = payload['vat_rate']
+
+    # ========== HEADER SECTION WITH LOGO ==========
+    try:
+        logo = Image(LOGO_PATH, width=60, height=60)
+    except Exception:
+        logo = Spacer(60, 60)
+
+    company_info = [
+        [Paragraph("<b>CJ's Executive Travel Limited</b>", company_style)],
+        [Paragraph("Unit 5 Peterlee SR8 2HY", normal_style)],
+        [Paragraph("Phone: +44 1917721223", normal_style)],
+        [Paragraph("Email: admin@cjsdispatch.co.uk", normal_style)],
+        [Paragraph("Web: cjsdispatch.co.uk", normal_style)],
+    ]
+    company_table = Table(company_info, colWidths=[200])
+    company_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+    ]))
+
+    # Logo + Company info combined
+    logo_company = Table([[logo, company_table]], colWidths=[70, 200])
+    logo_company.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (0, 0), 0),
+        ('RIGHTPADDING', (0, 0), (0, 0), 10),
+    ]))
+
+    # Invoice details box on right
+    invoice_details = [
+        [Paragraph("ACCOUNT NO", label_style), Paragraph(payload['account_no'], value_style)],
+        [Paragraph("REFERENCE", label_style), Paragraph(payload['invoice_ref'], value_style)],
+        [Paragraph("TAX DATE", label_style), Paragraph(payload['tax_date'], value_style)],
+    ]
+    invoice_box = Table(invoice_details, colWidths=[70, 100])
+    invoice_box.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
+    ]))
+
+    header_table = Table([[logo_company, invoice_box]], colWidths=[340, 180])
+    header_table.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+    elements.append(header_table)
+    elements.append(Spacer(1, 20))
+
+    # ========== BILLING DETAILS ==========
+    billing_info = [
+        [Paragraph("<b>For the attention of:</b>", normal_style)],
+        [Paragraph(f"<b>{client['name']}</b>", value_style)],
+    ]
+    if client['contact_name']:
+        billing_info.append([Paragraph(client['contact_name'], normal_style)])
+    for line in client['address_lines']:
+        billing_info.append([Paragraph(line, normal_style)])
+    for key in ('town_city', 'post_code', 'country'):
+        if client[key]:
+            billing_info.append([Paragraph(client[key], normal_style)])
+
+    billing_table = Table(billing_info, colWidths=[300])
+    billing_table.setStyle(TableStyle([
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+    ]))
+    elements.append(billing_table)
+    elements.append(Spacer(1, 20))
+
+    # ========== INVOICE SUMMARY BOX - Gold/Black ==========
+    summary_title = Table([[Paragraph("<b>INVOICE SUMMARY</b>", ParagraphStyle('sum_title', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
+    summary_title.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), header_black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    elements.append(summary_title)
+
+    summary_data = [[
+        Paragraph("<b>Journeys:</b>", normal_style),
+        Paragraph(f"{len(rows)} Journeys", normal_style),
+        Paragraph(f"Amount: £{payload['subtotal']:.2f}", normal_style),
+    ]]
+    summary_table = Table(summary_data, colWidths=[150, 200, 170])
+    summary_table.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 10))
+
+    # Totals box
+    totals_data = [
+        [Paragraph("Subtotal:", normal_style), Paragraph(f"£{payload['subtotal']:.2f}", value_style)],
+        [Paragraph(f"{payload['vat_label']}:", normal_style), Paragraph(f"£{payload['vat_amount']:.2f}", value_style)],
+        [Paragraph("<b>Total:</b>", value_style), Paragraph(f"<b>£{payload['total']:.2f}</b>", ParagraphStyle('total', fontSize=12, fontName='Helvetica-Bold'))],
+    ]
+    totals_table = Table(totals_data, colWidths=[100, 80])
+    totals_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
+        ('LINEABOVE', (0, 2), (-1, 2), 1, colors.black),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+
+    # Right-align totals
+    elements.append(Table([[Spacer(1, 1), totals_table]], colWidths=[340, 180]))
+    elements.append(Spacer(1, 15))
+
+    # Payment terms
+    terms_data = [[
+        Paragraph(f"<b>Payment Terms:</b> {payload['payment_terms']} days", normal_style),
+        Paragraph(f"<b>Payment Due:</b> {payload['due_date']}", normal_style),
+    ]]
+    elements.append(Table(terms_data, colWidths=[260, 260]))
+    elements.append(Spacer(1, 20))
+
+    # ========== JOURNEYS TABLE - Gold/Black ==========
+    if rows:
+        journey_header = Table([[Paragraph("<b>JOURNEY DETAILS</b>", ParagraphStyle('jh', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
+        journey_header.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), header_black),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ]))
+        elements.append(journey_header)
+
+        th_style = ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')
+        header_row = [
+            Paragraph("<b>Item</b>", th_style),
+            Paragraph("<b>Booker/Passenger</b>", th_style),
+            Paragraph("<b>Journey/Tariff</b>", th_style),
+            Paragraph("<b>Cost</b>", th_style),
+            Paragraph("<b>Tax</b>", th_style),
+            Paragraph("<b>Total</b>", th_style),
+        ]
+
+        # Rows go in as a run of stacked tables so layout cost stays linear
+        for start in range(0, len(rows), INVOICE_TABLE_CHUNK):
+            table_data = [header_row] if start == 0 else []
+            for idx, row in enumerate(rows[start:start + INVOICE_TABLE_CHUNK], start + 1):
+                fare = row['fare']
+                tax = fare * vat_rate
+                table_data.append([
+                    Paragraph(str(idx), small_style),
+                    Paragraph(f"{row['ref']}<br/>{row['passenger']}", small_style),
+                    Paragraph(row['journey'], small_style),
+                    Paragraph(f"£{fare:.2f}", small_style),
+                    Paragraph(f"£{tax:.2f}", small_style),
+                    Paragraph(f"£{fare + tax:.2f}", small_style),
+                ])
+
+            journey_table = Table(table_data, colWidths=[30, 80, 230, 55, 55, 55], repeatRows=1 if start == 0 else 0)
+            table_style = [
+                ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('GRID', (0, 0), (-1, -1), 0.5, gold_accent),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+                ('TOPPADDING', (0, 0), (-1, -1), 6),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+                ('LEFTPADDING', (0, 0), (-1, -1), 4),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ]
+            if start == 0:
+                table_style.append(('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FDF8E8')))
+            journey_table.setStyle(TableStyle(table_style))
+            elements.append(journey_table)
+        elements.append(Spacer(1, 20))
+
+    # ========== FOOTER - BANKING DETAILS - Gold/Black ==========
+    bank_title = Table([[Paragraph("<b>BANKING DETAILS</b>", ParagraphStyle('bt', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
+    bank_title.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), header_black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(bank_title)
+
+    bank_data = [
+        [Paragraph("Bank Name:", label_style), Paragraph("Starling Bank", normal_style),
+         Paragraph("Sort Code:", label_style), Paragraph("60-83-71", normal_style)],
+        [Paragraph("Account No:", label_style), Paragraph("15222155", normal_style),
+         Paragraph("BIC:", label_style), Paragraph("SRLGGB2L", normal_style)],
+        [Paragraph("IBAN:", label_style), Paragraph("GB31SRLG60837115222155", normal_style),
+         Paragraph("VAT No:", label_style), Paragraph("354626783", normal_style)],
+    ]
+    bank_table = Table(bank_data, colWidths=[70, 130, 70, 130])
+    bank_table.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
+    ]))
+    elements.append(bank_table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_walkaround_pdf(check_data: dict) -> bytes:
+    """Generate a PDF certificate for the walkaround check"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                           leftMargin=20*mm, rightMargin=20*mm,
+                           topMargin=15*mm, bottomMargin=15*mm)
+
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1e3a5f'),
+        alignment=TA_CENTER,
+        spaceAfter=10
+    )
+
+    header_style = ParagraphStyle(
+        'Header',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#1e3a5f'),
+        spaceAfter=5
+    )
+
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=3
+    )
+
+    # Title
+    elements.append(Paragraph("CJ's Executive Travel", title_style))
+    elements.append(Paragraph("Walk Around Check Certificate", header_style))
+    elements.append(Spacer(1, 10))
+
+    # Info section
+    submitted_at = check_data.get('submitted_at', datetime.now(timezone.utc))
+    if isinstance(submitted_at, str):
+        submitted_at = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
+
+    info_data = [
+        ['Check Number:', check_data.get('check_number', 'N/A'), 'Date:', submitted_at.strftime('%d/%m/%Y')],
+        ['Vehicle:', check_data.get('vehicle_reg', 'N/A'), 'Time:', submitted_at.strftime('%H:%M')],
+        ['Driver:', check_data.get('driver_name', 'N/A'), 'Type:', check_data.get('check_type', 'Daily').title()],
+    ]
+
+    info_table = Table(info_data, colWidths=[70, 150, 50, 100])
+    info_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a5f')),
+        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#1e3a5f')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ]))
+    elements.append(info_table)
+    elements.append(Spacer(1, 15))
+
+    # Checklist Section Header
+    elements.append(Paragraph("Checklist Items", header_style))
+    elements.append(Spacer(1, 5))
+
+    # Build checklist table - 2 columns
+    checklist = check_data.get('checklist', {})
+    items = list(checklist.items())
+
+    # Split into two columns
+    half = (len(items) + 1) // 2
+    col1_items = items[:half]
+    col2_items = items[half:]
+
+    checklist_data = []
+    for i in range(max(len(col1_items), len(col2_items))):
+        row = []
+        if i < len(col1_items):
+            item, passed = col1_items[i]
+            status = '✓' if passed else '✗'
+            row.extend([status, item])
+        else:
+            row.extend(['', ''])
+
+        if i < len(col2_items):
+            item, passed = col2_items[i]
+            status = '✓' if passed else '✗'
+            row.extend([status, item])
+        else:
+            row.extend(['', ''])
+
+        checklist_data.append(row)
+
+    checklist_table = Table(checklist_data, colWidths=[20, 160, 20, 160])
+    checklist_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.green),
+        ('TEXTCOLOR', (2, 0), (2, -1), colors.green),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    elements.append(checklist_table)
+    elements.append(Spacer(1, 15))
+
+    # Defects Section
+    elements.append(Paragraph("Defects Reported", header_style))
+    defects = (check_data.get('defects') or '').strip()
+    if defects:
+        elements.append(Paragraph(defects, normal_style))
+    else:
+        elements.append(Paragraph("Nil", ParagraphStyle('Green', parent=normal_style, textColor=colors.green)))
+    elements.append(Spacer(1, 15))
+
+    # Agreement Section
+    elements.append(Paragraph("Declaration", header_style))
+    elements.append(Paragraph(
+        "I confirm that I have checked these items against company Daily Check policy.",
+        normal_style
+    ))
+    elements.append(Spacer(1, 15))
+
+    # Signature Section
+    elements.append(Paragraph("Driver Signature", header_style))
+
+    signature_data = check_data.get('signature')
+    signature_added = False
+
+    if signature_data:
+        try:
+            # Remove data URL prefix if present (e.g., "data:image/png;base64,")
+            if ',' in signature_data:
+                signature_data = signature_data.split(',')[1]
+
+            # Decode base64 signature to image
+            sig_bytes = base64.b64decode(signature_data)
+            sig_buffer = io.BytesIO(sig_bytes)
+
+            # Validate the image using PIL
+            from PIL import Image as PILImage
+            pil_img = PILImage.open(sig_buffer)
+            pil_img.verify()  # Verify it's a valid image
+
+            # Reset buffer and create new one for reportlab
+            sig_buffer.seek(0)
+
+            # Create signature image for PDF
+            sig_image = Image(sig_buffer, width=150, height=60)
+
+            # Create table with signature image and date
+            sig_table_data = [
+                [sig_image, '', 'Date:', submitted_at.strftime('%d/%m/%Y')],
+                [check_data.get('driver_name', ''), '', '', ''],
+            ]
+            sig_table = Table(sig_table_data, colWidths=[160, 50, 40, 100])
+            sig_table.setStyle(TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('FONTNAME', (2, 0), (2, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 1), (0, 1), 9),
+                ('TEXTCOLOR', (0, 1), (0, 1), colors.gray),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ]))
+            elements.append(sig_table)
+            signature_added = True
+        except Exception as e:
+            logger.error(f"Error adding signature to PDF: {e}")
+
+    if not signature_added:
+        # No signature or error - show placeholder line
+        sig_data = [
+            ['Driver Signature:', '_' * 30, 'Date:', submitted_at.strftime('%d/%m/%Y')],
+            [check_data.get('driver_name', ''), '', '', ''],
+        ]
+        sig_table = Table(sig_data, colWidths=[100, 150, 40, 80])
+        sig_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTSIZE', (0, 1), (0, 1), 9),
+            ('FONTNAME', (0, 1), (0, 1), 'Helvetica'),
+            ('TEXTCOLOR', (0, 1), (0, 1), colors.gray),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ]))
+        elements.append(sig_table)
+
+    elements.append(Spacer(1, 20))
+
+    # Footer
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.gray,
+        alignment=TA_CENTER
+    )
+    elements.append(Paragraph("CJ's Executive Travel Limited", footer_style))
+    elements.append(Paragraph("Portacabin 5, 3 Cook Way, Peterlee, SR8 2HY", footer_style))
+    elements.append(Paragraph("Tel: 0191 722 1223 | Email: admin@cjsdispatch.co.uk | Web: cjsdispatch.co.uk", footer_style))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    "invoice": render_invoice_pdf,
+    "walkaround": render_walkaround_pdf,
+}
+
+
+# ========== PROCESS POOL ==========
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Lazily start the render pool (spawned, so workers never inherit Motor's threads)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_pdf_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def render_pdf(kind: str, payload: dict) -> bytes:
+    """Render off the event loop; a crashed worker pool is replaced once"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pdf_executor(), RENDERERS[kind], payload)
+    except BrokenProcessPool:
+        logger.warning("PDF render pool broke, restarting it")
+        shutdown_pdf_executor()
+        return await loop.run_in_executor(get_pdf_executor(), RENDERERS[kind], payload)
+
+
+# ========== GRIDFS CACHE ==========
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def pdf_cache_key(kind: str, payload: dict) -> str:
+    """Content address: same kind, layout version and payload -> same file"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{kind}:{PDF_RENDER_VERSION}:{canonical}".encode()).hexdigest()
+
+
+async def _render_and_store(bucket: AsyncIOMotorGridFSBucket, key: str, kind: str, payload: dict) -> bytes:
+    pdf_bytes = await render_pdf(kind, payload)
+    try:
+        await bucket.upload_from_stream(
+            key,
+            pdf_bytes,
+            metadata={"kind": kind, "created_at": datetime.now(timezone.utc).isoformat()},
+        )
+    except Exception as e:
+        logger.warning(f"Could not cache {kind} PDF {key[:12]}: {e}")
+    return pdf_bytes
+
+
+async def _iter_grid_out(grid_out):
+    while True:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _render_once(bucket: AsyncIOMotorGridFSBucket, key: str, kind: str, payload: dict) -> bytes:
+    """Concurrent misses for the same document share one render"""
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_render_and_store(bucket, key, kind, payload))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+async def pdf_response(database, kind: str, payload: dict, filename: str) -> StreamingResponse:
+    """Stream a cached PDF from GridFS, rendering and storing it on a miss"""
+    bucket = AsyncIOMotorGridFSBucket(database, bucket_name=PDF_CACHE_BUCKET)
+    key = pdf_cache_key(kind, payload)
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "ETag": f'"{key}"'}
+
+    try:
+        grid_out = await bucket.open_download_stream_by_name(key)
+        return StreamingResponse(_iter_grid_out(grid_out), media_type="application/pdf", headers=headers)
+    except NoFile:
+        pass
+
+    pdf_bytes = await _render_once(bucket, key, kind, payload)
+    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers=headers)
+
+
+async def ensure_pdf_cached(database, kind: str, payload: dict) -> str:
+    """Render into the cache ahead of the first download; returns the cache key"""
+    key = pdf_cache_key(kind, payload)
+    if await database[f"{PDF_CACHE_BUCKET}.files"].find_one({"filename": key}, {"_id": 1}) is None:
+        bucket = AsyncIOMotorGridFSBucket(database, bucket_name=PDF_CACHE_BUCKET)
+        await _render_once(bucket, key, kind, payload)
+    return key
@@ -0,0 +1,174 @@
+"""
+Short-TTL cache of authenticated principals for CJ's Executive Travel
+
+get_current_driver / get_current_passenger / get_current_client used to run a
+find_one on every authenticated request, and the driver app makes several of
+those every few seconds per driver. The dependencies now go through
+principal_cache, which keeps each driver, passenger or client document for
+PRINCIPAL_CACHE_TTL_SECONDS (default 30, 0 disables it).
+
+Entries are invalidated by a pymongo CommandListener that watches every
+update / delete / findAndModify on the drivers, passengers and clients
+collections: a write filtered on "id" drops that entry, any other filter drops
+the whole kind. Invalidation is per process - other workers catch up within
+the TTL, so a deleted account is refused everywhere within that time.
+
+Like observability, import this module before any AsyncIOMotorClient is created.
+"""
+
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '30') or 0)
+PRINCIPAL_CACHE_MAX_ENTRIES = 5000
+
+# Collection -> principal kind
+PRINCIPAL_COLLECTIONS = {"drivers": "driver", "passengers": "passenger", "clients": "client"}
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+        # Bumped on every invalidation so a lookup that raced a write is not cached
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._kind_generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _generation(self, kind: str, principal_id: str) -> Tuple[int, int]:
+        return self._kind_generations.get(kind, 0), self._generations.get((kind, principal_id), 0)
+
+    def get(self, kind: str, principal_id: str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        key = (kind, principal_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            document = entry[1]
+        # Handlers pop fields off the principal, so each caller gets its own copy
+        return copy.deepcopy(document)
+
+    def put(self, kind: str, principal_id: str, document: dict, generation: Tuple[int, int]):
+        if self.ttl <= 0:
+            return
+        key = (kind, principal_id)
+        with self._lock:
+            if self._generation(kind, principal_id) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(document))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def load(self, kind: str, principal_id: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """Cached principal, or loader()'s result (cached when found)"""
+        document = self.get(kind, principal_id)
+        if document is not None:
+            return document
+        with self._lock:
+            generation = self._generation(kind, principal_id)
+        document = await loader()
+        if document:
+            self.put(kind, principal_id, document, generation)
+        return document
+
+    def invalidate(self, kind: str, principal_id: Optional[str] = None):
+        with self._lock:
+            if principal_id is None:
+                self._kind_generations[kind] = self._kind_generations.get(kind, 0) + 1
+                for key in [key for key in self._entries if key[0] == kind]:
+                    del self._entries[key]
+            else:
+                key = (kind, principal_id)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES)
+
+
+def invalidate_principal(kind: str, principal_id: Optional[str] = None):
+    principal_cache.invalidate(kind, principal_id)
+
+
+# ========== WRITE LISTENER ==========
+def _filter_ids(query) -> Optional[list]:
+    """The ids a write filter is pinned to, or None when it may match any document"""
+    if not isinstance(query, dict):
+        return None
+    value = query.get("id")
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict) and set(value) == {"$in"} and all(isinstance(v, str) for v in value["$in"]):
+        return list(value["$in"])
+    return None
+
+
+class PrincipalWriteListener(monitoring.CommandListener):
+    """
+    Drops cached principals when a write to their collection is sent, and
+    again when it completes - a lookup that ran in between may have read the
+    old document.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, object], list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _invalidate(kind: str, ids: Optional[list]):
+        if ids is None:
+            principal_cache.invalidate(kind)
+            return
+        for principal_id in ids:
+            principal_cache.invalidate(kind, principal_id)
+
+    def started(self, event):
+        name = event.command_name
+        if name not in ("update", "delete", "findAndModify", "findandmodify"):
+            return
+        kind = PRINCIPAL_COLLECTIONS.get(event.command.get(name))
+        if kind is None:
+            return
+        if name == "update":
+            filters = [u.get("q") for u in event.command.get("updates", [])]
+        elif name == "delete":
+            filters = [d.get("q") for d in event.command.get("deletes", [])]
+        else:
+            filters = [event.command.get("query")]
+        targets = [(kind, _filter_ids(query)) for query in filters]
+        for target in targets:
+            self._invalidate(*target)
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = targets
+
+    def _finished(self, event):
+        with self._lock:
+            targets = self._pending.pop((event.request_id, event.connection_id), None)
+        for target in targets or ():
+            self._invalidate(*target)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+monitoring.register(PrincipalWriteListener())
@@ -0,0 +1,167 @@
+"""
+Per-request sampling profiler for CJ's Executive Travel
+
+An admin sends X-Profile: 1 and that one request is sampled from a side
+thread. Each tick records either the loop thread's stack (the request is on
+CPU) or the suspended coroutine chain of the request's task (it is waiting on
+Mongo, Google, Twilio...), so the profile covers CPU and await time. The
+result is speedscope JSON - open it at https://www.speedscope.app.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5')) / 1000
+# Stop sampling a runaway request rather than growing the profile forever
+PROFILE_MAX_SAMPLES = 20000
+
+FrameKey = Tuple[str, str, int]
+
+
+def _scope_in(frame, scope: dict) -> bool:
+    try:
+        return frame.f_locals.get("scope") is scope
+    except Exception:
+        return False
+
+
+def _thread_stack(frame) -> list:
+    """Loop thread frames from the task step that is running down to the leaf"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    # Everything above the task step is the event loop itself
+    for i in range(len(frames) - 1, -1, -1):
+        code = frames[i].f_code
+        if code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            return frames[i + 1:]
+    return frames
+
+
+def _coroutine_stack(coro) -> Tuple[list, Optional[str]]:
+    """Frames of a suspended coroutine chain, plus the name of what it is awaiting"""
+    frames = []
+    awaiting = None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        next_coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+        if next_coro is not None and not hasattr(next_coro, "cr_frame") and not hasattr(next_coro, "gi_frame"):
+            awaiting = type(next_coro).__name__
+            break
+        coro = next_coro
+    return frames, awaiting
+
+
+class RequestProfiler:
+    def __init__(self, scope: dict, loop: asyncio.AbstractEventLoop):
+        self.scope = scope
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.frames: List[FrameKey] = []
+        self._frame_index: Dict[FrameKey, int] = {}
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self.cpu_seconds = 0.0
+        self.await_seconds = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.speedscope()
+
+    def _index(self, key: FrameKey) -> int:
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _stack_ids(self, frames, leaf: Optional[str] = None) -> List[int]:
+        ids = [self._index((f.f_code.co_name, f.f_code.co_filename, f.f_code.co_firstlineno)) for f in frames]
+        if leaf:
+            ids.append(self._index((f"(await {leaf})", "", 0)))
+        return ids
+
+    def _sample(self) -> Tuple[Optional[List[int]], bool]:
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is not None:
+            stack = _thread_stack(frame)
+            if any(_scope_in(f, self.scope) for f in stack):
+                return self._stack_ids(stack), True
+
+        # Not on CPU: the deepest suspended task chain that belongs to this request
+        best, best_leaf = None, None
+        try:
+            tasks = list(asyncio.all_tasks(self.loop))
+        except RuntimeError:
+            return None, False
+        for task in tasks:
+            frames, awaiting = _coroutine_stack(task.get_coro())
+            if (best is None or len(frames) > len(best)) and any(_scope_in(f, self.scope) for f in frames):
+                best, best_leaf = frames, awaiting or "task"
+        if best is None:
+            return None, False
+        return self._stack_ids(best, best_leaf), False
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(PROFILE_SAMPLE_INTERVAL):
+            if len(self.samples) >= PROFILE_MAX_SAMPLES:
+                break
+            stack, on_cpu = self._sample()
+            now = time.perf_counter()
+            weight, last = now - last, now
+            if stack is None:
+                continue
+            self.samples.append(stack)
+            self.weights.append(weight * 1000)
+            if on_cpu:
+                self.cpu_seconds += weight
+            else:
+                self.await_seconds += weight
+
+    def speedscope(self) -> dict:
+        name = f"{self.scope.get('method', '')} {self.scope.get('path', '')}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "cjs_travel",
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in self.frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(self.elapsed * 1000, 3),
+                "samples": self.samples,
+                "weights": [round(w, 3) for w in self.weights],
+            }],
+        }
+
+    def summary(self) -> dict:
+        return {
+            "duration_ms": round(self.elapsed * 1000, 1),
+            "cpu_ms": round(self.cpu_seconds * 1000, 1),
+            "await_ms": round(self.await_seconds * 1000, 1),
+            "sample_count": len(self.samples),
+        }
@@ -0,0 +1,149 @@
+"""
+Versioned cache of reference data for CJ's Executive Travel
+
+Vehicles, vehicle types, fare zones and the mile rates change a few times a
+month but were read on every availability check, auto-assign run, booking
+update and fare quote. reference_cache keeps one copy of each dataset per
+process, loaded on first use (and warmed at startup).
+
+Each dataset has a version number in the cache_versions collection. The
+write endpoints call invalidate(), which bumps the version and drops the local
+copy; every worker polls cache_versions every REFERENCE_CACHE_POLL_SECONDS
+(default 5) and drops any dataset whose version moved, so an edit made on one
+worker reaches the others within a poll. Copies older than
+REFERENCE_CACHE_MAX_AGE_SECONDS are reloaded regardless, which bounds
+staleness from writes that don't go through invalidate().
+
+Cached values are shared between requests - callers must not mutate them.
+Vehicles are cached without current_driver_id, which changes on every shift
+start; read that from the vehicle document itself.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger("cjs_travel.reference_cache")
+
+REFERENCE_CACHE_POLL_SECONDS = float(os.environ.get('REFERENCE_CACHE_POLL_SECONDS', '5') or 5)
+REFERENCE_CACHE_MAX_AGE_SECONDS = float(os.environ.get('REFERENCE_CACHE_MAX_AGE_SECONDS', '900') or 900)
+
+
+async def _load_vehicles(database):
+    return await database.vehicles.find({}, {"_id": 0, "current_driver_id": 0}).to_list(1000)
+
+
+async def _load_vehicle_types(database):
+    return await database.vehicle_types.find({}, {"_id": 0}).to_list(1000)
+
+
+async def _load_fare_zones(database):
+    return await database.fare_zones.find({}, {"_id": 0}).to_list(1000)
+
+
+async def _load_mile_rates(database):
+    """The stored mile_rates value, or None when the defaults apply"""
+    rates = await database.settings.find_one({"key": "mile_rates"}, {"_id": 0})
+    return rates.get("value", {}) if rates else None
+
+
+REFERENCE_LOADERS: Dict[str, Callable[..., Awaitable[object]]] = {
+    "vehicles": _load_vehicles,
+    "vehicle_types": _load_vehicle_types,
+    "fare_zones": _load_fare_zones,
+    "mile_rates": _load_mile_rates,
+}
+
+
+class ReferenceCache:
+    def __init__(self, loaders: dict, poll_seconds: float, max_age: float):
+        self.loaders = loaders
+        self.poll_seconds = poll_seconds
+        self.max_age = max_age
+        # name -> (version it was loaded at, monotonic load time, value)
+        self._entries: Dict[str, Tuple[int, float, object]] = {}
+        # Latest version seen in cache_versions
+        self._versions: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _current(self, name: str):
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        version, loaded_at, value = entry
+        if version != self._versions.get(name, 0) or time.monotonic() - loaded_at > self.max_age:
+            return None
+        return entry
+
+    async def get(self, database, name: str):
+        entry = self._current(name)
+        if entry is not None:
+            return entry[2]
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # Another request may have loaded it while this one waited
+            entry = self._current(name)
+            if entry is not None:
+                return entry[2]
+            version = self._versions.get(name, 0)
+            value = await self.loaders[name](database)
+            self._entries[name] = (version, time.monotonic(), value)
+            return value
+
+    async def invalidate(self, database, *names: str):
+        """Drop the local copies and bump the shared versions so other workers reload too"""
+        for name in names:
+            self._entries.pop(name, None)
+            doc = await database.cache_versions.find_one_and_update(
+                {"_id": name},
+                {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self._versions[name] = doc["version"]
+
+    async def sync_versions(self, database):
+        async for doc in database.cache_versions.find({"_id": {"$in": list(self.loaders)}}):
+            if doc.get("version", 0) != self._versions.get(doc["_id"], 0):
+                self._versions[doc["_id"]] = doc.get("version", 0)
+                self._entries.pop(doc["_id"], None)
+
+    async def warm(self, database):
+        await self.sync_versions(database)
+        for name in self.loaders:
+            await self.get(database, name)
+
+    async def _poll(self, database):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.sync_versions(database)
+            except Exception as e:
+                logger.warning(f"Reference cache version poll failed: {e}")
+
+    async def start(self, database):
+        """Start polling first, so a failed warm-up still leaves this worker following invalidations"""
+        self._task = asyncio.create_task(self._poll(database))
+        await self.warm(database)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+reference_cache = ReferenceCache(REFERENCE_LOADERS, REFERENCE_CACHE_POLL_SECONDS, REFERENCE_CACHE_MAX_AGE_SECONDS)
+
+
+async def get_reference(database, name: str):
+    return await reference_cache.get(database, name)
+
+
+async def invalidate_reference(database, *names: str):
+    await reference_cache.invalidate(database, *names)
@@ -0,0 +1,185 @@
+"""
+Sampled, PII-scrubbed request capture for CJ's Executive Travel
+
+With REQUEST_CAPTURE_RATE set (e.g. 0.05 for 5%), the middleware in server.py
+hands a scrubbed summary of each sampled request to RequestCapture, which
+appends it to an hourly gzip JSONL file in REQUEST_CAPTURE_DIR from a
+background thread. benchmarks/replay.py drives the files against a local
+build.
+
+Scrubbing keeps the shape and drops the content: ids, dates, numbers and the
+values of enum fields like status survive (they drive which code path runs),
+any other string is replaced by a placeholder of the same length, and
+anything under a personal key (name, phone, email, address, notes,
+password...) is always replaced. Tokens are reduced to the caller's role and account id.
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("cjs_travel.capture")
+
+REQUEST_CAPTURE_RATE = float(os.environ.get('REQUEST_CAPTURE_RATE', '0') or 0)
+REQUEST_CAPTURE_DIR = Path(os.environ.get('REQUEST_CAPTURE_DIR', Path(__file__).parent / 'captures'))
+CAPTURE_MAX_BODY_BYTES = 64 * 1024
+CAPTURE_FLUSH_SECONDS = 5
+CAPTURE_BUFFER_LIMIT = 10000
+
+# Never recorded, not even scrubbed
+SKIPPED_PATHS = ("/api/metrics",)
+
+PERSONAL_KEYS = (
+    "name", "phone", "mobile", "email", "address", "location", "postcode", "post_code", "notes",
+    "password", "token", "secret", "signature", "photo", "image", "message", "body", "contact",
+    "dob", "birth", "licence", "card", "iban", "account_number", "sort_code", "search", "q",
+)
+
+# Enum-valued fields whose strings are kept verbatim
+ENUM_KEYS = {
+    "status", "type", "category", "client_type", "payment_method", "booking_source", "flight_type",
+    "sender_type", "direction", "sort", "order", "role", "action", "kind", "driver_types", "shift_status",
+}
+
+_SAFE_VALUE = re.compile(
+    r"^("
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"  # uuid
+    r"|[0-9a-f]{24}"                                                   # ObjectId
+    r"|\d{4}-\d{2}(-\d{2}([T ][\d:.]+(Z|[+-]\d{2}:?\d{2})?)?)?"       # date / datetime / period
+    r"|\d{1,2}:\d{2}(:\d{2})?"                                         # time
+    r"|-?\d+(\.\d+)?"                                                  # number
+    r"|CJ-\d+|[A-Z]{1,4}-?\d{1,6}"                                     # booking/invoice/account refs
+    r")$"
+)
+
+
+def _is_personal(key: str) -> bool:
+    key = key.lower()
+    parts = key.split("_")
+    return any(part == key or part in parts or (len(part) > 2 and key.endswith(part)) for part in PERSONAL_KEYS)
+
+
+def blank(value: str) -> str:
+    return "x" * min(len(value), 256)
+
+
+def scrub_value(value, personal: bool = False, enum: bool = False, mask=blank):
+    if isinstance(value, dict):
+        return {
+            k: scrub_value(v, personal or _is_personal(str(k)), str(k).lower() in ENUM_KEYS, mask)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [scrub_value(v, personal, enum, mask) for v in value]
+    if isinstance(value, str):
+        if not personal and (_SAFE_VALUE.match(value) or (enum and len(value) <= 32)):
+            return value
+        return mask(value)
+    if personal and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0
+    return value
+
+
+def caller_identity(authorization: Optional[str], secret: str, algorithm: str) -> Optional[dict]:
+    """Role and account id from a bearer token - enough to mint an equivalent token on replay"""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    import jwt
+    try:
+        payload = jwt.decode(authorization[7:], secret, algorithms=[algorithm])
+    except jwt.InvalidTokenError:
+        return {"type": "invalid"}
+    if payload.get("client_id"):
+        return {"type": "client", "sub": payload["client_id"]}
+    role = payload.get("type") or ("passenger" if "phone" in payload else "unknown")
+    identity = {"type": role, "sub": payload.get("sub") or payload.get("driver_id")}
+    if payload.get("role"):
+        identity["role"] = payload["role"]
+    return identity
+
+
+def capture_record(request, body: bytes, status_code: int, duration: float, identity: Optional[dict],
+                   mongo_commands: Optional[int]) -> dict:
+    route = request.scope.get("route")
+    record = {
+        "t": time.time(),
+        "method": request.method,
+        "route": getattr(route, "path", None),
+        "path_params": scrub_value(dict(request.scope.get("path_params") or {})),
+        "query": scrub_value(dict(request.query_params)),
+        "auth": identity,
+        "status": status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "mongo_commands": mongo_commands,
+    }
+    if body:
+        content_type = request.headers.get("content-type", "")
+        if "json" in content_type and len(body) <= CAPTURE_MAX_BODY_BYTES:
+            try:
+                record["body"] = scrub_value(json.loads(body))
+            except ValueError:
+                record["body_bytes"] = len(body)
+        else:
+            record["body_bytes"] = len(body)
+            record["content_type"] = content_type.split(";")[0]
+    return record
+
+
+class RequestCapture:
+    """Buffers records in memory; a daemon thread appends them to the current hour's .jsonl.gz"""
+
+    def __init__(self, directory: Path, rate: float):
+        self.directory = Path(directory)
+        self.rate = rate
+        self._buffer = deque(maxlen=CAPTURE_BUFFER_LIMIT)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def sampled(self, path: str) -> bool:
+        return self.rate > 0 and not path.startswith(SKIPPED_PATHS) and random.random() < self.rate
+
+    def add(self, record: dict):
+        self._buffer.append(record)
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="request-capture", daemon=True)
+        self._thread.start()
+        logger.info(f"Capturing {self.rate:.1%} of requests to {self.directory}")
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=CAPTURE_FLUSH_SECONDS * 2)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(CAPTURE_FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        records = []
+        while self._buffer:
+            records.append(self._buffer.popleft())
+        name = datetime.now(timezone.utc).strftime("capture-%Y%m%d-%H.jsonl.gz")
+        try:
+            # Appending makes a multi-member gzip file, which gzip.open reads straight through
+            with gzip.open(self.directory / name, "at", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to write request capture: {e}")
+
+
+request_capture = RequestCapture(REQUEST_CAPTURE_DIR, REQUEST_CAPTURE_RATE)
@@ -0,0 +1,119 @@
+"""
+Cached road distances for CJ's Executive Travel
+
+Every fare and travel-time check used to ask the Google Directions API for
+the same handful of journeys again. resolve_routes() takes any number of
+(origin, destination) pairs, answers what it can from the route_cache
+collection in one query, fetches only the misses (concurrently, on one HTTP
+client) and stores them for next time. Entries older than
+ROUTE_CACHE_MAX_AGE_DAYS are fetched again.
+
+Keys are the two addresses lower-cased with whitespace and punctuation
+runs collapsed, so "Durham DH1 4RH" and "durham,  DH1 4RH" share an entry.
+"""
+
+import os
+import re
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+from pymongo import UpdateOne
+
+logger = logging.getLogger("cjs_travel.routes")
+
+ROUTE_CACHE_MAX_AGE_DAYS = int(os.environ.get('ROUTE_CACHE_MAX_AGE_DAYS', '90'))
+ROUTE_FETCH_CONCURRENCY = 8
+DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+METERS_PER_MILE = 1609.34
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def normalise_address(address: str) -> str:
+    return _SEPARATORS.sub(" ", (address or "").lower()).strip()
+
+
+def route_key(origin: str, destination: str) -> str:
+    return f"{normalise_address(origin)}|{normalise_address(destination)}"
+
+
+def route_from_leg(origin: str, destination: str, leg: dict) -> dict:
+    """The route_cache document for one Directions API leg"""
+    return {
+        "key": route_key(origin, destination),
+        "origin": origin,
+        "destination": destination,
+        "distance_meters": leg.get("distance", {}).get("value", 0),
+        "duration_seconds": leg.get("duration", {}).get("value", 0),
+        "start_location": leg.get("start_location"),
+        "end_location": leg.get("end_location"),
+        "fetched_at": datetime.now(timezone.utc),
+    }
+
+
+async def fetch_route(http_client: httpx.AsyncClient, origin: str, destination: str, api_key: str) -> Optional[dict]:
+    try:
+        response = await http_client.get(DIRECTIONS_URL, params={
+            "origin": origin,
+            "destination": destination,
+            "key": api_key,
+            "units": "imperial",
+            "region": "uk",
+        }, timeout=10.0)
+    except httpx.HTTPError as e:
+        logger.warning(f"Directions request failed for {route_key(origin, destination)}: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    if data.get("status") != "OK":
+        return None
+    leg = data.get("routes", [{}])[0].get("legs", [{}])[0]
+    return route_from_leg(origin, destination, leg)
+
+
+async def store_routes(database, routes: Iterable[dict]):
+    operations = [UpdateOne({"key": r["key"]}, {"$set": r}, upsert=True) for r in routes]
+    if operations:
+        await database.route_cache.bulk_write(operations, ordered=False)
+
+
+async def resolve_routes(database, pairs: Iterable[Tuple[str, str]], api_key: Optional[str]) -> Dict[str, dict]:
+    """route_key -> cached or freshly fetched route for every pair that has one"""
+    wanted = {}
+    for origin, destination in pairs:
+        if origin and destination:
+            wanted.setdefault(route_key(origin, destination), (origin, destination))
+    if not wanted:
+        return {}
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ROUTE_CACHE_MAX_AGE_DAYS)
+    routes = {
+        doc["key"]: doc
+        async for doc in database.route_cache.find(
+            {"key": {"$in": list(wanted)}, "fetched_at": {"$gte": cutoff}}, {"_id": 0})
+    }
+    missing = [pair for key, pair in wanted.items() if key not in routes]
+    if not missing or not api_key:
+        return routes
+
+    semaphore = asyncio.Semaphore(ROUTE_FETCH_CONCURRENCY)
+    async with httpx.AsyncClient() as http_client:
+        async def fetch(pair):
+            async with semaphore:
+                return await fetch_route(http_client, pair[0], pair[1], api_key)
+        fetched = [r for r in await asyncio.gather(*(fetch(pair) for pair in missing)) if r]
+
+    try:
+        await store_routes(database, fetched)
+    except Exception as e:
+        logger.warning(f"Failed to store {len(fetched)} routes: {e}")
+    routes.update({r["key"]: r for r in fetched})
+    return routes
+
+
+async def resolve_route(database, origin: str, destination: str, api_key: Optional[str]) -> Optional[dict]:
+    return (await resolve_routes(database, [(origin, destination)], api_key)).get(route_key(origin, destination))
@@ -1,10 +1,12 @@
 # Routes package initialization
 from .shared import (
     db, security, hash_password, create_token, create_admin_token, verify_token,
-    get_current_admin, get_current_passenger, get_current_driver, get_current_client,
+    get_current_admin, get_current_passenger, get_current_driver, get_current_client, get_driver_claims,
     DriverStatus, BookingStatus, ClientStatus, ClientType, PaymentMethod, AdminRole,
     AdminUserBase, AdminUserCreate, AdminUser, AdminLoginRequest, AdminLoginResponse,
     FlightInfo, BookingHistoryEntry, generate_booking_id, generate_client_account_no,
+    normalize_phone, normalize_phones,
+    invoice_vat, invoice_fare, invoice_bookings_query, collect_invoice_rows, stored_invoice_payload,
     JWT_SECRET, JWT_ALGORITHM
 )
 
@@ -1,13 +1,17 @@
 # Chat Routes
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
+import logging
 
-from .shared import db, get_current_driver
+from .shared import db, get_current_driver, get_driver_claims
 
 router = APIRouter(tags=["Chat"])
 
+logger = logging.getLogger(__name__)
+
 
 class ChatMessage(BaseModel):
     booking_id: str
@@ -15,6 +19,143 @@ class ChatMessage(BaseModel):
     sender_type: str = "driver"
 
 
+# ========== CHAT THREAD SUMMARIES ==========
+# `chat_threads` holds one summary document per booking conversation:
+# last message, last sender, timestamp and an unread counter for each side.
+# It is updated on every send / mark-read so the inbox views are a single
+# indexed find instead of a $group over chat_messages on every poll.
+
+def _thread_customer_name(booking: dict) -> str:
+    return booking.get("customer_name") or f"{booking.get('first_name', '')} {booking.get('last_name', '')}".strip()
+
+
+async def _record_thread_message(booking: dict, message_doc: dict, driver_name: Optional[str] = None):
+    """Upsert the booking's chat thread with a newly sent message"""
+    # Dispatch messages are unread by the driver and vice versa
+    if message_doc["sender_type"] == "dispatch":
+        unread_field, other_field = "unread_driver", "unread_dispatch"
+    else:
+        unread_field, other_field = "unread_dispatch", "unread_driver"
+
+    await db.chat_threads.update_one(
+        {"booking_id": booking["id"]},
+        {
+            "$set": {
+                "booking_ref": booking.get("booking_id", booking["id"][:8]),
+                "driver_id": booking.get("driver_id"),
+                "driver_name": driver_name,
+                "customer_name": _thread_customer_name(booking),
+                "pickup_location": booking.get("pickup_location", ""),
+                "last_message": message_doc["message"],
+                "last_message_at": message_doc["created_at"],
+                "last_sender_type": message_doc["sender_type"],
+            },
+            "$inc": {unread_field: 1},
+            "$setOnInsert": {other_field: 0},
+        },
+        upsert=True
+    )
+
+
+async def sync_chat_thread_driver(booking_ids: List[str], driver_id: Optional[str], driver_name: Optional[str] = None):
+    """Keep thread driver fields in step when bookings are (re)assigned"""
+    if not booking_ids:
+        return
+    await db.chat_threads.update_many(
+        {"booking_id": {"$in": booking_ids}},
+        {"$set": {"driver_id": driver_id, "driver_name": driver_name if driver_id else None}}
+    )
+
+
+async def sync_chat_thread_booking(booking: dict):
+    """Refresh the booking details copied onto its thread after the booking is edited"""
+    await db.chat_threads.update_one(
+        {"booking_id": booking["id"]},
+        {"$set": {
+            "booking_ref": booking.get("booking_id", booking["id"][:8]),
+            "customer_name": _thread_customer_name(booking),
+            "pickup_location": booking.get("pickup_location", ""),
+        }}
+    )
+
+
+async def rename_chat_thread_customer(booking_ids: List[str], customer_name: str):
+    """Customer renamed across their bookings"""
+    if booking_ids:
+        await db.chat_threads.update_many({"booking_id": {"$in": booking_ids}}, {"$set": {"customer_name": customer_name}})
+
+
+async def rename_chat_thread_driver(driver_id: str, driver_name: Optional[str]):
+    """Keep the driver name on that driver's threads in step with their profile"""
+    await db.chat_threads.update_many({"driver_id": driver_id}, {"$set": {"driver_name": driver_name}})
+
+
+async def delete_chat_thread(booking_id: str):
+    """Remove the thread summary when a conversation is deleted"""
+    await db.chat_threads.delete_one({"booking_id": booking_id})
+
+
+async def rebuild_chat_threads() -> int:
+    """Backfill chat_threads from chat_messages - only runs when the collection is empty"""
+    if await db.chat_threads.find_one({}, {"_id": 1}):
+        return 0
+
+    pipeline = [
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$booking_id",
+            "last_message": {"$last": "$message"},
+            "last_message_at": {"$last": "$created_at"},
+            "last_sender_type": {"$last": "$sender_type"},
+            "unread_driver": {
+                "$sum": {"$cond": [{"$and": [{"$eq": ["$sender_type", "dispatch"]}, {"$eq": ["$read", False]}]}, 1, 0]}
+            },
+            "unread_dispatch": {
+                "$sum": {"$cond": [{"$and": [{"$eq": ["$sender_type", "driver"]}, {"$eq": ["$read", False]}]}, 1, 0]}
+            }
+        }}
+    ]
+    summaries = await db.chat_messages.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    if not summaries:
+        return 0
+
+    booking_ids = [s["_id"] for s in summaries]
+    bookings = await db.bookings.find(
+        {"id": {"$in": booking_ids}},
+        {"_id": 0, "id": 1, "booking_id": 1, "driver_id": 1, "customer_name": 1, "first_name": 1, "last_name": 1, "pickup_location": 1}
+    ).to_list(None)
+    booking_map = {b["id"]: b for b in bookings}
+
+    driver_ids = list({b["driver_id"] for b in bookings if b.get("driver_id")})
+    drivers = await db.drivers.find({"id": {"$in": driver_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    driver_names = {d["id"]: d.get("name") for d in drivers}
+
+    threads = []
+    for summary in summaries:
+        booking = booking_map.get(summary["_id"])
+        if not booking:
+            continue
+        threads.append({
+            "booking_id": booking["id"],
+            "booking_ref": booking.get("booking_id", booking["id"][:8]),
+            "driver_id": booking.get("driver_id"),
+            "driver_name": driver_names.get(booking.get("driver_id")),
+            "customer_name": _thread_customer_name(booking),
+            "pickup_location": booking.get("pickup_location", ""),
+            "last_message": summary.get("last_message", ""),
+            "last_message_at": summary.get("last_message_at"),
+            "last_sender_type": summary.get("last_sender_type"),
+            "unread_driver": summary.get("unread_driver", 0),
+            "unread_dispatch": summary.get("unread_dispatch", 0),
+        })
+
+    if threads:
+        await db.chat_threads.insert_many(threads)
+    logger.info(f"Backfilled {len(threads)} chat threads")
+    return len(threads)
+
+
+# ========== DRIVER CHAT ==========
 @router.post("/driver/chat/send")
 async def send_chat_message(chat: ChatMessage, driver: dict = Depends(get_current_driver)):
     """Send a chat message for a booking"""
@@ -34,12 +175,13 @@ async def send_chat_message(chat: ChatMessage, driver: dict = Depends(get_curren
     }
     
     await db.chat_messages.insert_one(message_doc)
+    await _record_thread_message(booking, message_doc, driver_name=driver.get("name"))
     
     return {"message": "Message sent", "id": message_doc["id"]}
 
 
 @router.get("/driver/chat/{booking_id}")
-async def get_chat_messages(booking_id: str, driver: dict = Depends(get_current_driver)):
+async def get_chat_messages(booking_id: str, driver: dict = Depends(get_driver_claims)):
     """Get chat messages for a booking"""
     booking = await db.bookings.find_one({"id": booking_id, "driver_id": driver["id"]})
     if not booking:
@@ -56,63 +198,24 @@ async def get_chat_messages(booking_id: str, driver: dict = Depends(get_current_
 @router.get("/driver/all-chats")
 async def get_all_driver_chats(driver: dict = Depends(get_current_driver)):
     """Get all chat conversations for a driver across all their bookings"""
-    # Get all bookings for this driver that have chat messages
-    driver_bookings = await db.bookings.find(
+    threads = await db.chat_threads.find(
         {"driver_id": driver["id"]},
-        {"_id": 0, "id": 1, "booking_id": 1, "customer_name": 1, "first_name": 1, "last_name": 1, "pickup_location": 1}
-    ).to_list(100)
-    
-    booking_ids = [b["id"] for b in driver_bookings]
+        {"_id": 0}
+    ).sort("last_message_at", -1).to_list(50)
     
-    # Get latest message for each booking
-    pipeline = [
-        {"$match": {"booking_id": {"$in": booking_ids}}},
-        {"$sort": {"created_at": -1}},
-        {"$group": {
-            "_id": "$booking_id",
-            "last_message": {"$first": "$message"},
-            "last_message_at": {"$first": "$created_at"},
-            "last_sender_type": {"$first": "$sender_type"},
-            "unread_count": {
-                "$sum": {
-                    "$cond": [
-                        {"$and": [
-                            {"$eq": ["$sender_type", "dispatch"]},
-                            {"$eq": ["$read", False]}
-                        ]},
-                        1,
-                        0
-                    ]
-                }
-            }
-        }},
-        {"$sort": {"last_message_at": -1}}
+    return [
+        {
+            "booking_id": thread["booking_id"],
+            "booking_id_short": thread.get("booking_ref"),
+            "customer_name": thread.get("customer_name", ""),
+            "pickup_location": thread.get("pickup_location", ""),
+            "last_message": thread.get("last_message", ""),
+            "last_message_at": thread.get("last_message_at"),
+            "last_sender_type": thread.get("last_sender_type"),
+            "unread_count": thread.get("unread_driver", 0)
+        }
+        for thread in threads
     ]
-    
-    chat_summaries = await db.chat_messages.aggregate(pipeline).to_list(50)
-    
-    # Build response with booking info
-    result = []
-    for chat in chat_summaries:
-        booking_id = chat["_id"]
-        booking = next((b for b in driver_bookings if b["id"] == booking_id), None)
-        if not booking:
-            continue
-            
-        customer_name = booking.get("customer_name") or f"{booking.get('first_name', '')} {booking.get('last_name', '')}".strip()
-        
-        result.append({
-            "booking_id": booking_id,
-            "booking_id_short": booking.get("booking_id", booking_id[:8]),
-            "customer_name": customer_name,
-            "pickup_location": booking.get("pickup_location", ""),
-            "last_message": chat.get("last_message", ""),
-            "last_message_at": chat.get("last_message_at"),
-            "last_sender_type": chat.get("last_sender_type"),
-            "unread_count": chat.get("unread_count", 0)
-        })
-    
-    return result
 
 
 @router.post("/driver/chat/{booking_id}/mark-read")
@@ -122,9 +225,11 @@ async def mark_driver_chat_read(booking_id: str, driver: dict = Depends(get_curr
         {"booking_id": booking_id, "sender_type": "dispatch", "read": False},
         {"$set": {"read": True}}
     )
+    await db.chat_threads.update_one({"booking_id": booking_id}, {"$set": {"unread_driver": 0}})
     return {"marked_read": result.modified_count}
 
 
+# ========== DISPATCH CHAT ==========
 @router.post("/dispatch/chat/send")
 async def send_dispatch_message(chat: ChatMessage):
     """Send a chat message from dispatch"""
@@ -145,6 +250,13 @@ async def send_dispatch_message(chat: ChatMessage):
     
     await db.chat_messages.insert_one(message_doc)
     
+    driver_name = None
+    if booking.get("driver_id"):
+        driver = await db.drivers.find_one({"id": booking["driver_id"]}, {"_id": 0, "name": 1})
+        if driver:
+            driver_name = driver.get("name")
+    await _record_thread_message(booking, message_doc, driver_name=driver_name)
+    
     return {"message": "Message sent", "id": message_doc["id"]}
 
 
@@ -162,61 +274,25 @@ async def get_dispatch_chat(booking_id: str):
 @router.get("/dispatch/active-chats")
 async def get_active_chats():
     """Get all active chat conversations with unread counts"""
-    # Get all unique booking_ids that have chat messages
-    pipeline = [
-        {"$group": {
-            "_id": "$booking_id",
-            "last_message": {"$last": "$message"},
-            "last_message_at": {"$last": "$created_at"},
-            "unread_count": {
-                "$sum": {
-                    "$cond": [
-                        {"$and": [
-                            {"$eq": ["$sender_type", "driver"]},
-                            {"$eq": ["$read", False]}
-                        ]},
-                        1,
-                        0
-                    ]
-                }
-            }
-        }},
-        {"$sort": {"last_message_at": -1}},
-        {"$limit": 50}
-    ]
-    
-    chat_summaries = await db.chat_messages.aggregate(pipeline).to_list(50)
-    
-    # Enrich with booking and driver info
-    result = []
-    for chat in chat_summaries:
-        booking_id = chat["_id"]
-        booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0})
-        if not booking:
-            continue
-            
-        driver_name = "Unknown Driver"
-        if booking.get("driver_id"):
-            driver = await db.drivers.find_one({"id": booking["driver_id"]}, {"_id": 0, "name": 1})
-            if driver:
-                driver_name = driver.get("name", "Unknown Driver")
-        
-        result.append({
-            "booking_id": booking_id,
-            "booking_id_short": booking.get("booking_id", booking_id[:8]),
-            "driver_name": driver_name,
-            "driver_id": booking.get("driver_id"),
-            "customer_name": booking.get("customer_name", f"{booking.get('first_name', '')} {booking.get('last_name', '')}".strip()),
-            "last_message": chat.get("last_message", ""),
-            "last_message_at": chat.get("last_message_at"),
-            "unread_count": chat.get("unread_count", 0)
-        })
-    
-    # Sort by unread first, then by last message
-    result.sort(key=lambda x: (-x["unread_count"], x.get("last_message_at", "") or ""), reverse=False)
-    result.sort(key=lambda x: x["unread_count"], reverse=True)
+    # Unread first, then most recent - served by the (unread_dispatch, last_message_at) index
+    threads = await db.chat_threads.find(
+        {},
+        {"_id": 0}
+    ).sort([("unread_dispatch", -1), ("last_message_at", -1)]).to_list(50)
     
-    return result
+    return [
+        {
+            "booking_id": thread["booking_id"],
+            "booking_id_short": thread.get("booking_ref"),
+            "driver_name": thread.get("driver_name") or "Unknown Driver",
+            "driver_id": thread.get("driver_id"),
+            "customer_name": thread.get("customer_name", ""),
+            "last_message": thread.get("last_message", ""),
+            "last_message_at": thread.get("last_message_at"),
+            "unread_count": thread.get("unread_dispatch", 0)
+        }
+        for thread in threads
+    ]
 
 
 @router.post("/dispatch/chat/{booking_id}/mark-read")
@@ -226,6 +302,6 @@ async def mark_chat_read(booking_id: str):
         {"booking_id": booking_id, "sender_type": "driver", "read": False},
         {"$set": {"read": True}}
     )
+    await db.chat_threads.update_one({"booking_id": booking_id}, {"$set": {"unread_dispatch": 0}})
     
     return {"marked_read": result.modified_count}
-
@@ -1,23 +1,16 @@
 # Client Portal Routes
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
 import uuid
 import jwt
-import io
-import os
 import logging
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-
+from pdf_service import pdf_response
 from .shared import (
-    db, hash_password, get_current_client, JWT_SECRET, JWT_ALGORITHM
+    db, get_db, hash_password, get_current_client, normalize_phone, stored_invoice_payload,
+    JWT_SECRET, JWT_ALGORITHM
 )
 
 router = APIRouter(tags=["Client Portal"])
@@ -66,9 +59,9 @@ async def register_client_portal(data: ClientPortalRegister):
     """Register for client portal access (creates pending request)"""
     # Build query conditions
     or_conditions = []
-    if data.phone:
-        or_conditions.append({"phone": data.phone})
-        or_conditions.append({"mobile": data.phone})
+    phone_e164 = normalize_phone(data.phone)
+    if phone_e164:
+        or_conditions.append({"phone_e164": phone_e164})
     if data.email:
         or_conditions.append({"email": data.email})
         or_conditions.append({"contact_email": data.email})
@@ -147,11 +140,10 @@ async def login_client_portal(data: ClientPortalLogin):
             client = await db.clients.find_one({"contact_email": data.email}, {"_id": 0})
     
     # Try to find by phone if not found by email
-    if not client and data.phone:
-        client = await db.clients.find_one({"phone": data.phone}, {"_id": 0})
-        if not client:
-            # Also check mobile
-            client = await db.clients.find_one({"mobile": data.phone}, {"_id": 0})
+    # (phone_e164 holds both phone and mobile)
+    phone_e164 = normalize_phone(data.phone)
+    if not client and phone_e164:
+        client = await db.clients.find_one({"phone_e164": phone_e164}, {"_id": 0})
     
     if not client:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -265,8 +257,6 @@ async def get_client_invoice_details(invoice_id: str, client: dict = Depends(get
 @router.get("/client-portal/invoices/{invoice_id}/download")
 async def download_client_invoice(invoice_id: str, client: dict = Depends(get_current_client)):
     """Download PDF invoice with professional template"""
-    from datetime import timedelta
-    
     invoice = await db.invoices.find_one(
         {"id": invoice_id, "client_id": client["id"]},
         {"_id": 0}
@@ -275,280 +265,9 @@ async def download_client_invoice(invoice_id: str, client: dict = Depends(get_cu
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    client_data = await db.clients.find_one({"id": client["id"]}, {"_id": 0})
-    
-    query = {"client_id": client["id"], "status": "completed"}
-    if invoice.get("start_date") or invoice.get("end_date"):
-        date_query = {}
-        if invoice.get("start_date"):
-            date_query["$gte"] = invoice["start_date"]
-        if invoice.get("end_date"):
-            date_query["$lte"] = invoice["end_date"] + "T23:59:59"
-        if date_query:
-            query["booking_datetime"] = date_query
-    
-    bookings = await db.bookings.find(query, {"_id": 0}).sort("booking_datetime", 1).to_list(1000)
-    
-    # Use stored values or calculate
-    subtotal = invoice.get('subtotal', 0) or sum(float(b.get('fare', 0) or 0) for b in bookings)
-    
-    client_vat_rate = invoice.get('vat_rate', client_data.get('vat_rate', '20') if client_data else '20')
-    if client_vat_rate == '0' or client_vat_rate == 'exempt':
-        vat_rate = 0.0
-        vat_label = "VAT Exempt" if client_vat_rate == 'exempt' else "No VAT (0%)"
-    else:
-        vat_rate = 0.20
-        vat_label = "VAT @ 20%"
-    
-    vat_amount = invoice.get('vat_amount', subtotal * vat_rate)
-    total = invoice.get('total', subtotal + vat_amount)
-    
-    # Payment due date
-    payment_terms = client_data.get('payment_terms', 30) if client_data else 30
-    created_at = invoice.get('created_at', datetime.now(timezone.utc).isoformat())
-    if isinstance(created_at, str):
-        try:
-            created_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-        except:
-            created_date = datetime.now(timezone.utc)
-    else:
-        created_date = created_at
-    due_date = created_date + timedelta(days=payment_terms)
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=60)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Gold and Black color scheme
-    header_gold = colors.HexColor('#C9A227')
-    header_black = colors.HexColor('#1a1a1a')
-    gold_accent = colors.HexColor('#D4AF37')
-    
-    company_style = ParagraphStyle('company', parent=styles['Normal'], fontSize=14, fontName='Helvetica-Bold', textColor=header_black)
-    normal_style = ParagraphStyle('normal', parent=styles['Normal'], fontSize=9, leading=12)
-    small_style = ParagraphStyle('small', parent=styles['Normal'], fontSize=8, leading=10, textColor=colors.grey)
-    label_style = ParagraphStyle('label', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
-    value_style = ParagraphStyle('value', parent=styles['Normal'], fontSize=9, fontName='Helvetica-Bold')
-    
-    # Header with Logo
-    logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'logo_border.png')
-    try:
-        logo = Image(logo_path, width=60, height=60)
-    except:
-        logo = Spacer(60, 60)
-    
-    # Company info (separate from logo)
-    company_info = [
-        [Paragraph("<b>CJ's Executive Travel Limited</b>", company_style)],
-        [Paragraph("Unit 5 Peterlee SR8 2HY", normal_style)],
-        [Paragraph("Phone: +44 1917721223", normal_style)],
-        [Paragraph("Email: admin@cjsdispatch.co.uk", normal_style)],
-        [Paragraph("Web: cjsdispatch.co.uk", normal_style)],
-    ]
-    company_table = Table(company_info, colWidths=[200])
-    company_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    
-    # Logo + Company info combined
-    logo_company = Table([[logo, company_table]], colWidths=[70, 200])
-    logo_company.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (0, 0), 0),
-        ('RIGHTPADDING', (0, 0), (0, 0), 10),
-    ]))
-    
-    invoice_details = [
-        [Paragraph("ACCOUNT NO", label_style), Paragraph(client_data.get('account_no', '') if client_data else '', value_style)],
-        [Paragraph("REFERENCE", label_style), Paragraph(invoice.get('invoice_ref', ''), value_style)],
-        [Paragraph("TAX DATE", label_style), Paragraph(created_date.strftime('%d/%m/%Y'), value_style)],
-    ]
-    invoice_box = Table(invoice_details, colWidths=[70, 100])
-    invoice_box.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
-    ]))
-    
-    header_data = [[logo_company, invoice_box]]
-    header_table = Table(header_data, colWidths=[340, 180])
-    header_table.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 20))
-    
-    # Billing details
-    billing_info = [
-        [Paragraph("<b>For the attention of:</b>", normal_style)],
-        [Paragraph(f"<b>{client_data.get('name', '') if client_data else ''}</b>", value_style)],
-    ]
-    if client_data:
-        if client_data.get('contact_name'):
-            billing_info.append([Paragraph(client_data['contact_name'], normal_style)])
-        if client_data.get('address'):
-            for line in client_data['address'].split('\n'):
-                billing_info.append([Paragraph(line.strip(), normal_style)])
-        if client_data.get('town_city'):
-            billing_info.append([Paragraph(client_data['town_city'], normal_style)])
-        if client_data.get('post_code') or client_data.get('postcode'):
-            billing_info.append([Paragraph(client_data.get('post_code') or client_data.get('postcode', ''), normal_style)])
-    
-    billing_table = Table(billing_info, colWidths=[300])
-    billing_table.setStyle(TableStyle([
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(billing_table)
-    elements.append(Spacer(1, 20))
-    
-    # Invoice Summary - Gold/Black
-    summary_title = Table([[Paragraph("<b>INVOICE SUMMARY</b>", ParagraphStyle('st', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-    summary_title.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), header_black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(summary_title)
-    
-    summary_data = [[Paragraph("<b>Journeys:</b>", normal_style), Paragraph(f"{len(bookings)} Journeys", normal_style), Paragraph(f"Amount: £{subtotal:.2f}", normal_style)]]
-    summary_table = Table(summary_data, colWidths=[150, 200, 170])
-    summary_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 10))
-    
-    # Totals
-    totals_data = [
-        [Paragraph("Subtotal:", normal_style), Paragraph(f"£{subtotal:.2f}", value_style)],
-        [Paragraph(f"{vat_label}:", normal_style), Paragraph(f"£{vat_amount:.2f}", value_style)],
-        [Paragraph("<b>Total:</b>", value_style), Paragraph(f"<b>£{total:.2f}</b>", ParagraphStyle('total', fontSize=12, fontName='Helvetica-Bold'))],
-    ]
-    totals_table = Table(totals_data, colWidths=[100, 80])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-        ('LINEABOVE', (0, 2), (-1, 2), 1, colors.black),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    totals_wrapper = Table([[Spacer(1, 1), totals_table]], colWidths=[340, 180])
-    elements.append(totals_wrapper)
-    elements.append(Spacer(1, 15))
-    
-    # Payment terms
-    terms_data = [[Paragraph(f"<b>Payment Terms:</b> {payment_terms} days", normal_style), 
-                   Paragraph(f"<b>Payment Due:</b> {due_date.strftime('%d/%m/%Y')}", normal_style)]]
-    terms_table = Table(terms_data, colWidths=[260, 260])
-    elements.append(terms_table)
-    elements.append(Spacer(1, 20))
-    
-    # Journeys Table - Gold/Black
-    if bookings:
-        journey_header = Table([[Paragraph("<b>JOURNEY DETAILS</b>", ParagraphStyle('jh', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-        journey_header.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), header_black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(journey_header)
-        
-        table_data = [[
-            Paragraph("<b>Item</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Booker/Passenger</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Journey/Tariff</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Cost</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Tax</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Total</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-        ]]
-        
-        for idx, b in enumerate(bookings, 1):
-            fare = float(b.get('fare', 0) or 0)
-            tax = fare * vat_rate
-            item_total = fare + tax
-            
-            pickup = b.get('pickup_location', '')
-            dropoff = b.get('dropoff_location', '')
-            journey_text = f"P: {pickup}<br/>D: {dropoff}"
-            
-            passenger = f"{b.get('first_name', '')} {b.get('last_name', '')}".strip() or "N/A"
-            booking_ref = b.get('booking_id', '')
-            
-            table_data.append([
-                Paragraph(str(idx), small_style),
-                Paragraph(f"{booking_ref}<br/>{passenger}", small_style),
-                Paragraph(journey_text, small_style),
-                Paragraph(f"£{fare:.2f}", small_style),
-                Paragraph(f"£{tax:.2f}", small_style),
-                Paragraph(f"£{item_total:.2f}", small_style),
-            ])
-        
-        journey_table = Table(table_data, colWidths=[30, 80, 230, 55, 55, 55])
-        journey_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FDF8E8')),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, gold_accent),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(journey_table)
-        elements.append(Spacer(1, 20))
-    
-    # Banking Details - Gold/Black
-    bank_title = Table([[Paragraph("<b>BANKING DETAILS</b>", ParagraphStyle('bt', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-    bank_title.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), header_black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(bank_title)
-    
-    bank_data = [
-        [Paragraph("Bank Name:", label_style), Paragraph("Starling Bank", normal_style),
-         Paragraph("Sort Code:", label_style), Paragraph("60-83-71", normal_style)],
-        [Paragraph("Account No:", label_style), Paragraph("15222155", normal_style),
-         Paragraph("BIC:", label_style), Paragraph("SRLGGB2L", normal_style)],
-        [Paragraph("IBAN:", label_style), Paragraph("GB31SRLG60837115222155", normal_style),
-         Paragraph("VAT No:", label_style), Paragraph("354626783", normal_style)],
-    ]
-    bank_table = Table(bank_data, colWidths=[70, 130, 70, 130])
-    bank_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
-    ]))
-    elements.append(bank_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
+    payload = await stored_invoice_payload(invoice, client)
     filename = f"{invoice.get('invoice_ref', 'invoice')}.pdf"
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return await pdf_response(get_db(), "invoice", payload, filename)
 
 
 # ========== PASSWORD RESET ==========
@@ -588,32 +307,11 @@ async def request_password_reset(data: PasswordResetRequest):
                 ]
             })
     else:
-        phone = (data.phone or "").strip()
-        if phone.startswith('0'):
-            phone_normalized = '+44' + phone[1:]
-        elif not phone.startswith('+'):
-            phone_normalized = '+44' + phone
-        else:
-            phone_normalized = phone
-        identifier = phone_normalized
+        identifier = normalize_phone(data.phone)
         
-        if data.account_type == "passenger":
-            account = await db.passengers.find_one({
-                "$or": [
-                    {"phone": phone},
-                    {"phone": phone_normalized},
-                    {"phone": "0" + phone_normalized[3:] if phone_normalized.startswith("+44") else phone}
-                ]
-            })
-        else:
-            account = await db.clients.find_one({
-                "$or": [
-                    {"phone": phone},
-                    {"phone": phone_normalized},
-                    {"mobile": phone},
-                    {"mobile": phone_normalized}
-                ]
-            })
+        if identifier:
+            collection = db.passengers if data.account_type == "passenger" else db.clients
+            account = await collection.find_one({"phone_e164": identifier})
     
     if not account:
         return {"message": f"If an account exists, a reset code will be sent via {data.method.upper()}"}
@@ -649,10 +347,8 @@ async def verify_password_reset(data: PasswordResetVerify):
     identifier = data.identifier.strip()
     
     if data.method == "sms":
-        if identifier.startswith('0'):
-            identifier = '+44' + identifier[1:]
-        elif not identifier.startswith('+') and '@' not in identifier:
-            identifier = '+44' + identifier
+        if '@' not in identifier:
+            identifier = normalize_phone(identifier) or identifier
     else:
         identifier = identifier.lower()
     
@@ -694,10 +390,7 @@ async def verify_password_reset(data: PasswordResetVerify):
             )
         else:
             result = await db.passengers.update_one(
-                {"$or": [
-                    {"phone": identifier},
-                    {"phone": "0" + identifier[3:] if identifier.startswith("+44") else identifier}
-                ]},
+                {"phone_e164": identifier},
                 {"$set": {"password_hash": new_password_hash}}
             )
     else:
@@ -711,11 +404,7 @@ async def verify_password_reset(data: PasswordResetVerify):
             )
         else:
             result = await db.clients.update_one(
-                {"$or": [
-                    {"phone": identifier},
-                    {"mobile": identifier},
-                    {"phone": "0" + identifier[3:] if identifier.startswith("+44") else identifier}
-                ]},
+                {"phone_e164": identifier},
                 {"$set": {"password_hash": new_password_hash}}
             )
     
@@ -1,21 +1,28 @@
 # Client Management Routes
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
+import re
 import uuid
-import io
+import asyncio
+import calendar
+import logging
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-import os
+from pymongo.errors import DuplicateKeyError
 
-from .shared import db, ClientStatus, ClientType, generate_client_account_no
+from email_templates import send_corporate_invoice_issued_email
+from pdf_service import (
+    build_invoice_payload, invoice_row, pdf_response, ensure_pdf_cached, PDF_RENDER_WORKERS
+)
+from .shared import (
+    db, get_db, ClientStatus, ClientType, generate_client_account_no, normalize_phones,
+    invoice_vat, invoice_fare, invoice_bookings_query, collect_invoice_rows, stored_invoice_payload,
+    stream_json_array, sum_booking_fares, INVOICE_BOOKING_PROJECTION, INVOICE_LIST_PROJECTION, INVOICE_CURSOR_BATCH
+)
+
+logger = logging.getLogger("cjs_travel.clients")
 
 router = APIRouter(tags=["Clients"])
 
@@ -85,39 +92,48 @@ class InvoiceRequest(BaseModel):
 
 
 # ========== ENDPOINTS ==========
+async def _client_booking_totals(client_id: Optional[str] = None) -> dict:
+    """Booking count and fare total per client, from one grouped aggregation"""
+    pipeline = []
+    if client_id:
+        pipeline.append({"$match": {"client_id": client_id}})
+    else:
+        pipeline.append({"$match": {"client_id": {"$nin": [None, ""]}}})
+    pipeline.append({"$group": {"_id": "$client_id", "count": {"$sum": 1}, "total": {"$sum": "$fare"}}})
+    rows = await db.bookings.aggregate(pipeline).to_list(None)
+    return {row["_id"]: row for row in rows}
+
+
 @router.get("/clients")
 async def get_clients():
     """Get all clients with their booking counts"""
-    clients = await db.clients.find({}, {"_id": 0}).to_list(1000)
+    clients, totals = await asyncio.gather(
+        db.clients.find({}, {"_id": 0}).to_list(1000),
+        _client_booking_totals()
+    )
     for client in clients:
         if isinstance(client.get('created_at'), str):
             client['created_at'] = datetime.fromisoformat(client['created_at'])
-        booking_count = await db.bookings.count_documents({"client_id": client['id']})
-        client['booking_count'] = booking_count
-        pipeline = [
-            {"$match": {"client_id": client['id']}},
-            {"$group": {"_id": None, "total": {"$sum": "$fare"}}}
-        ]
-        result = await db.bookings.aggregate(pipeline).to_list(1)
-        client['total_invoice'] = result[0]['total'] if result else 0
+        client_totals = totals.get(client['id'], {})
+        client['booking_count'] = client_totals.get('count', 0)
+        client['total_invoice'] = client_totals.get('total', 0)
     return clients
 
 
 @router.get("/clients/{client_id}")
 async def get_client(client_id: str):
     """Get a specific client by ID"""
-    client = await db.clients.find_one({"id": client_id}, {"_id": 0})
+    client, totals = await asyncio.gather(
+        db.clients.find_one({"id": client_id}, {"_id": 0}),
+        _client_booking_totals(client_id)
+    )
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     if isinstance(client.get('created_at'), str):
         client['created_at'] = datetime.fromisoformat(client['created_at'])
-    client['booking_count'] = await db.bookings.count_documents({"client_id": client_id})
-    pipeline = [
-        {"$match": {"client_id": client_id}},
-        {"$group": {"_id": None, "total": {"$sum": "$fare"}}}
-    ]
-    result = await db.bookings.aggregate(pipeline).to_list(1)
-    client['total_invoice'] = result[0]['total'] if result else 0
+    client_totals = totals.get(client_id, {})
+    client['booking_count'] = client_totals.get('count', 0)
+    client['total_invoice'] = client_totals.get('total', 0)
     return client
 
 
@@ -146,6 +162,7 @@ async def create_client(client: ClientCreate):
     
     doc = client_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['phone_e164'] = normalize_phones(doc.get('phone'), doc.get('mobile'))
     await db.clients.insert_one(doc)
     
     return client_obj
@@ -159,6 +176,11 @@ async def update_client(client_id: str, client_update: ClientUpdate):
         raise HTTPException(status_code=404, detail="Client not found")
     
     update_data = {k: v for k, v in client_update.model_dump().items() if v is not None}
+    if "phone" in update_data or "mobile" in update_data:
+        update_data["phone_e164"] = normalize_phones(
+            update_data.get("phone", existing.get("phone")),
+            update_data.get("mobile", existing.get("mobile"))
+        )
     if update_data:
         await db.clients.update_one({"id": client_id}, {"$set": update_data})
     
@@ -261,15 +283,10 @@ async def get_invoice_preview(client_id: str, start_date: str = None, end_date:
         if date_query:
             query["booking_datetime"] = date_query
     
-    bookings = await db.bookings.find(query, {"_id": 0}).sort("booking_datetime", 1).to_list(1000)
-    
-    for booking in bookings:
-        if isinstance(booking.get('created_at'), str):
-            booking['created_at'] = booking['created_at']
-        if isinstance(booking.get('booking_datetime'), str):
-            booking['booking_datetime'] = booking['booking_datetime']
-    
-    return bookings
+    # No cap - anything left out here could never be picked for an invoice - so the
+    # projected rows are streamed out as they are read rather than collected first
+    cursor = db.bookings.find(query, INVOICE_LIST_PROJECTION).sort("booking_datetime", 1).batch_size(INVOICE_CURSOR_BATCH)
+    return StreamingResponse(stream_json_array(cursor), media_type="application/json")
 
 @router.get("/clients/{client_id}/past-jobs")
 async def get_client_past_jobs(client_id: str):
@@ -296,47 +313,17 @@ async def generate_client_invoice(client_id: str, request: InvoiceRequest = None
     
     # If specific booking IDs are provided, use those; otherwise query by date range
     if request and request.booking_ids:
-        bookings = await db.bookings.find(
-            {"id": {"$in": request.booking_ids}, "client_id": client_id, "status": "completed"}, 
-            {"_id": 0}
-        ).sort("booking_datetime", 1).to_list(1000)
+        query = {"id": {"$in": request.booking_ids}, "client_id": client_id, "status": "completed"}
     else:
-        query = {"client_id": client_id, "status": "completed"}
-        if start_date or end_date:
-            date_query = {}
-            if start_date:
-                date_query["$gte"] = start_date
-            if end_date:
-                date_query["$lte"] = end_date + "T23:59:59"
-            if date_query:
-                query["booking_datetime"] = date_query
-        
-        bookings = await db.bookings.find(query, {"_id": 0}).sort("booking_datetime", 1).to_list(1000)
-    
-    # Store booking IDs for the invoice record
-    booking_ids = [b.get('id') for b in bookings]
-    
-    # Calculate totals
-    subtotal = 0
-    for b in bookings:
-        fare = b.get('fare', 0) or 0
-        if request and request.custom_prices and b.get('id') in request.custom_prices:
-            custom_fare = request.custom_prices[b['id']]
-            if custom_fare is not None:
-                fare = custom_fare
-        # Ensure fare is a number
-        fare = float(fare) if fare else 0.0
-        subtotal += fare
+        query = invoice_bookings_query(client_id, start_date, end_date)
+    custom_prices = request.custom_prices if request else None
+    
+    # Stream the bookings once: booking IDs for the record, journey rows and subtotal
+    booking_ids, rows, subtotal = await collect_invoice_rows(query, custom_prices)
     
     # Get client's VAT rate setting
     client_vat_rate = client.get('vat_rate', '20')  # Default to 20%
-    if client_vat_rate == '0' or client_vat_rate == 'exempt':
-        vat_rate = 0.0
-        vat_label = "VAT Exempt" if client_vat_rate == 'exempt' else "No VAT (0%)"
-    else:
-        vat_rate = 0.20
-        vat_label = "VAT @ 20%"
-    
+    vat_rate, vat_label = invoice_vat(client_vat_rate)
     vat_amount = subtotal * vat_rate
     total = subtotal + vat_amount
     
@@ -349,276 +336,12 @@ async def generate_client_invoice(client_id: str, request: InvoiceRequest = None
     )
     invoice_ref = f"INV-{str(counter['seq']).zfill(5)}"
     
-    # Get company settings
-    company_settings = await db.settings.find_one({"type": "company"}, {"_id": 0}) or {}
-    
     # Calculate payment due date (30 days from now)
     payment_terms = client.get('payment_terms', 30)
-    due_date = datetime.now() + timedelta(days=payment_terms)
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=60)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Gold and Black color scheme
-    header_black = colors.HexColor('#1a1a1a')
-    gold_accent = colors.HexColor('#D4AF37')
-    header_gold = colors.HexColor('#C9A227')
-    
-    # Custom styles
-    title_style = ParagraphStyle('title', parent=styles['Normal'], fontSize=20, fontName='Helvetica-Bold', textColor=header_black)
-    company_style = ParagraphStyle('company', parent=styles['Normal'], fontSize=14, fontName='Helvetica-Bold', textColor=header_black)
-    normal_style = ParagraphStyle('normal', parent=styles['Normal'], fontSize=9, leading=12)
-    small_style = ParagraphStyle('small', parent=styles['Normal'], fontSize=8, leading=10, textColor=colors.grey)
-    label_style = ParagraphStyle('label', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
-    value_style = ParagraphStyle('value', parent=styles['Normal'], fontSize=9, fontName='Helvetica-Bold')
-    
-    # ========== HEADER SECTION WITH LOGO ==========
-    logo_path = os.path.join(os.path.dirname(__file__), '..', 'assets', 'logo_border.png')
-    try:
-        logo = Image(logo_path, width=60, height=60)
-    except:
-        logo = Spacer(60, 60)
-    
-    company_info = [
-        [Paragraph("<b>CJ's Executive Travel Limited</b>", company_style)],
-        [Paragraph("Unit 5 Peterlee SR8 2HY", normal_style)],
-        [Paragraph("Phone: +44 1917721223", normal_style)],
-        [Paragraph("Email: admin@cjsdispatch.co.uk", normal_style)],
-        [Paragraph("Web: cjsdispatch.co.uk", normal_style)],
-    ]
-    company_table = Table(company_info, colWidths=[200])
-    company_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    
-    # Logo + Company info combined
-    logo_company = Table([[logo, company_table]], colWidths=[70, 200])
-    logo_company.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (0, 0), 0),
-        ('RIGHTPADDING', (0, 0), (0, 0), 10),
-    ]))
-    
-    # Invoice details box on right
-    invoice_details = [
-        [Paragraph("ACCOUNT NO", label_style), Paragraph(client.get('account_no', ''), value_style)],
-        [Paragraph("REFERENCE", label_style), Paragraph(invoice_ref, value_style)],
-        [Paragraph("TAX DATE", label_style), Paragraph(datetime.now().strftime('%d/%m/%Y'), value_style)],
-    ]
-    invoice_box = Table(invoice_details, colWidths=[70, 100])
-    invoice_box.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
-    ]))
-    
-    header_data = [[logo_company, invoice_box]]
-    header_table = Table(header_data, colWidths=[340, 180])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 20))
-    
-    # ========== BILLING DETAILS ==========
-    billing_info = [
-        [Paragraph("<b>For the attention of:</b>", normal_style)],
-        [Paragraph(f"<b>{client.get('name', '')}</b>", value_style)],
-    ]
-    if client.get('contact_name'):
-        billing_info.append([Paragraph(client['contact_name'], normal_style)])
-    if client.get('address'):
-        for line in client['address'].split('\n'):
-            billing_info.append([Paragraph(line.strip(), normal_style)])
-    if client.get('town_city'):
-        billing_info.append([Paragraph(client['town_city'], normal_style)])
-    if client.get('post_code') or client.get('postcode'):
-        billing_info.append([Paragraph(client.get('post_code') or client.get('postcode', ''), normal_style)])
-    if client.get('country'):
-        billing_info.append([Paragraph(client['country'], normal_style)])
-    
-    billing_table = Table(billing_info, colWidths=[300])
-    billing_table.setStyle(TableStyle([
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(billing_table)
-    elements.append(Spacer(1, 20))
-    
-    # ========== INVOICE SUMMARY BOX - Gold/Black ==========
-    summary_title = Table([[Paragraph("<b>INVOICE SUMMARY</b>", ParagraphStyle('sum_title', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-    summary_title.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), header_black),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(summary_title)
-    
-    summary_data = [
-        [Paragraph(f"<b>Journeys:</b>", normal_style), Paragraph(f"{len(bookings)} Journeys", normal_style), Paragraph(f"Amount: £{subtotal:.2f}", normal_style)],
-    ]
-    summary_table = Table(summary_data, colWidths=[150, 200, 170])
-    summary_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 10))
-    
-    # Totals box
-    totals_data = [
-        [Paragraph("Subtotal:", normal_style), Paragraph(f"£{subtotal:.2f}", value_style)],
-        [Paragraph(f"{vat_label}:", normal_style), Paragraph(f"£{vat_amount:.2f}", value_style)],
-        [Paragraph("<b>Total:</b>", value_style), Paragraph(f"<b>£{total:.2f}</b>", ParagraphStyle('total', fontSize=12, fontName='Helvetica-Bold'))],
-    ]
-    totals_table = Table(totals_data, colWidths=[100, 80])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-        ('LINEABOVE', (0, 2), (-1, 2), 1, colors.black),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    
-    # Right-align totals
-    totals_wrapper = Table([[Spacer(1, 1), totals_table]], colWidths=[340, 180])
-    elements.append(totals_wrapper)
-    elements.append(Spacer(1, 15))
-    
-    # Payment terms
-    terms_data = [
-        [Paragraph(f"<b>Payment Terms:</b> {payment_terms} days", normal_style), 
-         Paragraph(f"<b>Payment Due:</b> {due_date.strftime('%d/%m/%Y')}", normal_style)],
-    ]
-    terms_table = Table(terms_data, colWidths=[260, 260])
-    elements.append(terms_table)
-    elements.append(Spacer(1, 20))
-    
-    # ========== JOURNEYS TABLE - Gold/Black ==========
-    if bookings:
-        # Table header
-        journey_header = Table([[Paragraph("<b>JOURNEY DETAILS</b>", ParagraphStyle('jh', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-        journey_header.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), header_black),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(journey_header)
-        
-        # Table columns
-        table_data = [[
-            Paragraph("<b>Item</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Booker/Passenger</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Journey/Tariff</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Cost</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Tax</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Total</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-        ]]
-        
-        for idx, b in enumerate(bookings, 1):
-            fare = b.get('fare', 0) or 0
-            if request and request.custom_prices and b.get('id') in request.custom_prices:
-                custom_fare = request.custom_prices[b['id']]
-                if custom_fare is not None:
-                    fare = custom_fare
-            # Ensure fare is a number
-            fare = float(fare) if fare else 0.0
-            
-            tax = fare * vat_rate
-            item_total = fare + tax
-            
-            # Format journey details
-            pickup = b.get('pickup_location', '')
-            dropoff = b.get('dropoff_location', '')
-            journey_text = f"P: {pickup}<br/>D: {dropoff}"
-            
-            # Add stops if any
-            stops = b.get('additional_stops', [])
-            if stops:
-                for i, stop in enumerate(stops):
-                    journey_text = journey_text.replace("D:", f"V{i+1}: {stop}<br/>D:")
-            
-            # Passenger info
-            passenger = f"{b.get('first_name', '')} {b.get('last_name', '')}".strip() or "N/A"
-            booking_ref = b.get('booking_id', '')
-            
-            table_data.append([
-                Paragraph(str(idx), small_style),
-                Paragraph(f"{booking_ref}<br/>{passenger}", small_style),
-                Paragraph(journey_text, small_style),
-                Paragraph(f"£{fare:.2f}", small_style),
-                Paragraph(f"£{tax:.2f}", small_style),
-                Paragraph(f"£{item_total:.2f}", small_style),
-            ])
-        
-        journey_table = Table(table_data, colWidths=[30, 80, 230, 55, 55, 55])
-        journey_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FDF8E8')),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, gold_accent),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        elements.append(journey_table)
-        elements.append(Spacer(1, 20))
-    
-    # ========== FOOTER - BANKING DETAILS - Gold/Black ==========
-    bank_title = Table([[Paragraph("<b>BANKING DETAILS</b>", ParagraphStyle('bt', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-    bank_title.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), header_black),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(bank_title)
-    
-    bank_data = [
-        [Paragraph("Bank Name:", label_style), Paragraph("Starling Bank", normal_style),
-         Paragraph("Sort Code:", label_style), Paragraph("60-83-71", normal_style)],
-        [Paragraph("Account No:", label_style), Paragraph("15222155", normal_style),
-         Paragraph("BIC:", label_style), Paragraph("SRLGGB2L", normal_style)],
-        [Paragraph("IBAN:", label_style), Paragraph("GB31SRLG60837115222155", normal_style),
-         Paragraph("VAT No:", label_style), Paragraph("354626783", normal_style)],
-    ]
-    bank_table = Table(bank_data, colWidths=[70, 130, 70, 130])
-    bank_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
-    ]))
-    elements.append(bank_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
-    # Save invoice record
+    created_at = datetime.now(timezone.utc)
+    due_date = created_at + timedelta(days=payment_terms)
+    
+    # Save invoice record first so a failed render never loses the invoice number
     invoice_record = {
         "id": str(uuid.uuid4()),
         "invoice_ref": invoice_ref,
@@ -629,19 +352,30 @@ async def generate_client_invoice(client_id: str, request: InvoiceRequest = None
         "vat_rate": client_vat_rate,
         "vat_amount": vat_amount,
         "total": total,
-        "journey_count": len(bookings),
+        "journey_count": len(rows),
         "booking_ids": booking_ids,  # Store the booking IDs for this invoice
+        "custom_prices": custom_prices,
         "status": "unpaid",
         "due_date": due_date.isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": created_at.isoformat()
     }
     await db.invoices.insert_one(invoice_record)
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={invoice_ref}.pdf"}
+    # Same payload a later download builds, so that download is a cache hit
+    payload = build_invoice_payload(
+        invoice_ref=invoice_ref,
+        client=client,
+        tax_date=created_at,
+        due_date=due_date,
+        payment_terms=payment_terms,
+        vat_rate=vat_rate,
+        vat_label=vat_label,
+        subtotal=subtotal,
+        vat_amount=vat_amount,
+        total=total,
+        rows=rows,
     )
+    return await pdf_response(get_db(), "invoice", payload, f"{invoice_ref}.pdf")
 
 
 
@@ -660,34 +394,95 @@ class InvoiceUpdate(BaseModel):
     notes: Optional[str] = None
     booking_ids: Optional[List[str]] = None  # List of booking IDs to include
 
+INVOICE_PAGE_DEFAULT = 50
+INVOICE_PAGE_MAX = 200
+
 @router.get("/invoices")
-async def get_all_invoices():
-    """Get all invoices across all clients (admin view)"""
-    invoices = await db.invoices.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Enrich with client names
-    client_ids = list(set(inv.get("client_id") for inv in invoices if inv.get("client_id")))
-    clients = await db.clients.find({"id": {"$in": client_ids}}, {"_id": 0, "id": 1, "name": 1, "account_no": 1, "email": 1}).to_list(1000)
-    client_map = {c["id"]: c for c in clients}
-    
-    for inv in invoices:
-        client = client_map.get(inv.get("client_id"), {})
-        inv["client_name"] = client.get("name", "Unknown")
-        inv["client_account_no"] = client.get("account_no", "")
-        inv["client_email"] = client.get("email", "")
-        
-        # Include bookings for each invoice (for edit modal)
-        if inv.get("booking_ids"):
-            bookings = await db.bookings.find(
-                {"id": {"$in": inv["booking_ids"]}}, 
-                {"_id": 0, "id": 1, "booking_id": 1, "pickup_location": 1, "fare": 1, "booking_datetime": 1}
-            ).to_list(1000)
-            inv["bookings"] = bookings
-        else:
-            inv["bookings"] = []
-    
+async def get_all_invoices(response: Response, skip: int = 0, limit: int = INVOICE_PAGE_DEFAULT,
+                           status: Optional[str] = None, search: Optional[str] = None):
+    """Get invoices across all clients (admin view), newest first, a page at a time.
+
+    While more remain, X-Next-Skip holds the skip for the next page. search
+    matches the invoice reference or the client's name or account number.
+    Client details are joined with $lookup in the same pipeline; booking
+    summaries are loaded per invoice from /invoices/{id}/bookings when the
+    edit modal opens.
+    """
+    limit = max(1, min(limit, INVOICE_PAGE_MAX))
+    skip = max(skip, 0)
+    match = {}
+    if status:
+        match["status"] = status
+    if search and search.strip():
+        pattern = {"$regex": re.escape(search.strip()), "$options": "i"}
+        client_ids = await db.clients.distinct("id", {"$or": [{"name": pattern}, {"account_no": pattern}]})
+        match["$or"] = [{"invoice_ref": pattern}, {"client_id": {"$in": client_ids}}]
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$sort": {"created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "clients",
+            "localField": "client_id",
+            "foreignField": "id",
+            "pipeline": [{"$project": {"_id": 0, "name": 1, "account_no": 1, "email": 1}}],
+            "as": "client"
+        }},
+        {"$set": {"client": {"$ifNull": [{"$first": "$client"}, {}]}}},
+        {"$set": {
+            "client_name": {"$ifNull": ["$client.name", "Unknown"]},
+            "client_account_no": {"$ifNull": ["$client.account_no", ""]},
+            "client_email": {"$ifNull": ["$client.email", ""]}
+        }},
+        {"$project": {"_id": 0, "client": 0}}
+    ]
+    invoices = await db.invoices.aggregate(pipeline).to_list(limit)
+    if len(invoices) == limit:
+        response.headers["X-Next-Skip"] = str(skip + limit)
     return invoices
 
+
+@router.get("/invoices/summary")
+async def get_invoice_summary():
+    """Invoice counts by status and the outstanding value, across every invoice"""
+    rows = await db.invoices.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}, "value": {"$sum": {"$ifNull": ["$total", 0]}}}}
+    ]).to_list(None)
+    by_status = {row["_id"]: row for row in rows}
+    outstanding = [by_status.get(s, {}) for s in ("unpaid", "overdue")]
+    return {
+        "total": sum(row["count"] for row in rows),
+        "paid": by_status.get("paid", {}).get("count", 0),
+        "unpaid": by_status.get("unpaid", {}).get("count", 0),
+        "overdue": by_status.get("overdue", {}).get("count", 0),
+        "total_value": sum(row["value"] for row in rows),
+        "outstanding_value": sum(row.get("value", 0) for row in outstanding),
+    }
+
+
+@router.get("/invoices/{invoice_id}/bookings")
+async def get_invoice_bookings(invoice_id: str):
+    """Projected booking summaries for one invoice (loaded by the edit modal)"""
+    pipeline = [
+        {"$match": {"id": invoice_id}},
+        {"$lookup": {
+            "from": "bookings",
+            "localField": "booking_ids",
+            "foreignField": "id",
+            "pipeline": [
+                {"$project": {"_id": 0, "id": 1, "booking_id": 1, "pickup_location": 1, "fare": 1, "booking_datetime": 1}},
+                {"$sort": {"booking_datetime": 1}}
+            ],
+            "as": "bookings"
+        }},
+        {"$project": {"_id": 0, "bookings": 1}}
+    ]
+    result = await db.invoices.aggregate(pipeline).to_list(1)
+    if not result:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return result[0]["bookings"]
+
 @router.get("/invoices/{invoice_id}")
 async def get_invoice_details(invoice_id: str):
     """Get detailed invoice information"""
@@ -707,8 +502,8 @@ async def get_invoice_details(invoice_id: str):
     if invoice.get("booking_ids"):
         bookings = await db.bookings.find(
             {"id": {"$in": invoice["booking_ids"]}}, 
-            {"_id": 0}
-        ).sort("booking_datetime", 1).to_list(1000)
+            INVOICE_LIST_PROJECTION
+        ).sort("booking_datetime", 1).to_list(None)
     else:
         # Fallback to date range query for old invoices
         query = {"client_id": invoice.get("client_id")}
@@ -721,7 +516,7 @@ async def get_invoice_details(invoice_id: str):
             if date_query:
                 query["booking_datetime"] = date_query
         
-        bookings = await db.bookings.find(query, {"_id": 0}).sort("booking_datetime", 1).to_list(1000)
+        bookings = await db.bookings.find(query, INVOICE_LIST_PROJECTION).sort("booking_datetime", 1).to_list(None)
     
     invoice["bookings"] = bookings
     
@@ -800,10 +595,7 @@ async def update_invoice(invoice_id: str, invoice_update: InvoiceUpdate):
     # If booking_ids is updated, recalculate subtotal from bookings
     if "booking_ids" in update_data:
         booking_ids = update_data["booking_ids"]
-        # Get the bookings to calculate new subtotal
-        bookings = await db.bookings.find({"id": {"$in": booking_ids}}, {"_id": 0, "fare": 1}).to_list(1000)
-        new_subtotal = sum(float(b.get("fare", 0) or 0) for b in bookings)
-        update_data["subtotal"] = new_subtotal
+        update_data["subtotal"] = await sum_booking_fares(booking_ids)
         update_data["journey_count"] = len(booking_ids)
     
     # If VAT rate is changed or subtotal changed, recalculate amounts
@@ -849,280 +641,8 @@ async def download_invoice_pdf(invoice_id: str):
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Get bookings for this invoice - prefer booking_ids if available
-    if invoice.get("booking_ids"):
-        bookings = await db.bookings.find(
-            {"id": {"$in": invoice["booking_ids"]}}, 
-            {"_id": 0}
-        ).sort("booking_datetime", 1).to_list(1000)
-    else:
-        # Fallback to date range query for old invoices
-        query = {"client_id": invoice.get("client_id"), "status": "completed"}
-        if invoice.get("start_date") or invoice.get("end_date"):
-            date_query = {}
-            if invoice.get("start_date"):
-                date_query["$gte"] = invoice["start_date"]
-            if invoice.get("end_date"):
-                date_query["$lte"] = invoice["end_date"] + "T23:59:59"
-            if date_query:
-                query["booking_datetime"] = date_query
-        
-        bookings = await db.bookings.find(query, {"_id": 0}).sort("booking_datetime", 1).to_list(1000)
-    
-    # Use stored values from invoice
-    subtotal = invoice.get('subtotal', 0) or 0
-    vat_amount = invoice.get('vat_amount', 0) or 0
-    total = invoice.get('total', 0) or 0
-    client_vat_rate = invoice.get('vat_rate', '20')
-    
-    if client_vat_rate == '0' or client_vat_rate == 'exempt':
-        vat_rate = 0.0
-        vat_label = "VAT Exempt" if client_vat_rate == 'exempt' else "No VAT (0%)"
-    else:
-        vat_rate = 0.20
-        vat_label = "VAT @ 20%"
-    
-    # Calculate payment due date
-    payment_terms = client.get('payment_terms', 30)
-    created_at = invoice.get('created_at', datetime.now(timezone.utc).isoformat())
-    if isinstance(created_at, str):
-        created_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-    else:
-        created_date = created_at
-    due_date = created_date + timedelta(days=payment_terms)
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=60)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Gold and Black color scheme
-    header_black = colors.HexColor('#1a1a1a')
-    gold_accent = colors.HexColor('#D4AF37')
-    header_gold = colors.HexColor('#C9A227')
-    
-    company_style = ParagraphStyle('company', parent=styles['Normal'], fontSize=14, fontName='Helvetica-Bold', textColor=header_black)
-    normal_style = ParagraphStyle('normal', parent=styles['Normal'], fontSize=9, leading=12)
-    small_style = ParagraphStyle('small', parent=styles['Normal'], fontSize=8, leading=10, textColor=colors.grey)
-    label_style = ParagraphStyle('label', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
-    value_style = ParagraphStyle('value', parent=styles['Normal'], fontSize=9, fontName='Helvetica-Bold')
-    
-    # Header with Logo
-    logo_path = os.path.join(os.path.dirname(__file__), '..', 'assets', 'logo_border.png')
-    try:
-        logo = Image(logo_path, width=60, height=60)
-    except:
-        logo = Spacer(60, 60)
-    
-    company_info = [
-        [Paragraph("<b>CJ's Executive Travel Limited</b>", company_style)],
-        [Paragraph("Unit 5 Peterlee SR8 2HY", normal_style)],
-        [Paragraph("Phone: +44 1917721223", normal_style)],
-        [Paragraph("Email: admin@cjsdispatch.co.uk", normal_style)],
-        [Paragraph("Web: cjsdispatch.co.uk", normal_style)],
-    ]
-    company_table = Table(company_info, colWidths=[200])
-    company_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    
-    # Logo + Company info combined
-    logo_company = Table([[logo, company_table]], colWidths=[70, 200])
-    logo_company.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (0, 0), 0),
-        ('RIGHTPADDING', (0, 0), (0, 0), 10),
-    ]))
-    
-    invoice_details = [
-        [Paragraph("ACCOUNT NO", label_style), Paragraph(client.get('account_no', ''), value_style)],
-        [Paragraph("REFERENCE", label_style), Paragraph(invoice.get('invoice_ref', ''), value_style)],
-        [Paragraph("TAX DATE", label_style), Paragraph(created_date.strftime('%d/%m/%Y'), value_style)],
-    ]
-    invoice_box = Table(invoice_details, colWidths=[70, 100])
-    invoice_box.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
-    ]))
-    
-    header_data = [[logo_company, invoice_box]]
-    header_table = Table(header_data, colWidths=[340, 180])
-    header_table.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 20))
-    
-    # Billing details
-    billing_info = [
-        [Paragraph("<b>For the attention of:</b>", normal_style)],
-        [Paragraph(f"<b>{client.get('name', '')}</b>", value_style)],
-    ]
-    if client.get('contact_name'):
-        billing_info.append([Paragraph(client['contact_name'], normal_style)])
-    if client.get('address'):
-        for line in client['address'].split('\n'):
-            billing_info.append([Paragraph(line.strip(), normal_style)])
-    if client.get('town_city'):
-        billing_info.append([Paragraph(client['town_city'], normal_style)])
-    if client.get('post_code') or client.get('postcode'):
-        billing_info.append([Paragraph(client.get('post_code') or client.get('postcode', ''), normal_style)])
-    
-    billing_table = Table(billing_info, colWidths=[300])
-    billing_table.setStyle(TableStyle([
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(billing_table)
-    elements.append(Spacer(1, 20))
-    
-    # Invoice Summary - Gold/Black
-    summary_title = Table([[Paragraph("<b>INVOICE SUMMARY</b>", ParagraphStyle('st', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-    summary_title.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), header_black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(summary_title)
-    
-    summary_data = [[Paragraph(f"<b>Journeys:</b>", normal_style), Paragraph(f"{len(bookings)} Journeys", normal_style), Paragraph(f"Amount: £{subtotal:.2f}", normal_style)]]
-    summary_table = Table(summary_data, colWidths=[150, 200, 170])
-    summary_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 10))
-    
-    # Totals
-    totals_data = [
-        [Paragraph("Subtotal:", normal_style), Paragraph(f"£{subtotal:.2f}", value_style)],
-        [Paragraph(f"{vat_label}:", normal_style), Paragraph(f"£{vat_amount:.2f}", value_style)],
-        [Paragraph("<b>Total:</b>", value_style), Paragraph(f"<b>£{total:.2f}</b>", ParagraphStyle('total', fontSize=12, fontName='Helvetica-Bold'))],
-    ]
-    totals_table = Table(totals_data, colWidths=[100, 80])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('LINEABOVE', (0, 2), (-1, 2), 1, colors.black),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    totals_wrapper = Table([[Spacer(1, 1), totals_table]], colWidths=[340, 180])
-    elements.append(totals_wrapper)
-    elements.append(Spacer(1, 15))
-    
-    # Payment terms
-    terms_data = [[Paragraph(f"<b>Payment Terms:</b> {payment_terms} days", normal_style), 
-                   Paragraph(f"<b>Payment Due:</b> {due_date.strftime('%d/%m/%Y')}", normal_style)]]
-    terms_table = Table(terms_data, colWidths=[260, 260])
-    elements.append(terms_table)
-    elements.append(Spacer(1, 20))
-    
-    # Journeys Table - Gold/Black
-    if bookings:
-        journey_header = Table([[Paragraph("<b>JOURNEY DETAILS</b>", ParagraphStyle('jh', fontSize=11, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-        journey_header.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), header_black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(journey_header)
-        
-        table_data = [[
-            Paragraph("<b>Item</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Booker/Passenger</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Journey/Tariff</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Cost</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Tax</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-            Paragraph("<b>Total</b>", ParagraphStyle('th', fontSize=8, fontName='Helvetica-Bold')),
-        ]]
-        
-        for idx, b in enumerate(bookings, 1):
-            fare = float(b.get('fare', 0) or 0)
-            tax = fare * vat_rate
-            item_total = fare + tax
-            
-            pickup = b.get('pickup_location', '')
-            dropoff = b.get('dropoff_location', '')
-            journey_text = f"P: {pickup}<br/>D: {dropoff}"
-            
-            passenger = f"{b.get('first_name', '')} {b.get('last_name', '')}".strip() or "N/A"
-            booking_ref = b.get('booking_id', '')
-            
-            table_data.append([
-                Paragraph(str(idx), small_style),
-                Paragraph(f"{booking_ref}<br/>{passenger}", small_style),
-                Paragraph(journey_text, small_style),
-                Paragraph(f"£{fare:.2f}", small_style),
-                Paragraph(f"£{tax:.2f}", small_style),
-                Paragraph(f"£{item_total:.2f}", small_style),
-            ])
-        
-        journey_table = Table(table_data, colWidths=[30, 80, 230, 55, 55, 55])
-        journey_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FDF8E8')),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, gold_accent),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(journey_table)
-        elements.append(Spacer(1, 20))
-    
-    # Banking Details - Gold/Black
-    bank_title = Table([[Paragraph("<b>BANKING DETAILS</b>", ParagraphStyle('bt', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white))]], colWidths=[520])
-    bank_title.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), header_black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(bank_title)
-    
-    bank_data = [
-        [Paragraph("Bank Name:", label_style), Paragraph("Starling Bank", normal_style),
-         Paragraph("Sort Code:", label_style), Paragraph("60-83-71", normal_style)],
-        [Paragraph("Account No:", label_style), Paragraph("15222155", normal_style),
-         Paragraph("BIC:", label_style), Paragraph("SRLGGB2L", normal_style)],
-        [Paragraph("IBAN:", label_style), Paragraph("GB31SRLG60837115222155", normal_style),
-         Paragraph("VAT No:", label_style), Paragraph("354626783", normal_style)],
-    ]
-    bank_table = Table(bank_data, colWidths=[70, 130, 70, 130])
-    bank_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, gold_accent),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E8D5A3')),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FDF8E8')),
-    ]))
-    elements.append(bank_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={invoice.get('invoice_ref', 'invoice')}.pdf"}
-    )
+    payload = await stored_invoice_payload(invoice, client)
+    return await pdf_response(get_db(), "invoice", payload, f"{invoice.get('invoice_ref', 'invoice')}.pdf")
 
 @router.delete("/invoices/{invoice_id}")
 async def delete_invoice(invoice_id: str):
@@ -1209,3 +729,308 @@ CJ's Executive Travel
         return {"message": f"Reminder sent to {client_email}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
+
+
+# ========== MONTH-END BATCH INVOICING ==========
+INVOICE_BATCH_EMAIL_CONCURRENCY = 4
+INVOICE_BATCH_PROGRESS_EVERY = 10
+INVOICE_BATCH_CHUNK = 50  # clients invoiced, rendered and recorded together
+INVOICE_BATCH_STALE_MINUTES = 10  # a "running" job this quiet died with its worker
+INVOICE_EMAIL_MAX_ATTEMPTS = 5
+
+def _period_bounds(period: str) -> tuple:
+    """'2026-09' -> ('2026-09-01', '2026-09-30')"""
+    try:
+        month_start = datetime.strptime(period, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="period must be in YYYY-MM format")
+    last_day = calendar.monthrange(month_start.year, month_start.month)[1]
+    return f"{period}-01", f"{period}-{last_day:02d}"
+
+async def _update_batch_job(job_id: str, inc: Optional[dict] = None, **fields):
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update = {"$set": fields}
+    if inc:
+        update["$inc"] = inc
+    if fields.get("status") in ("completed", "failed"):
+        # Releases the period for the next run
+        update["$unset"] = {"active": ""}
+    await db.invoice_jobs.update_one({"id": job_id}, update)
+
+async def _client_invoice_groups(query: dict):
+    """
+    (client_id, booking_ids, rows, subtotal) per client, from one cursor sorted
+    by client then date - only one client's journeys are held at a time.
+    """
+    cursor = db.bookings.find(query, {**INVOICE_BOOKING_PROJECTION, "client_id": 1}).sort(
+        [("client_id", 1), ("booking_datetime", 1)]
+    ).batch_size(INVOICE_CURSOR_BATCH)
+    client_id, booking_ids, rows, subtotal = None, [], [], 0.0
+    async for b in cursor:
+        if b["client_id"] != client_id:
+            if booking_ids:
+                yield client_id, booking_ids, rows, subtotal
+            client_id, booking_ids, rows, subtotal = b["client_id"], [], [], 0.0
+        fare = invoice_fare(b)
+        subtotal += fare
+        booking_ids.append(b.get('id'))
+        rows.append(invoice_row(b, fare))
+    if booking_ids:
+        yield client_id, booking_ids, rows, subtotal
+
+async def _issue_batch_invoices(job_id: str, period: str, clients: dict, groups: list) -> list:
+    """Record, then render, one chunk of batch invoices; returns render errors"""
+    start_date, end_date = _period_bounds(period)
+    # Reserve the chunk's run of invoice numbers with one increment
+    counter = await db.counters.find_one_and_update(
+        {"_id": "invoice_number"},
+        {"$inc": {"seq": len(groups)}},
+        upsert=True,
+        return_document=True
+    )
+    first_seq = counter["seq"] - len(groups) + 1
+    
+    created_at = datetime.now(timezone.utc)
+    records = []
+    payloads = []
+    for offset, (client_id, booking_ids, rows, subtotal) in enumerate(groups):
+        client = clients[client_id]
+        client_vat_rate = client.get('vat_rate', '20')
+        vat_rate, vat_label = invoice_vat(client_vat_rate)
+        vat_amount = subtotal * vat_rate
+        total = subtotal + vat_amount
+        payment_terms = client.get('payment_terms', 30)
+        due_date = created_at + timedelta(days=payment_terms)
+        invoice_ref = f"INV-{str(first_seq + offset).zfill(5)}"
+        
+        record = {
+            "id": str(uuid.uuid4()),
+            "invoice_ref": invoice_ref,
+            "client_id": client_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "subtotal": subtotal,
+            "vat_rate": client_vat_rate,
+            "vat_amount": vat_amount,
+            "total": total,
+            "journey_count": len(rows),
+            "booking_ids": booking_ids,
+            "custom_prices": None,
+            "status": "unpaid",
+            "due_date": due_date.isoformat(),
+            "created_at": created_at.isoformat(),
+            "batch_period": period,
+            "batch_job_id": job_id,
+        }
+        # Queued with the invoice, so a run that dies before sending still leaves it to send
+        if client.get("email") or client.get("contact_email"):
+            record["email_status"] = "pending"
+        records.append(record)
+        payloads.append(build_invoice_payload(
+            invoice_ref=invoice_ref,
+            client=client,
+            tax_date=created_at,
+            due_date=due_date,
+            payment_terms=payment_terms,
+            vat_rate=vat_rate,
+            vat_label=vat_label,
+            subtotal=subtotal,
+            vat_amount=vat_amount,
+            total=total,
+            rows=rows,
+        ))
+    
+    await db.invoices.insert_many(records, ordered=False)
+    await _update_batch_job(job_id, inc={
+        "invoices_created": len(records),
+        "emails_queued": sum(1 for r in records if r.get("email_status")),
+    })
+    
+    # Render into the PDF cache; enough in flight to keep every pool worker busy
+    render_slots = asyncio.Semaphore(PDF_RENDER_WORKERS * 2)
+    database = get_db()
+    errors = []
+    rendered = 0
+    
+    async def render(record: dict, payload: dict):
+        nonlocal rendered
+        async with render_slots:
+            try:
+                await ensure_pdf_cached(database, "invoice", payload)
+            except Exception as e:
+                errors.append(f"{record['invoice_ref']}: {e}")
+        rendered += 1
+        if rendered % INVOICE_BATCH_PROGRESS_EVERY == 0:
+            await _update_batch_job(job_id, inc={"rendered": INVOICE_BATCH_PROGRESS_EVERY})
+    
+    await asyncio.gather(*(render(r, p) for r, p in zip(records, payloads)))
+    await _update_batch_job(job_id, inc={"rendered": rendered % INVOICE_BATCH_PROGRESS_EVERY})
+    return errors
+
+async def _send_invoice_email(invoice: dict) -> bool:
+    client = await db.clients.find_one(
+        {"id": invoice["client_id"]}, {"_id": 0, "name": 1, "contact_name": 1, "email": 1, "contact_email": 1})
+    to_email = client and (client.get("email") or client.get("contact_email"))
+    if not to_email:
+        return False
+    details = {
+        "invoice_ref": invoice["invoice_ref"],
+        "period": datetime.strptime(invoice["batch_period"], "%Y-%m").strftime("%B %Y"),
+        "journey_count": invoice["journey_count"],
+        "total": invoice["total"],
+        "due_date": datetime.fromisoformat(invoice["due_date"]).strftime('%d/%m/%Y'),
+    }
+    # SMTP is blocking, so the send runs in a thread
+    return await asyncio.to_thread(
+        send_corporate_invoice_issued_email,
+        to_email, client.get("contact_name") or client.get("name", ""), client.get("name", ""), details
+    )
+
+async def drain_invoice_emails(query: dict, job_id: Optional[str] = None) -> int:
+    """
+    Send the pending invoice emails matching query, each tried at most once per
+    drain. The claim is atomic, so concurrent drains never send one twice; a
+    failed send goes back to pending for the next drain until
+    INVOICE_EMAIL_MAX_ATTEMPTS. Returns how many were sent.
+    """
+    tried = []
+    sent = 0
+    
+    async def worker():
+        nonlocal sent
+        while True:
+            now = datetime.now(timezone.utc)
+            # A "sending" claim this old died with its worker
+            stale_before = (now - timedelta(minutes=INVOICE_BATCH_STALE_MINUTES)).isoformat()
+            invoice = await db.invoices.find_one_and_update(
+                {**query, "id": {"$nin": tried}, "$or": [
+                    {"email_status": "pending"},
+                    {"email_status": "sending", "email_claimed_at": {"$lt": stale_before}},
+                ]},
+                {"$set": {"email_status": "sending", "email_claimed_at": now.isoformat()}, "$inc": {"email_attempts": 1}},
+                projection={"_id": 0, "id": 1, "invoice_ref": 1, "client_id": 1, "batch_period": 1,
+                            "journey_count": 1, "total": 1, "due_date": 1, "email_attempts": 1},
+                return_document=True
+            )
+            if not invoice:
+                return
+            tried.append(invoice["id"])
+            try:
+                delivered = await _send_invoice_email(invoice)
+            except Exception as e:
+                logger.warning(f"Invoice email for {invoice['invoice_ref']} failed: {e}")
+                delivered = False
+            if delivered:
+                status = "sent"
+            elif invoice["email_attempts"] >= INVOICE_EMAIL_MAX_ATTEMPTS:
+                status = "failed"
+            else:
+                status = "pending"
+            await db.invoices.update_one(
+                {"id": invoice["id"]},
+                {"$set": {"email_status": status, "email_updated_at": datetime.now(timezone.utc).isoformat()},
+                 "$unset": {"email_claimed_at": ""}}
+            )
+            if delivered:
+                sent += 1
+            if job_id:
+                # Every send is progress, so a long SMTP run never looks stale
+                await _update_batch_job(job_id, inc={"emails_sent": 1} if delivered else None)
+    
+    await asyncio.gather(*(worker() for _ in range(INVOICE_BATCH_EMAIL_CONCURRENCY)))
+    return sent
+
+async def run_invoice_batch(job_id: str, period: str):
+    """Invoice every active client for one month: fetch, record, render, then send the queued emails"""
+    start_date, end_date = _period_bounds(period)
+    try:
+        await _update_batch_job(job_id, status="running")
+        
+        # Clients already invoiced by an earlier run for this period are skipped
+        already_invoiced = set(await db.invoices.distinct("client_id", {"batch_period": period}))
+        clients = {
+            c["id"]: c
+            async for c in db.clients.find({"status": ClientStatus.ACTIVE.value}, {"_id": 0})
+            if c["id"] not in already_invoiced
+        }
+        
+        # Bookings already on an invoice - a manual one for the same month included - are never billed twice
+        invoiced_bookings = await db.invoices.distinct("booking_ids", {
+            "client_id": {"$in": list(clients)},
+            "status": {"$ne": "cancelled"},
+            "$nor": [{"end_date": {"$lt": start_date}}, {"start_date": {"$gt": end_date}}],
+        })
+        
+        query = invoice_bookings_query(None, start_date, end_date)
+        query["client_id"] = {"$in": list(clients)}
+        if invoiced_bookings:
+            query["id"] = {"$nin": invoiced_bookings}
+        billable = await db.bookings.distinct("client_id", query)
+        await _update_batch_job(job_id, total_clients=len(billable))
+        
+        # One pass over the month's bookings in client order, invoiced a chunk of clients at a time
+        errors = []
+        groups = []
+        async for group in _client_invoice_groups(query):
+            groups.append(group)
+            if len(groups) >= INVOICE_BATCH_CHUNK:
+                errors += await _issue_batch_invoices(job_id, period, clients, groups)
+                groups = []
+        if groups:
+            errors += await _issue_batch_invoices(job_id, period, clients, groups)
+        await _update_batch_job(job_id, errors=errors)
+        
+        # Includes emails an earlier, interrupted run for this period left queued
+        await drain_invoice_emails({"batch_period": period}, job_id)
+        
+        await _update_batch_job(job_id, status="completed", finished_at=datetime.now(timezone.utc).isoformat())
+    except Exception as e:
+        logger.exception(f"Invoice batch {job_id} for {period} failed")
+        await _update_batch_job(job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc).isoformat())
+
+@router.post("/invoices/batch")
+async def start_invoice_batch(period: str, background_tasks: BackgroundTasks):
+    """Start month-end invoicing for every active client as a background job"""
+    _period_bounds(period)
+    
+    # A job this quiet died with its worker - release its claim on the period
+    stale_before = (datetime.now(timezone.utc) - timedelta(minutes=INVOICE_BATCH_STALE_MINUTES)).isoformat()
+    await db.invoice_jobs.update_many(
+        {"period": period, "active": True, "updated_at": {"$lt": stale_before}},
+        {"$set": {"status": "failed", "error": "Worker stopped responding"}, "$unset": {"active": ""}}
+    )
+    
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "id": str(uuid.uuid4()),
+        "period": period,
+        "status": "queued",
+        "active": True,
+        "total_clients": 0,
+        "invoices_created": 0,
+        "rendered": 0,
+        "emails_queued": 0,
+        "emails_sent": 0,
+        "errors": [],
+        "created_at": now,
+        "updated_at": now,
+    }
+    # The unique partial index on (period, active) makes this insert the claim
+    try:
+        await db.invoice_jobs.insert_one(job)
+    except DuplicateKeyError:
+        running = await db.invoice_jobs.find_one({"period": period, "active": True}, {"_id": 0, "id": 1})
+        detail = f"Invoice batch for {period} is already running" + (f" (job {running['id']})" if running else "")
+        raise HTTPException(status_code=409, detail=detail)
+    job.pop("_id", None)
+    
+    background_tasks.add_task(run_invoice_batch, job["id"], period)
+    return job
+
+@router.get("/invoices/batch/{job_id}")
+async def get_invoice_batch(job_id: str):
+    """Progress of a month-end invoicing job"""
+    job = await db.invoice_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Invoice batch job not found")
+    return job
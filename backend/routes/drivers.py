@@ -7,9 +7,10 @@ import uuid
 import jwt
 
 from .shared import (
-    db, hash_password, get_current_driver, DriverStatus,
+    db, hash_password, get_current_driver, get_driver_claims, DriverStatus, normalize_phone,
     JWT_SECRET, JWT_ALGORITHM
 )
+from .chat import rename_chat_thread_driver
 
 router = APIRouter(tags=["Drivers"])
 
@@ -145,6 +146,7 @@ async def create_driver(driver: DriverCreate):
     driver_dict["current_location"] = None
     driver_dict["last_location_update"] = None
     driver_dict["created_at"] = datetime.now(timezone.utc).isoformat()
+    driver_dict["phone_e164"] = normalize_phone(driver_dict.get("phone"))
     driver_dict["password_hash"] = hash_password(driver_dict.pop("password"))
     
     await db.drivers.insert_one(driver_dict)
@@ -173,6 +175,8 @@ async def update_driver(driver_id: str, driver_update: DriverUpdate):
     
     if "password" in update_data:
         update_data["password_hash"] = hash_password(update_data.pop("password"))
+    if "phone" in update_data:
+        update_data["phone_e164"] = normalize_phone(update_data["phone"])
     
     if update_data:
         await db.drivers.update_one({"id": driver_id}, {"$set": update_data})
@@ -180,6 +184,8 @@ async def update_driver(driver_id: str, driver_update: DriverUpdate):
     driver = await db.drivers.find_one({"id": driver_id}, {"_id": 0, "password_hash": 0})
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
+    if "name" in update_data:
+        await rename_chat_thread_driver(driver_id, driver.get("name"))
     return driver
 
 
@@ -282,7 +288,7 @@ async def update_driver_status(status_update: DriverAppStatus, driver: dict = De
 
 
 @router.put("/driver/location")
-async def update_driver_location(location: DriverLocationUpdate, driver: dict = Depends(get_current_driver)):
+async def update_driver_location(location: DriverLocationUpdate, driver: dict = Depends(get_driver_claims)):
     """Update driver's current location"""
     await db.drivers.update_one(
         {"id": driver["id"]},
@@ -1,5 +1,5 @@
 # External API Routes (Google Maps, Postcode, Flight Tracking)
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timezone, timedelta
@@ -8,6 +8,8 @@ import logging
 import os
 
 from .shared import db
+from route_cache import route_from_leg, store_routes
+from geocodes import remember_leg, remember_postcode_centroid
 
 router = APIRouter(tags=["External APIs"])
 
@@ -84,6 +86,13 @@ async def get_directions(origin: str, destination: str):
                 else:
                     duration_text = f"{duration_minutes} mins"
                 
+                # Keep the distance and both ends for fare quotes, travel-time checks and booking coordinates
+                try:
+                    await store_routes(db, [route_from_leg(origin, destination, leg)])
+                except Exception as e:
+                    logging.warning(f"Failed to cache route: {e}")
+                await remember_leg(db, origin, destination, leg)
+                
                 return {
                     "success": True,
                     "distance": {
@@ -116,7 +125,7 @@ async def get_directions(origin: str, destination: str):
 
 
 @router.get("/postcode/{postcode}")
-async def lookup_postcode(postcode: str):
+async def lookup_postcode(postcode: str, background_tasks: BackgroundTasks):
     """Lookup addresses for a UK postcode using Getaddress.io autocomplete API"""
     clean_postcode = postcode.replace(" ", "").upper()
     
@@ -153,6 +162,8 @@ async def lookup_postcode(postcode: str):
                 if len(clean_postcode) > 3:
                     formatted_postcode = clean_postcode[:-3] + " " + clean_postcode[-3:]
                 
+                # Centroid fallback for addresses in this postcode that can't be geocoded
+                background_tasks.add_task(remember_postcode_centroid, db, formatted_postcode)
                 return {"postcode": formatted_postcode, "addresses": addresses}
             elif response.status_code == 404:
                 return {"postcode": postcode, "addresses": [], "error": "Postcode not found"}
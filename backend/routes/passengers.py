@@ -6,7 +6,7 @@ from datetime import datetime, timezone, timedelta
 import uuid
 
 from .shared import (
-    db, hash_password, create_token, get_current_passenger, JWT_SECRET, JWT_ALGORITHM
+    db, hash_password, create_token, get_current_passenger, normalize_phone, JWT_SECRET, JWT_ALGORITHM
 )
 
 router = APIRouter(tags=["Passenger Portal"])
@@ -53,7 +53,8 @@ class BookingRequestCreate(BaseModel):
 async def register_passenger(data: PassengerRegister):
     """Register a new passenger"""
     # Check if phone already exists
-    existing = await db.passengers.find_one({"phone": data.phone})
+    phone_e164 = normalize_phone(data.phone)
+    existing = await db.passengers.find_one({"phone_e164": phone_e164})
     if existing:
         raise HTTPException(status_code=400, detail="Phone number already registered")
     
@@ -67,6 +68,7 @@ async def register_passenger(data: PassengerRegister):
         "id": str(uuid.uuid4()),
         "name": data.name,
         "phone": data.phone,
+        "phone_e164": phone_e164,
         "email": data.email,
         "password_hash": hash_password(data.password),
         "created_at": datetime.now(timezone.utc).isoformat()
@@ -97,13 +99,10 @@ async def login_passenger(data: PassengerLogin):
     if "@" in identifier:
         query_conditions.append({"email": {"$regex": f"^{identifier}$", "$options": "i"}})
     else:
-        # It's a phone number - check various formats
-        phone_variations = [identifier]
-        if identifier.startswith("+44"):
-            phone_variations.append("0" + identifier[3:])
-        elif identifier.startswith("0"):
-            phone_variations.append("+44" + identifier[1:])
-        query_conditions.append({"phone": {"$in": phone_variations}})
+        phone_e164 = normalize_phone(identifier)
+        if not phone_e164:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        query_conditions.append({"phone_e164": phone_e164})
     
     passenger = await db.passengers.find_one({"$or": query_conditions})
     
@@ -138,18 +137,13 @@ async def get_passenger_profile(passenger: dict = Depends(get_current_passenger)
 @router.get("/passenger/bookings")
 async def get_passenger_bookings(passenger: dict = Depends(get_current_passenger)):
     """Get passenger's bookings"""
-    phone = passenger.get("phone", "")
-    phone_variations = [phone]
-    if phone.startswith("+44"):
-        phone_variations.append("0" + phone[3:])
-    elif phone.startswith("0"):
-        phone_variations.append("+44" + phone[1:])
+    conditions = [{"passenger_id": passenger["id"]}]
+    phone_e164 = passenger.get("phone_e164") or normalize_phone(passenger.get("phone"))
+    if phone_e164:
+        conditions.append({"phone_e164": phone_e164})
     
     bookings = await db.bookings.find(
-        {"$or": [
-            {"lead_passenger_phone": {"$in": phone_variations}},
-            {"passenger_id": passenger["id"]}
-        ]},
+        {"$or": conditions},
         {"_id": 0}
     ).sort("booking_datetime", -1).to_list(100)
     
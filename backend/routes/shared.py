@@ -1,17 +1,22 @@
 # Shared dependencies, models, and utilities
 from fastapi import HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import AsyncIterator, List, Optional, Dict, Tuple
 from enum import Enum
 from datetime import datetime, timezone, timedelta
 import os
+import json
 import hashlib
 import jwt
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
 
+from pdf_service import build_invoice_payload, invoice_row
+from principal_cache import principal_cache
+
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -90,7 +95,8 @@ async def get_current_passenger(credentials: HTTPAuthorizationCredentials = Depe
     passenger_id = payload.get("sub")
     if not passenger_id:
         raise HTTPException(status_code=401, detail="Invalid token")
-    passenger = await db.passengers.find_one({"id": passenger_id}, {"_id": 0})
+    passenger = await principal_cache.load(
+        "passenger", passenger_id, lambda: db.passengers.find_one({"id": passenger_id}, {"_id": 0}))
     if not passenger:
         raise HTTPException(status_code=404, detail="Passenger not found")
     return passenger
@@ -102,11 +108,31 @@ async def get_current_driver(credentials: HTTPAuthorizationCredentials = Depends
     driver_id = payload.get("sub")
     if not driver_id:
         raise HTTPException(status_code=401, detail="Invalid token")
-    driver = await db.drivers.find_one({"id": driver_id}, {"_id": 0})
+    driver = await principal_cache.load(
+        "driver", driver_id, lambda: db.drivers.find_one({"id": driver_id}, {"_id": 0}))
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     return driver
 
+async def get_driver_claims(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    id, name and email of the calling driver, for handlers that need nothing
+    else. Served from principal_cache, so a deleted driver is refused by every
+    worker within the cache TTL.
+    """
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    payload = verify_token(credentials.credentials)
+    # Token may use 'sub' or 'driver_id' depending on which login endpoint was used
+    driver_id = payload.get("driver_id") or payload.get("sub")
+    if not driver_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    driver = await principal_cache.load(
+        "driver", driver_id, lambda: db.drivers.find_one({"id": driver_id}, {"_id": 0}))
+    if not driver:
+        raise HTTPException(status_code=401, detail="Driver not found")
+    return {"id": driver["id"], "name": driver.get("name"), "email": driver.get("email")}
+
 async def get_current_client(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -115,7 +141,8 @@ async def get_current_client(credentials: HTTPAuthorizationCredentials = Depends
         client_id = payload.get("client_id")
         if not client_id:
             raise HTTPException(status_code=401, detail="Invalid token")
-        client = await db.clients.find_one({"id": client_id}, {"_id": 0})
+        client = await principal_cache.load(
+            "client", client_id, lambda: db.clients.find_one({"id": client_id}, {"_id": 0}))
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
         return client
@@ -201,6 +228,158 @@ class BookingHistoryEntry(BaseModel):
     details: Optional[str] = None
     changes: Optional[Dict] = None
 
+# ========== PHONE NUMBERS ==========
+# Every stored phone number also gets a `phone_e164` field written through
+# normalize_phone(), so lookups are indexed equality matches instead of
+# $in lists of formatting variants or unanchored regexes.
+DEFAULT_COUNTRY_CODE = "44"
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Normalise a phone number to E.164, assuming UK when there is no country code.
+
+    '07806 794824', '+44 (0)7806 794824', '447806794824' and
+    'whatsapp:+447806794824' all become '+447806794824'.
+    Returns None when the input has no digits.
+    """
+    if not phone:
+        return None
+    raw = str(phone).strip().replace("whatsapp:", "")
+    digits = "".join(ch for ch in raw if ch.isdigit())
+    if not digits:
+        return None
+    if raw.startswith("+"):
+        e164 = "+" + digits
+    elif digits.startswith("00"):
+        e164 = "+" + digits[2:]
+    elif digits.startswith("0"):
+        e164 = "+" + DEFAULT_COUNTRY_CODE + digits[1:]
+    elif digits.startswith(DEFAULT_COUNTRY_CODE) and len(digits) >= 12:
+        e164 = "+" + digits
+    else:
+        e164 = "+" + DEFAULT_COUNTRY_CODE + digits
+    # Drop the UK trunk zero written as "+44 (0)..."
+    if e164.startswith("+" + DEFAULT_COUNTRY_CODE + "0"):
+        e164 = "+" + DEFAULT_COUNTRY_CODE + e164[len(DEFAULT_COUNTRY_CODE) + 2:]
+    return e164
+
+def normalize_phones(*phones: Optional[str]) -> List[str]:
+    """Normalised, de-duplicated list - used for clients, which carry both phone and mobile"""
+    result = []
+    for phone in phones:
+        e164 = normalize_phone(phone)
+        if e164 and e164 not in result:
+            result.append(e164)
+    return result
+
+# ========== INVOICES ==========
+def invoice_vat(vat_setting: Optional[str]) -> Tuple[float, str]:
+    """Map a client/invoice vat_rate setting ("0", "exempt", "20") to (rate, label)"""
+    if vat_setting == '0' or vat_setting == 'exempt':
+        return 0.0, "VAT Exempt" if vat_setting == 'exempt' else "No VAT (0%)"
+    return 0.20, "VAT @ 20%"
+
+def invoice_fare(booking: dict, custom_prices: Optional[dict] = None) -> float:
+    """Booking fare as a float, overridden by any custom price set when invoicing"""
+    fare = booking.get('fare', 0) or 0
+    if custom_prices and custom_prices.get(booking.get('id')) is not None:
+        fare = custom_prices[booking['id']]
+    return float(fare) if fare else 0.0
+
+# Only the fields an invoice prints, so long periods never pull whole booking documents
+INVOICE_BOOKING_PROJECTION = {
+    "_id": 0, "id": 1, "booking_id": 1, "first_name": 1, "last_name": 1,
+    "pickup_location": 1, "dropoff_location": 1, "additional_stops": 1, "fare": 1,
+}
+# What the invoice screens list for each journey
+INVOICE_LIST_PROJECTION = {**INVOICE_BOOKING_PROJECTION, "booking_datetime": 1, "customer_name": 1}
+INVOICE_CURSOR_BATCH = 500
+
+def invoice_bookings_query(client_id: Optional[str], start_date: Optional[str] = None, end_date: Optional[str] = None) -> dict:
+    """Completed bookings for a client, optionally limited to a booking_datetime range"""
+    query = {"client_id": client_id, "status": "completed"}
+    date_query = {}
+    if start_date:
+        date_query["$gte"] = start_date
+    if end_date:
+        date_query["$lte"] = end_date + "T23:59:59"
+    if date_query:
+        query["booking_datetime"] = date_query
+    return query
+
+async def collect_invoice_rows(query: dict, custom_prices: Optional[dict] = None) -> Tuple[List[str], List[dict], float]:
+    """Walk the matching bookings once, in date order, with no cap on how many.
+
+    Returns (booking_ids, rows, subtotal). Rows are the compact invoice_row()
+    dicts, so memory grows with the printed table rather than with the raw
+    booking documents.
+    """
+    booking_ids = []
+    rows = []
+    subtotal = 0.0
+    cursor = db.bookings.find(query, INVOICE_BOOKING_PROJECTION).sort("booking_datetime", 1).batch_size(INVOICE_CURSOR_BATCH)
+    async for b in cursor:
+        fare = invoice_fare(b, custom_prices)
+        subtotal += fare
+        booking_ids.append(b.get('id'))
+        rows.append(invoice_row(b, fare))
+    return booking_ids, rows, subtotal
+
+async def stream_json_array(cursor) -> AsyncIterator[bytes]:
+    """A cursor as one JSON array, encoded a document at a time so the list is never held in memory"""
+    yield b"["
+    separator = b""
+    async for document in cursor:
+        yield separator + json.dumps(jsonable_encoder(document)).encode()
+        separator = b","
+    yield b"]"
+
+async def sum_booking_fares(booking_ids: List[str]) -> float:
+    """Total fare of the given bookings, summed in the database"""
+    result = await db.bookings.aggregate([
+        {"$match": {"id": {"$in": booking_ids}}},
+        {"$group": {"_id": None, "subtotal": {
+            "$sum": {"$convert": {"input": "$fare", "to": "double", "onError": 0, "onNull": 0}}
+        }}},
+    ]).to_list(1)
+    return result[0]["subtotal"] if result else 0.0
+
+async def stored_invoice_payload(invoice: dict, client: Optional[dict]) -> dict:
+    """Render payload for an existing invoice, using its stored totals"""
+    client = client or {}
+    # booking_ids when recorded, else the date range old invoices were built from
+    if invoice.get("booking_ids"):
+        query = {"id": {"$in": invoice["booking_ids"]}}
+    else:
+        query = invoice_bookings_query(invoice.get("client_id"), invoice.get("start_date"), invoice.get("end_date"))
+    _, rows, row_subtotal = await collect_invoice_rows(query, invoice.get('custom_prices'))
+
+    vat_rate, vat_label = invoice_vat(invoice.get('vat_rate', client.get('vat_rate', '20')))
+    subtotal = invoice.get('subtotal') or row_subtotal
+    vat_amount = invoice.get('vat_amount', subtotal * vat_rate) or 0
+    total = invoice.get('total', subtotal + vat_amount) or 0
+
+    payment_terms = client.get('payment_terms', 30)
+    created_at = invoice.get('created_at') or datetime.now(timezone.utc)
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+        except ValueError:
+            created_at = datetime.now(timezone.utc)
+
+    return build_invoice_payload(
+        invoice_ref=invoice.get('invoice_ref', ''),
+        client=client,
+        tax_date=created_at,
+        due_date=created_at + timedelta(days=payment_terms),
+        payment_terms=payment_terms,
+        vat_rate=vat_rate,
+        vat_label=vat_label,
+        subtotal=subtotal,
+        vat_amount=vat_amount,
+        total=total,
+        rows=rows,
+    )
+
 # ========== UTILITY FUNCTIONS ==========
 async def generate_booking_id():
     """Generate a unique booking ID in format CJ-XXX"""
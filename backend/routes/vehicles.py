@@ -6,6 +6,7 @@ from datetime import datetime, timezone
 import uuid
 
 from .shared import db
+from reference_cache import get_reference, invalidate_reference
 
 router = APIRouter(tags=["Vehicles"])
 
@@ -94,6 +95,7 @@ async def create_vehicle_type(vehicle_type: VehicleTypeCreate):
     vt_dict["id"] = str(uuid.uuid4())
     vt_dict["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.vehicle_types.insert_one(vt_dict)
+    await invalidate_reference(db, "vehicle_types")
     vt_dict.pop("_id", None)
     return vt_dict
 
@@ -120,6 +122,7 @@ async def update_vehicle_type(vehicle_type_id: str, vt_update: VehicleTypeUpdate
     update_data = {k: v for k, v in vt_update.model_dump().items() if v is not None}
     if update_data:
         await db.vehicle_types.update_one({"id": vehicle_type_id}, {"$set": update_data})
+        await invalidate_reference(db, "vehicle_types")
     
     vt = await db.vehicle_types.find_one({"id": vehicle_type_id}, {"_id": 0})
     if not vt:
@@ -139,6 +142,7 @@ async def delete_vehicle_type(vehicle_type_id: str):
     result = await db.vehicle_types.delete_one({"id": vehicle_type_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle type not found")
+    await invalidate_reference(db, "vehicle_types")
     return {"message": "Vehicle type deleted"}
 
 
@@ -155,6 +159,7 @@ async def create_vehicle(vehicle: VehicleCreate):
             vehicle_dict["vehicle_type_name"] = vt.get("name")
     
     await db.vehicles.insert_one(vehicle_dict)
+    await invalidate_reference(db, "vehicles")
     vehicle_dict.pop("_id", None)
     return vehicle_dict
 
@@ -162,12 +167,12 @@ async def create_vehicle(vehicle: VehicleCreate):
 @router.get("/vehicles")
 async def get_vehicles():
     vehicles = await db.vehicles.find({}, {"_id": 0}).to_list(1000)
+    vehicle_types = {vt["id"]: vt for vt in await get_reference(db, "vehicle_types")}
     
     for vehicle in vehicles:
-        if vehicle.get("vehicle_type_id"):
-            vt = await db.vehicle_types.find_one({"id": vehicle["vehicle_type_id"]}, {"_id": 0})
-            if vt:
-                vehicle["vehicle_type"] = vt
+        vt = vehicle_types.get(vehicle.get("vehicle_type_id"))
+        if vt:
+            vehicle["vehicle_type"] = vt
     
     return vehicles
 
@@ -197,6 +202,7 @@ async def update_vehicle(vehicle_id: str, vehicle_update: VehicleUpdate):
     
     if update_data:
         await db.vehicles.update_one({"id": vehicle_id}, {"$set": update_data})
+        await invalidate_reference(db, "vehicles")
     
     vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
     if not vehicle:
@@ -209,4 +215,5 @@ async def delete_vehicle(vehicle_id: str):
     result = await db.vehicles.delete_one({"id": vehicle_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    await invalidate_reference(db, "vehicles")
     return {"message": "Vehicle deleted"}
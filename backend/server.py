@@ -1,13 +1,21 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Depends, Request, Header
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Depends, Request, Header, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import UpdateOne
 import os
+import asyncio
 import logging
 import io
+import time
+import math
 import base64
+import binascii
+import re
 import json
 import smtplib
 from email.mime.text import MIMEText
@@ -24,13 +32,15 @@ import jwt
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+# Before the local imports below: several read their settings from the environment at import time
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
 # Email templates
 from email_templates import (
     send_passenger_welcome_email,
@@ -43,12 +53,31 @@ from email_templates import (
     send_corporate_request_rejected_email
 )
 
+# Declared index manifest, drift report and query advisor
+from db_indexes import apply_index_manifest, index_drift, advise_indexes
+
+# PDF rendering (process pool + GridFS cache)
+from pdf_service import pdf_response, ensure_pdf_cached, shutdown_pdf_executor
+from profiler import RequestProfiler
+from reference_cache import reference_cache, get_reference, invalidate_reference
+from fare_zones import matcher_for
+from route_cache import resolve_routes, resolve_route, route_key
+from geocodes import resolve_coordinates, booking_coordinates, remember, address_key, place_key
+from travel_bounds import coords_array, classify_legs, min_drive_minutes, CLEAR, INFEASIBLE
+from travel_model import travel_model
+from request_capture import request_capture, capture_record, caller_identity
+# Registers the Mongo command listener, so must come before the clients are created
+from observability import (
+    RequestStats, current_request_stats, route_label, record_request, render_metrics,
+    instrument_http_clients, start_loop_watchdog, stop_loop_watchdog, SERVER_TIMING_ENABLED, METRICS_TOKEN,
+    QUERY_LOG_HEADERS,
+)
+# Same for the listener that invalidates cached drivers, passengers and clients
+from principal_cache import principal_cache
+
 # Stripe Integration
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
 # Configure structured logging for production
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
 logging.basicConfig(
@@ -69,6 +98,9 @@ if not JWT_SECRET:
     raise ValueError("JWT_SECRET environment variable is required")
 JWT_ALGORITHM = "HS256"
 
+# Time outbound calls to Google, Twilio, Vonage etc.
+instrument_http_clients()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
@@ -191,7 +223,9 @@ async def get_current_passenger(credentials: HTTPAuthorizationCredentials = Depe
     if not credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
     payload = verify_token(credentials.credentials)
-    passenger = await db.passengers.find_one({"id": payload["sub"]}, {"_id": 0})
+    passenger_id = payload["sub"]
+    passenger = await principal_cache.load(
+        "passenger", passenger_id, lambda: db.passengers.find_one({"id": passenger_id}, {"_id": 0}))
     if not passenger:
         raise HTTPException(status_code=401, detail="Passenger not found")
     return passenger
@@ -221,6 +255,11 @@ from routes import (
     auth_router, drivers_router, vehicles_router, passengers_router,
     client_portal_router, external_router, clients_router, chat_router, payments_router
 )
+from routes.chat import (
+    sync_chat_thread_driver, sync_chat_thread_booking, rename_chat_thread_customer, delete_chat_thread, rebuild_chat_threads
+)
+from routes.shared import normalize_phone, normalize_phones, get_driver_claims
+from routes.clients import drain_invoice_emails
 
 # Include modular routers
 api_router.include_router(auth_router)
@@ -838,6 +877,25 @@ async def root():
 # Google Maps API Key (from environment variable)
 GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY')
 
+def journey_addresses(*docs) -> set:
+    return {
+        address for doc in docs
+        for address in [doc.get('pickup_location'), doc.get('dropoff_location'), *(doc.get('additional_stops') or [])]
+        if address
+    }
+
+async def resolve_booking_coordinates(addresses) -> dict:
+    """Coordinates for new bookings from the geocode store; a failure never blocks the booking"""
+    try:
+        return await resolve_coordinates(db, addresses, GOOGLE_MAPS_API_KEY)
+    except Exception as e:
+        logging.warning(f"Could not resolve booking coordinates: {e}")
+        return {}
+
+def add_booking_coordinates(doc: dict, coordinates: dict):
+    doc.update(booking_coordinates(
+        coordinates, doc.get('pickup_location'), doc.get('dropoff_location'), doc.get('additional_stops')))
+
 # ========== DIRECTIONS/DISTANCE ENDPOINT ==========
 @api_router.get("/directions")
 async def get_directions(origin: str, destination: str):
@@ -1056,6 +1114,16 @@ async def places_details(place_id: str):
                 data = response.json()
                 if data.get("status") == "OK":
                     result = data.get("result", {})
+                    location = result.get("geometry", {}).get("location")
+                    address = result.get("formatted_address")
+                    entries = [(place_key(place_id), location, "places", address)]
+                    if address:
+                        entries.append((address_key(address), location, "places", address))
+                        if result.get("name") and not address.startswith(result["name"]):
+                            # Autocomplete descriptions lead with the place name
+                            named = f"{result['name']}, {address}"
+                            entries.append((address_key(named), location, "places", named))
+                    await remember(db, entries)
                     return {
                         "formatted_address": result.get("formatted_address"),
                         "name": result.get("name"),
@@ -1461,228 +1529,108 @@ async def generate_walkaround_number():
     
     return f"WO-{next_num:03d}"
 
-def generate_walkaround_pdf(check_data: dict) -> bytes:
-    """Generate a PDF certificate for the walkaround check"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                           leftMargin=20*mm, rightMargin=20*mm,
-                           topMargin=15*mm, bottomMargin=15*mm)
-    
-    styles = getSampleStyleSheet()
-    elements = []
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1e3a5f'),
-        alignment=TA_CENTER,
-        spaceAfter=10
-    )
-    
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#1e3a5f'),
-        spaceAfter=5
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=3
+# Signatures (and any other check images) live in GridFS; check documents keep only the file id
+WALKAROUND_MEDIA_BUCKET = "walkaround_media"
+WALKAROUND_LIST_PROJECTION = {"_id": 0, "signature": 0, "search_keys": 0}
+WALKAROUND_PAGE_DEFAULT = 100
+WALKAROUND_PAGE_MAX = 500
+# Fields the certificate prints - the PDF cache key is built from these alone
+WALKAROUND_PDF_FIELDS = ("check_number", "submitted_at", "vehicle_reg", "driver_name", "check_type", "checklist", "defects")
+
+def _decode_image_data(data: str) -> tuple:
+    """Split a data URL or bare base64 string into (bytes, content_type)"""
+    content_type = "image/png"
+    if data.startswith("data:") and "," in data:
+        header, data = data.split(",", 1)
+        content_type = header[5:].split(";")[0] or content_type
+    return base64.b64decode(data), content_type
+
+async def store_walkaround_image(check_id: str, field: str, data: Optional[str]) -> Optional[str]:
+    """Upload a base64 image to GridFS and return its file id as a string"""
+    if not data:
+        return None
+    try:
+        raw, content_type = _decode_image_data(data)
+    except (ValueError, binascii.Error) as e:
+        logger.warning(f"Discarding undecodable {field} on walkaround check {check_id}: {e}")
+        return None
+    bucket = AsyncIOMotorGridFSBucket(db, bucket_name=WALKAROUND_MEDIA_BUCKET)
+    file_id = await bucket.upload_from_stream(
+        f"{check_id}-{field}",
+        raw,
+        metadata={"check_id": check_id, "field": field, "content_type": content_type},
     )
-    
-    # Title
-    elements.append(Paragraph("CJ's Executive Travel", title_style))
-    elements.append(Paragraph("Walk Around Check Certificate", header_style))
-    elements.append(Spacer(1, 10))
-    
-    # Info section
-    submitted_at = check_data.get('submitted_at', datetime.now(timezone.utc))
-    if isinstance(submitted_at, str):
-        submitted_at = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
-    
-    info_data = [
-        ['Check Number:', check_data.get('check_number', 'N/A'), 'Date:', submitted_at.strftime('%d/%m/%Y')],
-        ['Vehicle:', check_data.get('vehicle_reg', 'N/A'), 'Time:', submitted_at.strftime('%H:%M')],
-        ['Driver:', check_data.get('driver_name', 'N/A'), 'Type:', check_data.get('check_type', 'Daily').title()],
-    ]
-    
-    info_table = Table(info_data, colWidths=[70, 150, 50, 100])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a5f')),
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#1e3a5f')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 15))
-    
-    # Checklist Section Header
-    elements.append(Paragraph("Checklist Items", header_style))
-    elements.append(Spacer(1, 5))
-    
-    # Build checklist table - 2 columns
-    checklist = check_data.get('checklist', {})
-    items = list(checklist.items())
-    
-    # Split into two columns
-    half = (len(items) + 1) // 2
-    col1_items = items[:half]
-    col2_items = items[half:]
-    
-    checklist_data = []
-    for i in range(max(len(col1_items), len(col2_items))):
-        row = []
-        if i < len(col1_items):
-            item, passed = col1_items[i]
-            status = '✓' if passed else '✗'
-            row.extend([status, item])
-        else:
-            row.extend(['', ''])
-        
-        if i < len(col2_items):
-            item, passed = col2_items[i]
-            status = '✓' if passed else '✗'
-            row.extend([status, item])
-        else:
-            row.extend(['', ''])
-        
-        checklist_data.append(row)
-    
-    checklist_table = Table(checklist_data, colWidths=[20, 160, 20, 160])
-    checklist_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.green),
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.green),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(checklist_table)
-    elements.append(Spacer(1, 15))
-    
-    # Defects Section
-    elements.append(Paragraph("Defects Reported", header_style))
-    defects = check_data.get('defects', '').strip()
-    if defects:
-        elements.append(Paragraph(defects, normal_style))
-    else:
-        elements.append(Paragraph("Nil", ParagraphStyle('Green', parent=normal_style, textColor=colors.green)))
-    elements.append(Spacer(1, 15))
-    
-    # Agreement Section
-    elements.append(Paragraph("Declaration", header_style))
-    elements.append(Paragraph(
-        "I confirm that I have checked these items against company Daily Check policy.",
-        normal_style
-    ))
-    elements.append(Spacer(1, 15))
-    
-    # Signature Section
-    elements.append(Paragraph("Driver Signature", header_style))
-    
-    signature_data = check_data.get('signature')
-    signature_added = False
-    
-    if signature_data:
+    return str(file_id)
+
+async def load_walkaround_signature(check: dict) -> Optional[tuple]:
+    """(bytes, content_type) of a check's signature, from GridFS or a not-yet-migrated inline value"""
+    if check.get("signature_file_id"):
+        bucket = AsyncIOMotorGridFSBucket(db, bucket_name=WALKAROUND_MEDIA_BUCKET)
         try:
-            # Remove data URL prefix if present (e.g., "data:image/png;base64,")
-            if ',' in signature_data:
-                signature_data = signature_data.split(',')[1]
-            
-            # Decode base64 signature to image
-            sig_bytes = base64.b64decode(signature_data)
-            sig_buffer = io.BytesIO(sig_bytes)
-            
-            # Validate the image using PIL
-            from PIL import Image as PILImage
-            pil_img = PILImage.open(sig_buffer)
-            pil_img.verify()  # Verify it's a valid image
-            
-            # Reset buffer and create new one for reportlab
-            sig_buffer.seek(0)
-            
-            # Create signature image for PDF
-            sig_image = Image(sig_buffer, width=150, height=60)
-            
-            # Create table with signature image and date
-            sig_table_data = [
-                [sig_image, '', 'Date:', submitted_at.strftime('%d/%m/%Y')],
-                [check_data.get('driver_name', ''), '', '', ''],
-            ]
-            sig_table = Table(sig_table_data, colWidths=[160, 50, 40, 100])
-            sig_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (2, 0), (2, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 1), (0, 1), 9),
-                ('TEXTCOLOR', (0, 1), (0, 1), colors.gray),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ]))
-            elements.append(sig_table)
-            signature_added = True
-        except Exception as e:
-            logging.error(f"Error adding signature to PDF: {e}")
-    
-    if not signature_added:
-        # No signature or error - show placeholder line
-        sig_data = [
-            ['Driver Signature:', '_' * 30, 'Date:', submitted_at.strftime('%d/%m/%Y')],
-            [check_data.get('driver_name', ''), '', '', ''],
-        ]
-        sig_table = Table(sig_data, colWidths=[100, 150, 40, 80])
-        sig_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('FONTSIZE', (0, 1), (0, 1), 9),
-            ('FONTNAME', (0, 1), (0, 1), 'Helvetica'),
-            ('TEXTCOLOR', (0, 1), (0, 1), colors.gray),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ]))
-        elements.append(sig_table)
-    
-    elements.append(Spacer(1, 20))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.gray,
-        alignment=TA_CENTER
-    )
-    elements.append(Paragraph("CJ's Executive Travel Limited", footer_style))
-    elements.append(Paragraph("Portacabin 5, 3 Cook Way, Peterlee, SR8 2HY", footer_style))
-    elements.append(Paragraph("Tel: 0191 722 1223 | Email: admin@cjsdispatch.co.uk | Web: cjsdispatch.co.uk", footer_style))
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
+            grid_out = await bucket.open_download_stream(ObjectId(check["signature_file_id"]))
+        except NoFile:
+            return None
+        return await grid_out.read(), (grid_out.metadata or {}).get("content_type", "image/png")
+    if check.get("signature"):
+        try:
+            return _decode_image_data(check["signature"])
+        except (ValueError, binascii.Error):
+            return None
+    return None
+
+async def walkaround_pdf_payload(check: dict) -> dict:
+    """Certificate render payload: the printed fields plus the signature as base64"""
+    payload = {field: check[field] for field in WALKAROUND_PDF_FIELDS if check.get(field) is not None}
+    signature = await load_walkaround_signature(check)
+    payload["signature"] = base64.b64encode(signature[0]).decode() if signature else None
+    return payload
+
+async def prerender_walkaround_pdf(check: dict):
+    """Render the certificate into the PDF cache straight after submission"""
+    try:
+        await ensure_pdf_cached(db, "walkaround", await walkaround_pdf_payload(check))
+    except Exception as e:
+        logger.warning(f"Pre-rendering walkaround certificate {check.get('check_number')} failed: {e}")
+
+def walkaround_search_key(value: Optional[str]) -> str:
+    """Uppercase with everything but letters and digits stripped: 'ab12 cde' -> 'AB12CDE'"""
+    return re.sub(r"[^A-Z0-9]", "", (value or "").upper())
+
+def walkaround_search_keys(check: dict) -> List[str]:
+    """Prefix-searchable keys for a check: number, registration, driver name and each name part"""
+    driver_name = check.get("driver_name") or ""
+    keys = [
+        walkaround_search_key(check.get("check_number")),
+        walkaround_search_key(check.get("vehicle_reg")),
+        walkaround_search_key(driver_name),
+        *(walkaround_search_key(part) for part in driver_name.split()),
+    ]
+    return sorted({key for key in keys if key})
+
+def _walkaround_cursor(check: dict) -> str:
+    return f"{check.get('submitted_at', '')}|{check.get('id', '')}"
 
 @api_router.get("/walkaround-checks")
 async def get_walkaround_checks(
+    response: Response,
     vehicle_id: Optional[str] = None, 
     driver_id: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    limit: int = WALKAROUND_PAGE_DEFAULT,
+    before: Optional[str] = None
 ):
-    """Get all walkaround checks, optionally filtered by vehicle, driver, date range, or search term"""
-    query = {}
+    """Get walkaround checks newest first, optionally filtered by vehicle, driver, date range, or search term.
+
+    Keyset paginated: pass the X-Next-Cursor header of one page as `before` to get the next.
+    """
+    limit = max(1, min(limit, WALKAROUND_PAGE_MAX))
+    conditions = []
     if vehicle_id:
-        query["vehicle_id"] = vehicle_id
+        conditions.append({"vehicle_id": vehicle_id})
     if driver_id:
-        query["driver_id"] = driver_id
+        conditions.append({"driver_id": driver_id})
     
     # Date range filter
     if date_from or date_to:
@@ -1692,46 +1640,64 @@ async def get_walkaround_checks(
         if date_to:
             date_query["$lte"] = date_to + "T23:59:59"
         if date_query:
-            query["submitted_at"] = date_query
-    
-    # Search filter (by check number or vehicle registration)
-    if search:
-        query["$or"] = [
-            {"check_number": {"$regex": search, "$options": "i"}},
-            {"vehicle_reg": {"$regex": search, "$options": "i"}},
-            {"driver_name": {"$regex": search, "$options": "i"}}
-        ]
-    
-    checks = await db.walkaround_checks.find(query, {"_id": 0}).sort("submitted_at", -1).to_list(1000)
+            conditions.append({"submitted_at": date_query})
+    
+    # Search by check number, registration or driver name prefix. Keys and term are
+    # normalised the same way, so an anchored case-sensitive regex walks the index range.
+    search_key = walkaround_search_key(search)
+    if search_key:
+        conditions.append({"search_keys": {"$regex": f"^{search_key}"}})
+    
+    # Resume strictly after the last (submitted_at, id) of the previous page
+    if before:
+        cursor_at, _, cursor_id = before.partition("|")
+        conditions.append({"$or": [
+            {"submitted_at": {"$lt": cursor_at}},
+            {"submitted_at": cursor_at, "id": {"$lt": cursor_id}},
+        ]})
+    
+    query = {"$and": conditions} if conditions else {}
+    checks = await db.walkaround_checks.find(query, WALKAROUND_LIST_PROJECTION).sort(
+        [("submitted_at", -1), ("id", -1)]
+    ).limit(limit).to_list(limit)
+    
+    if len(checks) == limit:
+        response.headers["X-Next-Cursor"] = _walkaround_cursor(checks[-1])
     return checks
 
 @api_router.get("/walkaround-checks/{check_id}")
 async def get_walkaround_check(check_id: str):
     """Get a specific walkaround check by ID"""
-    check = await db.walkaround_checks.find_one({"id": check_id}, {"_id": 0})
+    check = await db.walkaround_checks.find_one({"id": check_id}, WALKAROUND_LIST_PROJECTION)
     if not check:
         raise HTTPException(status_code=404, detail="Walkaround check not found")
     return check
 
+@api_router.get("/walkaround-checks/{check_id}/signature")
+async def get_walkaround_signature(check_id: str):
+    """Stream the driver's signature image for a walkaround check"""
+    check = await db.walkaround_checks.find_one({"id": check_id}, {"_id": 0, "signature_file_id": 1, "signature": 1})
+    if not check:
+        raise HTTPException(status_code=404, detail="Walkaround check not found")
+    signature = await load_walkaround_signature(check)
+    if not signature:
+        raise HTTPException(status_code=404, detail="No signature captured")
+    data, content_type = signature
+    return Response(content=data, media_type=content_type, headers={"Cache-Control": "private, max-age=86400"})
+
 @api_router.get("/walkaround-checks/{check_id}/pdf")
 async def get_walkaround_pdf(check_id: str):
-    """Generate and download PDF certificate for a walkaround check"""
+    """Download the PDF certificate for a walkaround check (pre-rendered on submission)"""
     check = await db.walkaround_checks.find_one({"id": check_id}, {"_id": 0})
     if not check:
         raise HTTPException(status_code=404, detail="Walkaround check not found")
     
-    pdf_bytes = generate_walkaround_pdf(check)
-    
     filename = f"{check.get('check_number', 'WO')}-{check.get('vehicle_reg', 'Unknown')}-{check.get('submitted_at', '')[:10]}.pdf"
     
-    return StreamingResponse(
-        io.BytesIO(pdf_bytes),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return await pdf_response(db, "walkaround", await walkaround_pdf_payload(check), filename)
 
 @api_router.post("/walkaround-checks")
-async def create_walkaround_check(check: WalkaroundCheckCreate, authorization: str = Header(None)):
+async def create_walkaround_check(check: WalkaroundCheckCreate, background_tasks: BackgroundTasks, authorization: str = Header(None)):
     """Submit a new walkaround check (from driver app)"""
     # Verify driver token
     if not authorization or not authorization.startswith("Bearer "):
@@ -1767,8 +1733,11 @@ async def create_walkaround_check(check: WalkaroundCheckCreate, authorization: s
     # Generate check number
     check_number = await generate_walkaround_number()
     
+    check_id = str(uuid.uuid4())
+    signature_file_id = await store_walkaround_image(check_id, "signature", check.signature)
+    
     check_doc = {
-        "id": str(uuid.uuid4()),
+        "id": check_id,
         "check_number": check_number,
         "driver_id": driver_id,
         "driver_name": driver.get("name", check.driver_name),
@@ -1780,15 +1749,19 @@ async def create_walkaround_check(check: WalkaroundCheckCreate, authorization: s
         "defects": check.defects,
         "has_defects": has_defects,
         "agreement": check.agreement,
-        "signature": check.signature,
+        "signature_file_id": signature_file_id,
         "submitted_at": datetime.now(timezone.utc).isoformat(),
     }
+    check_doc["search_keys"] = walkaround_search_keys(check_doc)
     
     await db.walkaround_checks.insert_one(check_doc)
     
     # Remove _id before returning
     check_doc.pop("_id", None)
     
+    # Certificate is ready in the PDF cache before anyone asks for it
+    background_tasks.add_task(prerender_walkaround_pdf, dict(check_doc))
+    
     logging.info(f"Walkaround check {check_number} submitted by driver {driver.get('name')} for vehicle {vehicle['registration']}")
     
     return check_doc
@@ -1802,7 +1775,7 @@ async def get_vehicle_walkaround_checks(vehicle_id: str):
     
     checks = await db.walkaround_checks.find(
         {"vehicle_id": vehicle_id}, 
-        {"_id": 0}
+        WALKAROUND_LIST_PROJECTION
     ).sort("submitted_at", -1).to_list(100)
     
     return checks
@@ -1824,7 +1797,7 @@ async def get_driver_walkaround_checks(authorization: str = Header(None)):
     
     checks = await db.walkaround_checks.find(
         {"driver_id": driver_id}, 
-        {"_id": 0}
+        WALKAROUND_LIST_PROJECTION
     ).sort("submitted_at", -1).to_list(100)
     
     return checks
@@ -2898,6 +2871,43 @@ async def check_document_expiry(background_tasks: BackgroundTasks):
     }
 
 
+@api_router.get("/admin/indexes/drift")
+async def get_index_drift(admin: dict = Depends(get_current_admin)):
+    """Compare the declared index manifest with the indexes that exist in the database"""
+    return await index_drift(db)
+
+
+@api_router.post("/admin/indexes/apply")
+async def apply_indexes(admin: dict = Depends(get_current_admin)):
+    """Create any declared indexes that are missing"""
+    return await apply_index_manifest(db)
+
+
+@api_router.get("/admin/indexes/advice")
+async def get_index_advice(admin: dict = Depends(get_current_admin)):
+    """Explain the app's registered query shapes and flag collection scans"""
+    return await advise_indexes(db)
+
+
+@api_router.get("/admin/profiles")
+async def list_request_profiles(admin: dict = Depends(get_current_admin)):
+    """Recent X-Profile captures, newest first"""
+    return await db.request_profiles.find({}, {"_id": 0, "profile": 0}).sort("created_at", -1).to_list(100)
+
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_request_profile(profile_id: str, admin: dict = Depends(get_current_admin)):
+    """Speedscope JSON for one profiled request"""
+    record = await db.request_profiles.find_one({"id": profile_id}, {"_id": 0, "profile": 1})
+    if not record:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=record["profile"],
+        media_type="application/json",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.speedscope.json"}
+    )
+
+
 @api_router.post("/admin/system-maintenance")
 async def run_system_maintenance(background_tasks: BackgroundTasks):
     """Run all system maintenance tasks: document expiry check and cleanup old data"""
@@ -3251,6 +3261,7 @@ async def approve_booking_request(request_id: str):
             "password_hash": request_doc.get('password_hash'),
             "created_at": datetime.now(timezone.utc).isoformat(),
         }
+        client_doc["phone_e164"] = normalize_phones(client_doc["phone"])
         
         await db.clients.insert_one(client_doc)
         
@@ -3304,6 +3315,7 @@ async def approve_booking_request(request_id: str):
     doc['booking_datetime'] = doc['booking_datetime'].isoformat()
     doc['sms_sent'] = False
     doc['customer_name'] = request_doc['passenger_name']
+    add_booking_coordinates(doc, await resolve_booking_coordinates(journey_addresses(doc)))
     
     # Add client_id if this is a client booking
     # Check both 'type' and 'account_type' fields for backwards compatibility
@@ -3311,6 +3323,7 @@ async def approve_booking_request(request_id: str):
     if is_client_booking and request_doc.get('client_id'):
         doc['client_id'] = request_doc['client_id']
     
+    doc['phone_e164'] = normalize_phone(doc.get('customer_phone'))
     await db.bookings.insert_one(doc)
     
     # Update request status
@@ -3441,7 +3454,8 @@ async def get_current_client(authorization: str = Header(None)):
         if not client_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        client = await db.clients.find_one({"id": client_id}, {"_id": 0})
+        client = await principal_cache.load(
+            "client", client_id, lambda: db.clients.find_one({"id": client_id}, {"_id": 0}))
         if not client:
             raise HTTPException(status_code=401, detail="Client not found")
         
@@ -4265,16 +4279,16 @@ async def get_all_passengers():
     """Get all registered passenger accounts (admin only)"""
     passengers = await db.passengers.find({}, {"_id": 0, "password_hash": 0}).to_list(1000)
     
-    # Add booking count for each passenger
-    for passenger in passengers:
-        phone = passenger['phone']
-        phone_variations = [phone]
-        if phone.startswith("+44"):
-            phone_variations.append("0" + phone[3:])
-            phone_variations.append(phone[3:])
-        
-        count = await db.bookings.count_documents({"customer_phone": {"$in": phone_variations}})
-        passenger['booking_count'] = count
+    # Booking counts for every passenger from one grouped query on phone_e164
+    phones = [p.get('phone_e164') or normalize_phone(p.get('phone')) for p in passengers]
+    counts = await db.bookings.aggregate([
+        {"$match": {"phone_e164": {"$in": [p for p in phones if p]}}},
+        {"$group": {"_id": "$phone_e164", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    count_map = {row["_id"]: row["count"] for row in counts}
+    
+    for passenger, phone_e164 in zip(passengers, phones):
+        passenger['booking_count'] = count_map.get(phone_e164, 0)
     
     return passengers
 
@@ -4359,21 +4373,18 @@ async def update_passenger_phone(passenger_id: str, data: dict):
     if not new_phone or len(new_phone.strip()) < 5:
         raise HTTPException(status_code=400, detail="Please enter a valid phone number")
     
-    # Normalize phone number
-    phone = new_phone.strip().replace(" ", "")
-    if phone.startswith("0"):
-        phone = "+44" + phone[1:]
-    elif not phone.startswith("+"):
-        phone = "+44" + phone
+    phone = normalize_phone(new_phone)
+    if not phone:
+        raise HTTPException(status_code=400, detail="Please enter a valid phone number")
     
     # Check if phone is already used by another passenger
-    existing = await db.passengers.find_one({"phone": phone, "id": {"$ne": passenger_id}})
+    existing = await db.passengers.find_one({"phone_e164": phone, "id": {"$ne": passenger_id}})
     if existing:
         raise HTTPException(status_code=400, detail="Phone number already in use by another passenger")
     
     await db.passengers.update_one(
         {"id": passenger_id},
-        {"$set": {"phone": phone}}
+        {"$set": {"phone": phone, "phone_e164": phone}}
     )
     
     return {"message": "Phone number updated successfully"}
@@ -4387,10 +4398,10 @@ class PassengerUpdate(BaseModel):
 @api_router.put("/passengers/update")
 async def update_passenger_by_phone(update: PassengerUpdate):
     """Update passenger info across all their bookings (by phone number)"""
-    original_phone = update.original_phone.strip()
+    original_phone = normalize_phone(update.original_phone)
     
     # Find bookings with this phone number
-    bookings_count = await db.bookings.count_documents({"customer_phone": original_phone})
+    bookings_count = await db.bookings.count_documents({"phone_e164": original_phone}) if original_phone else 0
     if bookings_count == 0:
         raise HTTPException(status_code=404, detail="No bookings found for this phone number")
     
@@ -4404,13 +4415,9 @@ async def update_passenger_by_phone(update: PassengerUpdate):
         booking_update["last_name"] = name_parts[1] if len(name_parts) > 1 else ""
     
     if update.phone:
-        # Normalize phone number
-        new_phone = update.phone.strip().replace(" ", "")
-        if new_phone.startswith("0"):
-            new_phone = "+44" + new_phone[1:]
-        elif not new_phone.startswith("+"):
-            new_phone = "+44" + new_phone
+        new_phone = normalize_phone(update.phone)
         booking_update["customer_phone"] = new_phone
+        booking_update["phone_e164"] = new_phone
     
     if update.email:
         booking_update["customer_email"] = update.email.strip()
@@ -4419,26 +4426,29 @@ async def update_passenger_by_phone(update: PassengerUpdate):
         booking_update["updated_at"] = datetime.now(timezone.utc).isoformat()
         
         # Update all bookings with original phone
+        renamed_ids = await db.bookings.distinct("id", {"phone_e164": original_phone}) if update.name else []
         result = await db.bookings.update_many(
-            {"customer_phone": original_phone},
+            {"phone_e164": original_phone},
             {"$set": booking_update}
         )
+        await rename_chat_thread_customer(renamed_ids, booking_update.get("customer_name"))
         
         # Also update passenger account if exists
-        passenger = await db.passengers.find_one({"phone": original_phone})
+        passenger = await db.passengers.find_one({"phone_e164": original_phone})
         if passenger:
             passenger_update = {}
             if update.name:
                 passenger_update["name"] = update.name.strip()
             if update.phone:
-                passenger_update["phone"] = booking_update.get("customer_phone", original_phone)
+                passenger_update["phone"] = booking_update["customer_phone"]
+                passenger_update["phone_e164"] = booking_update["phone_e164"]
             if update.email:
                 passenger_update["email"] = update.email.strip()
             
             if passenger_update:
                 passenger_update["updated_at"] = datetime.now(timezone.utc).isoformat()
                 await db.passengers.update_one(
-                    {"phone": original_phone},
+                    {"id": passenger["id"]},
                     {"$set": passenger_update}
                 )
         
@@ -4489,15 +4499,12 @@ async def unblock_passenger(passenger_id: str):
 @api_router.post("/admin/passengers")
 async def create_passenger_admin(data: PassengerRegister):
     """Create a new passenger account (admin only)"""
-    # Normalize phone number
-    phone = data.phone.strip().replace(" ", "")
-    if phone.startswith("0"):
-        phone = "+44" + phone[1:]
-    elif not phone.startswith("+"):
-        phone = "+44" + phone
+    phone = normalize_phone(data.phone)
+    if not phone:
+        raise HTTPException(status_code=400, detail="Please enter a valid phone number")
     
     # Check if phone already registered
-    existing = await db.passengers.find_one({"phone": phone})
+    existing = await db.passengers.find_one({"phone_e164": phone})
     if existing:
         raise HTTPException(status_code=400, detail="Phone number already registered")
     
@@ -4517,6 +4524,7 @@ async def create_passenger_admin(data: PassengerRegister):
     
     doc = passenger.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['phone_e164'] = phone
     await db.passengers.insert_one(doc)
     
     return {"message": "Passenger account created successfully", "id": passenger.id}
@@ -4534,6 +4542,12 @@ async def create_booking(booking: BookingCreate, background_tasks: BackgroundTas
     # Create the booking object (exclude return-specific fields)
     booking_data = booking.model_dump(exclude={'create_return', 'return_datetime'})
     
+    # One store lookup for both legs of the journey
+    coordinates = await resolve_booking_coordinates(journey_addresses(booking_data, {
+        'pickup_location': booking.return_pickup_location,
+        'dropoff_location': booking.return_dropoff_location,
+    }))
+    
     # If driver_id is provided, set status to assigned, otherwise use pending
     if booking_data.get('driver_id'):
         booking_data['status'] = 'assigned'
@@ -4580,6 +4594,8 @@ async def create_booking(booking: BookingCreate, background_tasks: BackgroundTas
         "details": history_details
     }]
     
+    doc['phone_e164'] = normalize_phone(doc.get('customer_phone'))
+    add_booking_coordinates(doc, coordinates)
     await db.bookings.insert_one(doc)
     
     # If return booking requested, create it
@@ -4618,6 +4634,8 @@ async def create_booking(booking: BookingCreate, background_tasks: BackgroundTas
         if return_doc.get('flight_info'):
             return_doc['flight_info'] = return_doc['flight_info'] if isinstance(return_doc['flight_info'], dict) else return_doc['flight_info'].model_dump() if hasattr(return_doc['flight_info'], 'model_dump') else return_doc['flight_info']
         
+        return_doc['phone_e164'] = normalize_phone(return_doc.get('customer_phone'))
+        add_booking_coordinates(return_doc, coordinates)
         await db.bookings.insert_one(return_doc)
         return_booking_id = return_booking.id
         
@@ -4772,6 +4790,12 @@ async def create_repeat_bookings(repeat_data: RepeatBookingCreate, background_ta
     # Create bookings for each date
     created_bookings = []
     repeat_group_id = str(uuid.uuid4())  # Link all repeat bookings together
+    # Every occurrence shares the same addresses - resolve them once
+    coordinates = await resolve_booking_coordinates(journey_addresses(repeat_data.model_dump(), {
+        'pickup_location': repeat_data.return_pickup_location,
+        'dropoff_location': repeat_data.return_dropoff_location,
+        'additional_stops': repeat_data.return_additional_stops,
+    }))
     
     for idx, booking_date in enumerate(booking_dates):
         readable_booking_id = await generate_booking_id()
@@ -4840,6 +4864,8 @@ async def create_repeat_bookings(repeat_data: RepeatBookingCreate, background_ta
             "details": history_details
         }]
         
+        doc['phone_e164'] = normalize_phone(doc.get('customer_phone'))
+        add_booking_coordinates(doc, coordinates)
         await db.bookings.insert_one(doc)
         
         # Create return booking if requested
@@ -4874,6 +4900,8 @@ async def create_repeat_bookings(repeat_data: RepeatBookingCreate, background_ta
             return_doc['repeat_index'] = idx + 1
             return_doc['repeat_total'] = len(booking_dates)
             
+            return_doc['phone_e164'] = normalize_phone(return_doc.get('customer_phone'))
+            add_booking_coordinates(return_doc, coordinates)
             await db.bookings.insert_one(return_doc)
             
             # Update original booking with link to return
@@ -5465,6 +5493,13 @@ async def update_booking(booking_id: str, booking_update: BookingUpdate):
     if 'booking_datetime' in update_data and isinstance(update_data['booking_datetime'], datetime):
         update_data['booking_datetime'] = update_data['booking_datetime'].isoformat()
     
+    # Keep stored coordinates in step with edited addresses
+    if {'pickup_location', 'dropoff_location', 'additional_stops'} & set(update_data):
+        journey = {**existing, **update_data}
+        coordinates = await resolve_booking_coordinates(journey_addresses(journey))
+        update_data.update(booking_coordinates(
+            coordinates, journey.get('pickup_location'), journey.get('dropoff_location'), journey.get('additional_stops')))
+    
     # TIME CONFLICT CHECK with AUTO-ALLOCATION to next available vehicle
     BUFFER_MINUTES = 15
     new_vehicle_id = update_data.get('vehicle_id') or existing.get('vehicle_id')
@@ -5481,7 +5516,8 @@ async def update_booking(booking_id: str, booking_update: BookingUpdate):
             booking_date = booking_time.date()
             
             # Get the target vehicle to determine its type
-            target_vehicle = await db.vehicles.find_one({"id": new_vehicle_id}, {"_id": 0})
+            fleet = await get_reference(db, "vehicles")
+            target_vehicle = next((v for v in fleet if v.get('id') == new_vehicle_id), None)
             target_vehicle_type_id = target_vehicle.get('vehicle_type_id') if target_vehicle else None
             
             # Get all bookings on same vehicle, same day (excluding this one)
@@ -5518,11 +5554,12 @@ async def update_booking(booking_id: str, booking_update: BookingUpdate):
             # If there's a conflict, try to find next available vehicle of the same type
             if has_conflict and target_vehicle_type_id:
                 # Get all vehicles of the same type
-                same_type_vehicles = await db.vehicles.find({
-                    "vehicle_type_id": target_vehicle_type_id,
-                    "id": {"$ne": new_vehicle_id},
-                    "is_active": {"$ne": False}
-                }, {"_id": 0}).to_list(100)
+                same_type_vehicles = [
+                    v for v in fleet
+                    if v.get('vehicle_type_id') == target_vehicle_type_id
+                    and v.get('id') != new_vehicle_id
+                    and v.get('is_active') is not False
+                ]
                 
                 next_available_vehicle = None
                 for alt_vehicle in same_type_vehicles:
@@ -5574,6 +5611,9 @@ async def update_booking(booking_id: str, booking_update: BookingUpdate):
             # Log but don't block if date parsing fails
             print(f"Warning: Could not check time conflicts: {e}")
     
+    if 'customer_phone' in update_data:
+        update_data['phone_e164'] = normalize_phone(update_data['customer_phone'])
+    
     # Update customer_name if first_name or last_name changed
     if 'first_name' in update_data or 'last_name' in update_data:
         first = update_data.get('first_name') or existing.get('first_name') or ''
@@ -5605,8 +5645,14 @@ async def update_booking(booking_id: str, booking_update: BookingUpdate):
                 "$push": {"history": history_entry}
             }
         )
+        
+        if "driver_id" in changes:
+            new_driver = await db.drivers.find_one({"id": update_data["driver_id"]}, {"_id": 0, "name": 1})
+            await sync_chat_thread_driver([booking_id], update_data["driver_id"], (new_driver or {}).get("name"))
     
     updated = await db.bookings.find_one({"id": booking_id}, {"_id": 0})
+    if {"first_name", "last_name", "customer_name", "pickup_location", "booking_id"} & set(changes):
+        await sync_chat_thread_booking(updated)
     if isinstance(updated.get('created_at'), str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     if isinstance(updated.get('booking_datetime'), str):
@@ -5618,6 +5664,7 @@ async def delete_booking(booking_id: str):
     result = await db.bookings.delete_one({"id": booking_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Booking not found")
+    await delete_chat_thread(booking_id)
     return {"message": "Booking deleted successfully"}
 
 
@@ -5655,10 +5702,10 @@ async def check_schedule_availability(request: AvailabilityCheckRequest):
     duration = request.duration_minutes or DEFAULT_DURATION
     
     # Get all vehicles
-    all_vehicles = await db.vehicles.find({}, {"_id": 0}).to_list(100)
+    all_vehicles = await get_reference(db, "vehicles")
     
     # Get all vehicle types
-    vehicle_types = await db.vehicle_types.find({}, {"_id": 0}).to_list(50)
+    vehicle_types = await get_reference(db, "vehicle_types")
     vehicle_type_map = {vt['id']: vt for vt in vehicle_types}
     
     # Filter vehicles by type if specified
@@ -5787,36 +5834,33 @@ class TravelTimeCheckRequest(BaseModel):
     duration_minutes: Optional[int] = 60
 
 
-async def get_travel_time_minutes(origin: str, destination: str) -> Optional[int]:
-    """Get travel time between two locations using Google Maps API"""
+async def travel_time_estimate(origin: str, destination: str, origin_coords: Optional[dict] = None,
+                               destination_coords: Optional[dict] = None):
+    """
+    (minutes, estimated) between two locations - route cache first, then Google Maps API,
+    then the travel model fitted from cached routes when neither has an answer
+    """
     if not origin or not destination:
-        return None
+        return None, False
     
     try:
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(
-                "https://maps.googleapis.com/maps/api/directions/json",
-                params={
-                    "origin": origin,
-                    "destination": destination,
-                    "key": GOOGLE_MAPS_API_KEY,
-                    "units": "imperial",
-                    "region": "uk"
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "OK":
-                    route = data.get("routes", [{}])[0]
-                    leg = route.get("legs", [{}])[0]
-                    duration_seconds = leg.get("duration", {}).get("value", 0)
-                    return round(duration_seconds / 60)
+        route = await resolve_route(db, origin, destination, GOOGLE_MAPS_API_KEY)
+        if route:
+            return round(route["duration_seconds"] / 60), False
     except Exception as e:
         logger.warning(f"Travel time API error: {e}")
     
-    return None
+    try:
+        if origin_coords is None or destination_coords is None:
+            # Store lookup only - Google has just failed to answer
+            known = await resolve_coordinates(db, [origin, destination], None)
+            origin_coords = origin_coords or known.get(origin)
+            destination_coords = destination_coords or known.get(destination)
+        minutes = travel_model.estimate_minutes(origin_coords, destination_coords)
+    except Exception as e:
+        logger.warning(f"Travel time estimate failed: {e}")
+        return None, False
+    return minutes, minutes is not None
 
 
 @api_router.post("/scheduling/check-travel-time")
@@ -5856,7 +5900,7 @@ async def check_travel_time_feasibility(request: TravelTimeCheckRequest):
             "$lt": day_end.isoformat()
         }
     }, {"_id": 0, "booking_id": 1, "booking_datetime": 1, "duration_minutes": 1, 
-        "pickup_location": 1, "dropoff_location": 1}).to_list(100)
+        "pickup_location": 1, "dropoff_location": 1, "pickup_coords": 1, "dropoff_coords": 1}).to_list(100)
     
     if not vehicle_bookings:
         return {
@@ -5888,84 +5932,109 @@ async def check_travel_time_feasibility(request: TravelTimeCheckRequest):
     
     parsed_bookings.sort(key=lambda x: x['parsed_start'])
     
+    # The new booking's dropoff, and coordinates for both its ends
+    new_booking_record = await db.bookings.find_one({"id": request.booking_id}, {
+        "_id": 0, "pickup_location": 1, "dropoff_location": 1, "pickup_coords": 1, "dropoff_coords": 1}) or {}
+    new_dropoff = new_booking_record.get('dropoff_location', '')
+    new_pickup_coords = new_booking_record.get('pickup_coords')
+    if new_booking_record.get('pickup_location') != request.pickup_location:
+        # Store lookup only - never geocode just to decide whether to route
+        new_pickup_coords = (await resolve_coordinates(db, [request.pickup_location], None)).get(request.pickup_location)
+    
+    # Straight-line bounds decide most legs; only the ambiguous ones are routed
+    earlier = [b for b in parsed_bookings if b['parsed_end'] <= new_booking_time]
+    later = [b for b in parsed_bookings if new_booking_end <= b['parsed_start']] if new_dropoff else []
+    leg_origin_coords = [b.get('dropoff_coords') for b in earlier] + [new_booking_record.get('dropoff_coords')] * len(later)
+    leg_destination_coords = [new_pickup_coords] * len(earlier) + [b.get('pickup_coords') for b in later]
+    leg_origins, leg_destinations = coords_array(leg_origin_coords), coords_array(leg_destination_coords)
+    leg_slack = (
+        [(new_booking_time - b['parsed_end']).total_seconds() / 60 - GRACE_MINUTES for b in earlier]
+        + [(b['parsed_start'] - new_booking_end).total_seconds() / 60 - GRACE_MINUTES for b in later]
+    )
+    # A clear leg must also miss the 10-minute "tight schedule" window
+    leg_verdicts = classify_legs(leg_origins, leg_destinations, leg_slack, clear_margin=10)
+    leg_lower_bounds = min_drive_minutes(leg_origins, leg_destinations)
+    
+    async def leg_travel_time(leg: int, origin: str, destination: str):
+        """(minutes, estimated) - the straight-line lower bound when that already rules the leg out"""
+        if leg_verdicts[leg] == CLEAR:
+            return None, False
+        if leg_verdicts[leg] == INFEASIBLE:
+            return math.ceil(leg_lower_bounds[leg]), True
+        return await travel_time_estimate(
+            origin, destination, leg_origin_coords[leg], leg_destination_coords[leg])
+    
     # Check travel time FROM previous job's dropoff TO this new booking's pickup
-    for existing in parsed_bookings:
+    for leg, existing in enumerate(earlier):
         existing_end = existing['parsed_end']
         existing_dropoff = existing.get('dropoff_location', '')
+        travel_time, estimated = await leg_travel_time(leg, existing_dropoff, request.pickup_location)
         
-        # If existing job ends before new booking starts, check travel time
-        if existing_end <= new_booking_time:
-            # Calculate travel time from existing dropoff to new pickup
-            travel_time = await get_travel_time_minutes(existing_dropoff, request.pickup_location)
+        if travel_time is not None:
+            # Time available = new booking start - existing end
+            available_time = (new_booking_time - existing_end).total_seconds() / 60
+            required_time = travel_time + GRACE_MINUTES
             
-            if travel_time is not None:
-                # Time available = new booking start - existing end
-                available_time = (new_booking_time - existing_end).total_seconds() / 60
-                required_time = travel_time + GRACE_MINUTES
-                
-                if available_time < required_time:
-                    shortfall = required_time - available_time
-                    conflicts.append({
-                        "type": "insufficient_travel_time",
-                        "previous_booking": existing.get('booking_id'),
-                        "previous_ends": existing_end.strftime('%H:%M'),
-                        "previous_dropoff": existing_dropoff,
-                        "new_pickup": request.pickup_location,
-                        "new_starts": new_booking_time.strftime('%H:%M'),
-                        "travel_time_minutes": travel_time,
-                        "grace_minutes": GRACE_MINUTES,
-                        "required_minutes": required_time,
-                        "available_minutes": round(available_time),
-                        "shortfall_minutes": round(shortfall),
-                        "message": f"Driver needs {travel_time}min travel + {GRACE_MINUTES}min grace = {required_time}min, but only {round(available_time)}min available after {existing.get('booking_id')}"
-                    })
-                elif available_time < required_time + 10:
-                    # Tight but possible - add warning
-                    warnings.append({
-                        "type": "tight_schedule",
-                        "previous_booking": existing.get('booking_id'),
-                        "message": f"Tight schedule: {round(available_time)}min gap for {required_time}min needed"
-                    })
+            if available_time < required_time:
+                shortfall = required_time - available_time
+                conflicts.append({
+                    "type": "insufficient_travel_time",
+                    "previous_booking": existing.get('booking_id'),
+                    "previous_ends": existing_end.strftime('%H:%M'),
+                    "previous_dropoff": existing_dropoff,
+                    "new_pickup": request.pickup_location,
+                    "new_starts": new_booking_time.strftime('%H:%M'),
+                    "travel_time_minutes": travel_time,
+                    "travel_time_estimated": estimated,
+                    "grace_minutes": GRACE_MINUTES,
+                    "required_minutes": required_time,
+                    "available_minutes": round(available_time),
+                    "shortfall_minutes": round(shortfall),
+                    "message": f"Driver needs {travel_time}min travel + {GRACE_MINUTES}min grace = {required_time}min, but only {round(available_time)}min available after {existing.get('booking_id')}"
+                })
+            elif available_time < required_time + 10:
+                # Tight but possible - add warning
+                warnings.append({
+                    "type": "tight_schedule",
+                    "previous_booking": existing.get('booking_id'),
+                    "message": f"Tight schedule: {round(available_time)}min gap for {required_time}min needed"
+                })
     
     # Check travel time FROM this new booking's dropoff TO next job's pickup
-    # First, we need the dropoff location for the new booking
-    new_booking_record = await db.bookings.find_one({"id": request.booking_id}, {"_id": 0, "dropoff_location": 1})
-    new_dropoff = new_booking_record.get('dropoff_location', '') if new_booking_record else ''
-    
-    for existing in parsed_bookings:
+    for leg, existing in enumerate(later, len(earlier)):
         existing_start = existing['parsed_start']
         existing_pickup = existing.get('pickup_location', '')
+        if not existing_pickup:
+            continue
+        travel_time, estimated = await leg_travel_time(leg, new_dropoff, existing_pickup)
         
-        # If new booking ends before existing starts, check travel time
-        if new_booking_end <= existing_start and new_dropoff and existing_pickup:
-            travel_time = await get_travel_time_minutes(new_dropoff, existing_pickup)
+        if travel_time is not None:
+            available_time = (existing_start - new_booking_end).total_seconds() / 60
+            required_time = travel_time + GRACE_MINUTES
             
-            if travel_time is not None:
-                available_time = (existing_start - new_booking_end).total_seconds() / 60
-                required_time = travel_time + GRACE_MINUTES
-                
-                if available_time < required_time:
-                    shortfall = required_time - available_time
-                    conflicts.append({
-                        "type": "insufficient_travel_time",
-                        "next_booking": existing.get('booking_id'),
-                        "new_ends": new_booking_end.strftime('%H:%M'),
-                        "new_dropoff": new_dropoff,
-                        "next_pickup": existing_pickup,
-                        "next_starts": existing_start.strftime('%H:%M'),
-                        "travel_time_minutes": travel_time,
-                        "grace_minutes": GRACE_MINUTES,
-                        "required_minutes": required_time,
-                        "available_minutes": round(available_time),
-                        "shortfall_minutes": round(shortfall),
-                        "message": f"Driver needs {travel_time}min travel + {GRACE_MINUTES}min grace = {required_time}min to reach {existing.get('booking_id')}, but only {round(available_time)}min available"
-                    })
-                elif available_time < required_time + 10:
-                    warnings.append({
-                        "type": "tight_schedule",
-                        "next_booking": existing.get('booking_id'),
-                        "message": f"Tight schedule: {round(available_time)}min gap for {required_time}min needed"
-                    })
+            if available_time < required_time:
+                shortfall = required_time - available_time
+                conflicts.append({
+                    "type": "insufficient_travel_time",
+                    "next_booking": existing.get('booking_id'),
+                    "new_ends": new_booking_end.strftime('%H:%M'),
+                    "new_dropoff": new_dropoff,
+                    "next_pickup": existing_pickup,
+                    "next_starts": existing_start.strftime('%H:%M'),
+                    "travel_time_minutes": travel_time,
+                    "travel_time_estimated": estimated,
+                    "grace_minutes": GRACE_MINUTES,
+                    "required_minutes": required_time,
+                    "available_minutes": round(available_time),
+                    "shortfall_minutes": round(shortfall),
+                    "message": f"Driver needs {travel_time}min travel + {GRACE_MINUTES}min grace = {required_time}min to reach {existing.get('booking_id')}, but only {round(available_time)}min available"
+                })
+            elif available_time < required_time + 10:
+                warnings.append({
+                    "type": "tight_schedule",
+                    "next_booking": existing.get('booking_id'),
+                    "message": f"Tight schedule: {round(available_time)}min gap for {required_time}min needed"
+                })
     
     feasible = len(conflicts) == 0
     
@@ -5978,7 +6047,7 @@ async def check_travel_time_feasibility(request: TravelTimeCheckRequest):
 
 
 @api_router.post("/scheduling/auto-assign")
-async def auto_assign_vehicles(date: str = None):
+async def auto_assign_vehicles(date: str = None, dry_run: bool = False):
     """
     Auto-assign vehicles to bookings for a given date.
     
@@ -5988,6 +6057,10 @@ async def auto_assign_vehicles(date: str = None):
     3. Taxi jobs with more than 6 passengers can be done in PSV vehicles
     4. No overlapping times - always allow 15 minutes buffer between jobs
     5. Use the least amount of vehicles possible (bin packing optimization)
+    6. A vehicle must be able to drive from one job to the next (estimated by the travel model)
+    
+    dry_run=true returns the plan without assigning anything - no writes and no routing calls,
+    so a week can be planned by calling it once per day.
     """
     from datetime import timedelta
     
@@ -6001,7 +6074,7 @@ async def auto_assign_vehicles(date: str = None):
         target_date = datetime.now(timezone.utc).date()
     
     # Get all vehicle types
-    vehicle_types = await db.vehicle_types.find({}, {"_id": 0}).to_list(100)
+    vehicle_types = await get_reference(db, "vehicle_types")
     vehicle_type_map = {vt['id']: vt for vt in vehicle_types}
     
     # Identify PSV vehicle type IDs
@@ -6009,7 +6082,7 @@ async def auto_assign_vehicles(date: str = None):
     taxi_type_ids = {vt['id'] for vt in vehicle_types if vt.get('category') == 'taxi'}
     
     # Get all active vehicles
-    all_vehicles = await db.vehicles.find({"is_active": True}, {"_id": 0}).to_list(100)
+    all_vehicles = [v for v in await get_reference(db, "vehicles") if v.get('is_active') is True]
     vehicle_map = {v['id']: v for v in all_vehicles}
     
     # Separate vehicles by type
@@ -6062,6 +6135,17 @@ async def auto_assign_vehicles(date: str = None):
     BUFFER_MINUTES = 15
     DEFAULT_DURATION = 60  # Default job duration if not specified
     
+    # Estimated drive from every job's dropoff to every job's pickup (travel model, never below
+    # the straight-line bound), so a vehicle that can't get from one job to the next is skipped.
+    # No routing calls; legs with an end lacking coordinates are unconstrained.
+    day_jobs = {b['id']: b for b in assigned_bookings + unassigned_bookings}
+    job_index = {job_id: i for i, job_id in enumerate(day_jobs)}
+    job_dropoffs = coords_array([b.get('dropoff_coords') for b in day_jobs.values()])
+    job_pickups = coords_array([b.get('pickup_coords') for b in day_jobs.values()])
+    drive_minutes = travel_model.leg_matrix(job_dropoffs, job_pickups)
+    # {vehicle_id: [(start_time, end_time_without_buffer, job_id), ...]}
+    vehicle_jobs = {}
+    
     for booking in assigned_bookings:
         vid = booking.get('vehicle_id')
         if not vid:
@@ -6073,8 +6157,27 @@ async def auto_assign_vehicles(date: str = None):
         if vid not in vehicle_schedules:
             vehicle_schedules[vid] = []
         vehicle_schedules[vid].append((booking_time, end_time))
+        vehicle_jobs.setdefault(vid, []).append((booking_time, end_time - timedelta(minutes=BUFFER_MINUTES), booking['id']))
+    
+    def can_reach(vehicle_id, booking_start, booking_duration, job_id):
+        """False when a leg to or from another job on the vehicle can't be driven in the gap"""
+        job = job_index[job_id]
+        booking_end = booking_start + timedelta(minutes=booking_duration)
+        for (other_start, other_end, other_id) in vehicle_jobs.get(vehicle_id, ()):
+            other = job_index[other_id]
+            if other_end <= booking_start:
+                gap, drive = (booking_start - other_end).total_seconds() / 60, drive_minutes[other, job]
+            else:
+                gap, drive = (other_start - booking_end).total_seconds() / 60, drive_minutes[job, other]
+            if drive + BUFFER_MINUTES > gap:
+                return False
+        return True
+    
+    async def assign_vehicle(booking, vehicle_id):
+        if not dry_run:
+            await db.bookings.update_one({"id": booking['id']}, {"$set": {"vehicle_id": vehicle_id}})
     
-    def can_fit_booking(vehicle_id, booking_start, booking_duration):
+    def can_fit_booking(vehicle_id, booking_start, booking_duration, job_id):
         """Check if a booking can fit in a vehicle's schedule without overlap"""
         booking_end = booking_start + timedelta(minutes=booking_duration + BUFFER_MINUTES)
         
@@ -6085,14 +6188,16 @@ async def auto_assign_vehicles(date: str = None):
             # Check for overlap
             if not (booking_end <= existing_start or booking_start >= existing_end):
                 return False
-        return True
+        return can_reach(vehicle_id, booking_start, booking_duration, job_id)
     
-    def add_to_schedule(vehicle_id, booking_start, booking_duration):
+    def add_to_schedule(vehicle_id, booking_start, booking_duration, job_id):
         """Add a booking to a vehicle's schedule"""
         booking_end = booking_start + timedelta(minutes=booking_duration + BUFFER_MINUTES)
         if vehicle_id not in vehicle_schedules:
             vehicle_schedules[vehicle_id] = []
         vehicle_schedules[vehicle_id].append((booking_start, booking_end))
+        vehicle_jobs.setdefault(vehicle_id, []).append(
+            (booking_start, booking_start + timedelta(minutes=booking_duration), job_id))
     
     def get_vehicle_utilization(vehicle_id):
         """Get total minutes scheduled for a vehicle"""
@@ -6110,7 +6215,7 @@ async def auto_assign_vehicles(date: str = None):
         
         alternatives = []
         for vehicle in eligible_vehicles:
-            if vehicle['id'] != preferred_vehicle_id and can_fit_booking(vehicle['id'], booking_time, duration):
+            if vehicle['id'] != preferred_vehicle_id and can_fit_booking(vehicle['id'], booking_time, duration, booking['id']):
                 alternatives.append({
                     "vehicle_id": vehicle['id'],
                     "registration": vehicle.get('registration'),
@@ -6164,12 +6269,9 @@ async def auto_assign_vehicles(date: str = None):
         # Try preferred vehicle first for contract work
         if preferred_vehicle_id and preferred_vehicle_id in vehicle_map:
             preferred_vehicle = vehicle_map[preferred_vehicle_id]
-            if can_fit_booking(preferred_vehicle_id, booking_time, duration):
-                add_to_schedule(preferred_vehicle_id, booking_time, duration)
-                await db.bookings.update_one(
-                    {"id": booking['id']},
-                    {"$set": {"vehicle_id": preferred_vehicle_id}}
-                )
+            if can_fit_booking(preferred_vehicle_id, booking_time, duration, booking['id']):
+                add_to_schedule(preferred_vehicle_id, booking_time, duration, booking['id'])
+                await assign_vehicle(booking, preferred_vehicle_id)
                 assignments.append({
                     "booking_id": booking.get('booking_id'),
                     "vehicle_registration": preferred_vehicle.get('registration'),
@@ -6185,11 +6287,8 @@ async def auto_assign_vehicles(date: str = None):
                 if alts:
                     # Use first alternative
                     alt_vehicle = alts[0]
-                    add_to_schedule(alt_vehicle['vehicle_id'], booking_time, duration)
-                    await db.bookings.update_one(
-                        {"id": booking['id']},
-                        {"$set": {"vehicle_id": alt_vehicle['vehicle_id']}}
-                    )
+                    add_to_schedule(alt_vehicle['vehicle_id'], booking_time, duration, booking['id'])
+                    await assign_vehicle(booking, alt_vehicle['vehicle_id'])
                     assignments.append({
                         "booking_id": booking.get('booking_id'),
                         "vehicle_registration": alt_vehicle['registration'],
@@ -6216,12 +6315,9 @@ async def auto_assign_vehicles(date: str = None):
             )
             
             for vehicle in eligible_vehicles_sorted:
-                if can_fit_booking(vehicle['id'], booking_time, duration):
-                    add_to_schedule(vehicle['id'], booking_time, duration)
-                    await db.bookings.update_one(
-                        {"id": booking['id']},
-                        {"$set": {"vehicle_id": vehicle['id']}}
-                    )
+                if can_fit_booking(vehicle['id'], booking_time, duration, booking['id']):
+                    add_to_schedule(vehicle['id'], booking_time, duration, booking['id'])
+                    await assign_vehicle(booking, vehicle['id'])
                     assignments.append({
                         "booking_id": booking.get('booking_id'),
                         "vehicle_registration": vehicle.get('registration'),
@@ -6273,12 +6369,9 @@ async def auto_assign_vehicles(date: str = None):
                 
                 assigned = False
                 for vehicle in matching_vehicles_sorted:
-                    if can_fit_booking(vehicle['id'], booking_time, duration):
-                        add_to_schedule(vehicle['id'], booking_time, duration)
-                        await db.bookings.update_one(
-                            {"id": booking['id']},
-                            {"$set": {"vehicle_id": vehicle['id']}}
-                        )
+                    if can_fit_booking(vehicle['id'], booking_time, duration, booking['id']):
+                        add_to_schedule(vehicle['id'], booking_time, duration, booking['id'])
+                        await assign_vehicle(booking, vehicle['id'])
                         assignments.append({
                             "booking_id": booking.get('booking_id'),
                             "vehicle_registration": vehicle.get('registration'),
@@ -6327,15 +6420,12 @@ async def auto_assign_vehicles(date: str = None):
         
         assigned = False
         for vehicle in eligible_vehicles_sorted:
-            if can_fit_booking(vehicle['id'], booking_time, duration):
+            if can_fit_booking(vehicle['id'], booking_time, duration, booking['id']):
                 # Assign this vehicle
-                add_to_schedule(vehicle['id'], booking_time, duration)
+                add_to_schedule(vehicle['id'], booking_time, duration, booking['id'])
                 
                 # Update booking in database
-                await db.bookings.update_one(
-                    {"id": booking['id']},
-                    {"$set": {"vehicle_id": vehicle['id']}}
-                )
+                await assign_vehicle(booking, vehicle['id'])
                 
                 assignments.append({
                     "booking_id": booking.get('booking_id'),
@@ -6364,7 +6454,8 @@ async def auto_assign_vehicles(date: str = None):
     regular_assigned = len([a for a in assignments if not a.get('is_contract')])
     
     return {
-        "message": f"Auto-scheduling complete for {target_date}",
+        "message": f"Auto-scheduling {'plan' if dry_run else 'complete'} for {target_date}",
+        "dry_run": dry_run,
         "assigned": len(assignments),
         "contract_assigned": contract_assigned,
         "regular_assigned": regular_assigned,
@@ -6422,13 +6513,16 @@ async def create_daily_assignment(assignment: DailyAssignment):
     
     # Update all bookings on this vehicle for this date with the driver
     date_str = assignment.date
+    day_filter = {
+        "vehicle_id": assignment.vehicle_id,
+        "booking_datetime": {"$regex": f"^{date_str}"}
+    }
+    day_booking_ids = [b["id"] for b in await db.bookings.find(day_filter, {"_id": 0, "id": 1}).to_list(None)]
     bookings_updated = await db.bookings.update_many(
-        {
-            "vehicle_id": assignment.vehicle_id,
-            "booking_datetime": {"$regex": f"^{date_str}"}
-        },
+        day_filter,
         {"$set": {"driver_id": assignment.driver_id}}
     )
+    await sync_chat_thread_driver(day_booking_ids, assignment.driver_id, driver.get("name") if driver else None)
     
     return {
         "message": "Daily assignment saved",
@@ -6478,6 +6572,7 @@ async def assign_driver_to_booking(booking_id: str, driver_id: str):
         }
     )
     await db.drivers.update_one({"id": driver_id}, {"$set": {"status": DriverStatus.BUSY}})
+    await sync_chat_thread_driver([booking_id], driver_id, driver.get("name"))
     
     # Send push notification to driver if they have a push token
     if driver.get("push_token"):
@@ -6530,6 +6625,7 @@ async def unassign_driver_from_booking(booking_id: str):
             "$push": {"history": history_entry}
         }
     )
+    await sync_chat_thread_driver([booking_id], None)
     
     updated = await db.bookings.find_one({"id": booking_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -6963,44 +7059,84 @@ async def test_sms_template(template_type: str, phone: str):
         raise HTTPException(status_code=500, detail=f"Failed to send test SMS: {message}")
 
 # ========== STATS ENDPOINT ==========
-@api_router.get("/stats")
-async def get_stats():
-    total_bookings = await db.bookings.count_documents({})
-    pending_bookings = await db.bookings.count_documents({"status": BookingStatus.PENDING})
-    assigned_bookings = await db.bookings.count_documents({"status": BookingStatus.ASSIGNED})
-    in_progress_bookings = await db.bookings.count_documents({"status": BookingStatus.IN_PROGRESS})
-    completed_bookings = await db.bookings.count_documents({"status": BookingStatus.COMPLETED})
-    cancelled_bookings = await db.bookings.count_documents({"status": BookingStatus.CANCELLED})
-    
-    total_drivers = await db.drivers.count_documents({})
-    available_drivers = await db.drivers.count_documents({"status": DriverStatus.AVAILABLE})
-    busy_drivers = await db.drivers.count_documents({"status": DriverStatus.BUSY})
-    
-    # Calculate total fare from completed bookings
-    pipeline = [
-        {"$match": {"status": BookingStatus.COMPLETED, "fare": {"$exists": True, "$ne": None}}},
-        {"$group": {"_id": None, "total": {"$sum": "$fare"}}}
-    ]
-    fare_result = await db.bookings.aggregate(pipeline).to_list(1)
-    total_revenue = fare_result[0]["total"] if fare_result else 0
-    
+# The dashboard polls /stats from every open admin tab, so the counts are
+# computed with one $facet pass per collection and held as a short-lived
+# snapshot. Concurrent callers share a single in-flight computation and,
+# once the snapshot is stale, get the previous one while it refreshes.
+STATS_CACHE_TTL_SECONDS = float(os.environ.get('STATS_CACHE_TTL_SECONDS', 5))
+STATS_MAX_STALE_SECONDS = float(os.environ.get('STATS_MAX_STALE_SECONDS', 60))
+
+_stats_snapshot = {"data": None, "computed_at": 0.0}
+_stats_lock = asyncio.Lock()
+_stats_refresh_task = None
+
+async def _compute_booking_stats():
+    pipeline = [{"$facet": {
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        "revenue": [
+            {"$match": {"status": BookingStatus.COMPLETED, "fare": {"$exists": True, "$ne": None}}},
+            {"$group": {"_id": None, "total": {"$sum": "$fare"}}}
+        ]
+    }}]
+    result = await db.bookings.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {"by_status": [], "revenue": []}
+    counts = {row["_id"]: row["count"] for row in facets["by_status"]}
     return {
-        "bookings": {
-            "total": total_bookings,
-            "pending": pending_bookings,
-            "assigned": assigned_bookings,
-            "in_progress": in_progress_bookings,
-            "completed": completed_bookings,
-            "cancelled": cancelled_bookings
-        },
-        "drivers": {
-            "total": total_drivers,
-            "available": available_drivers,
-            "busy": busy_drivers
-        },
-        "revenue": total_revenue
+        "total": sum(counts.values()),
+        "pending": counts.get(BookingStatus.PENDING, 0),
+        "assigned": counts.get(BookingStatus.ASSIGNED, 0),
+        "in_progress": counts.get(BookingStatus.IN_PROGRESS, 0),
+        "completed": counts.get(BookingStatus.COMPLETED, 0),
+        "cancelled": counts.get(BookingStatus.CANCELLED, 0)
+    }, (facets["revenue"][0]["total"] if facets["revenue"] else 0)
+
+async def _compute_driver_stats():
+    pipeline = [{"$facet": {
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    }}]
+    result = await db.drivers.aggregate(pipeline).to_list(1)
+    counts = {row["_id"]: row["count"] for row in (result[0]["by_status"] if result else [])}
+    return {
+        "total": sum(counts.values()),
+        "available": counts.get(DriverStatus.AVAILABLE, 0),
+        "busy": counts.get(DriverStatus.BUSY, 0)
     }
 
+async def _refresh_stats_snapshot():
+    """Recompute the stats snapshot - callers racing on the lock share one run"""
+    started = time.monotonic()
+    async with _stats_lock:
+        # Someone else refreshed while we were waiting for the lock
+        if _stats_snapshot["data"] is not None and _stats_snapshot["computed_at"] >= started:
+            return _stats_snapshot["data"]
+        (booking_stats, total_revenue), driver_stats = await asyncio.gather(
+            _compute_booking_stats(), _compute_driver_stats()
+        )
+        _stats_snapshot["data"] = {
+            "bookings": booking_stats,
+            "drivers": driver_stats,
+            "revenue": total_revenue
+        }
+        _stats_snapshot["computed_at"] = time.monotonic()
+        return _stats_snapshot["data"]
+
+def _schedule_stats_refresh():
+    global _stats_refresh_task
+    if _stats_refresh_task is None or _stats_refresh_task.done():
+        _stats_refresh_task = asyncio.create_task(_refresh_stats_snapshot())
+
+@api_router.get("/stats")
+async def get_stats():
+    age = time.monotonic() - _stats_snapshot["computed_at"]
+    if _stats_snapshot["data"] is not None:
+        if age < STATS_CACHE_TTL_SECONDS:
+            return _stats_snapshot["data"]
+        if age < STATS_MAX_STALE_SECONDS:
+            # Serve the previous snapshot and refresh it in the background
+            _schedule_stats_refresh()
+            return _stats_snapshot["data"]
+    return await _refresh_stats_snapshot()
+
 # ========== DRIVER MOBILE APP ENDPOINTS ==========
 
 # Driver authentication dependency
@@ -7013,7 +7149,8 @@ async def get_current_driver(credentials: HTTPAuthorizationCredentials = Depends
         if not driver_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        driver = await db.drivers.find_one({"id": driver_id}, {"_id": 0})
+        driver = await principal_cache.load(
+            "driver", driver_id, lambda: db.drivers.find_one({"id": driver_id}, {"_id": 0}))
         if not driver:
             raise HTTPException(status_code=401, detail="Driver not found")
         
@@ -7288,7 +7425,7 @@ async def get_driver_walkaround_history(driver: dict = Depends(get_current_drive
     """Get walkaround check history for the current driver"""
     checks = await db.walkaround_checks.find(
         {"driver_id": driver["id"]},
-        {"_id": 0}
+        WALKAROUND_LIST_PROJECTION
     ).sort("submitted_at", -1).to_list(100)
     return checks
 
@@ -7486,7 +7623,7 @@ async def get_admin_chat(driver: dict = Depends(get_current_driver)):
     return messages
 
 @api_router.get("/driver/bookings")
-async def get_driver_bookings(driver: dict = Depends(get_current_driver)):
+async def get_driver_bookings(driver: dict = Depends(get_driver_claims)):
     """Get all bookings assigned to this driver"""
     bookings = await db.bookings.find(
         {"driver_id": driver["id"]},
@@ -7530,7 +7667,7 @@ async def get_driver_bookings(driver: dict = Depends(get_current_driver)):
     }
 
 @api_router.get("/driver/bookings/pending")
-async def get_pending_assignments(driver: dict = Depends(get_current_driver)):
+async def get_pending_assignments(driver: dict = Depends(get_driver_claims)):
     """Get bookings pending acceptance by this driver"""
     # Get bookings that are assigned but not yet accepted
     bookings = await db.bookings.find(
@@ -7577,6 +7714,7 @@ async def reject_booking(booking_id: str, reason: Optional[str] = None, driver:
             "status": BookingStatus.PENDING
         }}
     )
+    await sync_chat_thread_driver([booking_id], None)
     
     return {"message": "Booking rejected"}
 
@@ -7920,6 +8058,7 @@ async def get_dispatch_chat(booking_id: str):
 async def delete_dispatch_chat(booking_id: str, admin: dict = Depends(get_current_admin)):
     """Delete all chat messages for a booking (dispatch/admin only)"""
     result = await db.chat_messages.delete_many({"booking_id": booking_id})
+    await delete_chat_thread(booking_id)
     return {"message": f"Deleted {result.deleted_count} messages", "booking_id": booking_id}
 
 @api_router.delete("/driver/chat/{booking_id}")
@@ -7931,6 +8070,7 @@ async def delete_driver_chat(booking_id: str, driver: dict = Depends(get_current
         raise HTTPException(status_code=404, detail="Booking not found or not assigned to you")
     
     result = await db.chat_messages.delete_many({"booking_id": booking_id})
+    await delete_chat_thread(booking_id)
     return {"message": f"Deleted {result.deleted_count} messages", "booking_id": booking_id}
 
 # ========== STRIPE PAYMENT ENDPOINTS ==========
@@ -8279,23 +8419,15 @@ async def twilio_whatsapp_webhook(request: Request):
         customer_name = None
         related_booking = None
         
-        # Search for recent bookings with this phone number
-        search_phone = clean_from.replace('+', '').replace(' ', '')
-        if search_phone.startswith('44'):
-            search_phone_alt = '0' + search_phone[2:]
-        else:
-            search_phone_alt = search_phone
-        
-        recent_booking = await db.bookings.find_one(
-            {
-                "$or": [
-                    {"customer_phone": {"$regex": search_phone[-10:]}},
-                    {"customer_phone": {"$regex": search_phone_alt[-10:]}}
-                ]
-            },
-            {"_id": 0},
-            sort=[("created_at", -1)]
-        )
+        # Most recent booking for this number - (phone_e164, created_at) index
+        sender_e164 = normalize_phone(clean_from)
+        recent_booking = None
+        if sender_e164:
+            recent_booking = await db.bookings.find_one(
+                {"phone_e164": sender_e164},
+                {"_id": 0},
+                sort=[("created_at", -1)]
+            )
         
         if recent_booking:
             customer_name = recent_booking.get('customer_name', 'Unknown')
@@ -8985,8 +9117,7 @@ class MileRates(BaseModel):
 @api_router.get("/settings/fare-zones")
 async def get_fare_zones():
     """Get all fare zones"""
-    zones = await db.fare_zones.find({}, {"_id": 0}).to_list(100)
-    return zones
+    return await get_reference(db, "fare_zones")
 
 @api_router.post("/settings/fare-zones")
 async def create_fare_zone(zone: FareZone):
@@ -8995,6 +9126,7 @@ async def create_fare_zone(zone: FareZone):
     zone_data["id"] = str(uuid.uuid4())
     zone_data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.fare_zones.insert_one(zone_data)
+    await invalidate_reference(db, "fare_zones")
     return {"id": zone_data["id"], "message": "Zone created"}
 
 @api_router.put("/settings/fare-zones/{zone_id}")
@@ -9007,6 +9139,7 @@ async def update_fare_zone(zone_id: str, zone: FareZoneUpdate):
     result = await db.fare_zones.update_one({"id": zone_id}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Zone not found")
+    await invalidate_reference(db, "fare_zones")
     return {"message": "Zone updated"}
 
 @api_router.delete("/settings/fare-zones/{zone_id}")
@@ -9015,14 +9148,15 @@ async def delete_fare_zone(zone_id: str):
     result = await db.fare_zones.delete_one({"id": zone_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Zone not found")
+    await invalidate_reference(db, "fare_zones")
     return {"message": "Zone deleted"}
 
 @api_router.get("/settings/mile-rates")
 async def get_mile_rates():
     """Get mile-based pricing settings"""
-    rates = await db.settings.find_one({"key": "mile_rates"}, {"_id": 0})
-    if rates:
-        return rates.get("value", {})
+    rates = await get_reference(db, "mile_rates")
+    if rates is not None:
+        return rates
     # Return default rates
     return MileRates().model_dump()
 
@@ -9034,54 +9168,59 @@ async def update_mile_rates(rates: MileRates):
         {"$set": {"key": "mile_rates", "value": rates.model_dump()}},
         upsert=True
     )
+    await invalidate_reference(db, "mile_rates")
     return {"message": "Mile rates updated"}
 
+def zone_fare(zone: dict, vehicle_type_id: Optional[str]) -> dict:
+    """Fixed fare for a matched zone"""
+    # Get fare for the specific vehicle type
+    vehicle_fares = zone.get("vehicle_fares", {})
+    
+    if vehicle_type_id and vehicle_type_id in vehicle_fares:
+        fare = vehicle_fares[vehicle_type_id]
+    elif vehicle_fares:
+        # Return first available fare or average as fallback
+        fare = list(vehicle_fares.values())[0]
+    else:
+        # Legacy support for old fixed_fare field
+        fare = zone.get("fixed_fare", 0)
+    
+    return {
+        "fare": fare,
+        "type": "zone",
+        "zone_name": zone["name"],
+        "vehicle_fares": vehicle_fares,
+        "message": f"Fixed fare for {zone['name']}"
+    }
+
+async def stored_dropoff_coordinates(matcher, dropoffs: List[str]) -> Dict[str, dict]:
+    """
+    Coordinates from the geocode store for dropoffs quoted without them, when
+    some zone has a boundary to test. Store only - quoting never calls the API.
+    """
+    if not matcher.has_boundaries:
+        return {}
+    return await resolve_coordinates(db, dropoffs, None)
+
 @api_router.post("/settings/calculate-fare")
-async def calculate_fare_from_locations(pickup: str, dropoff: str, vehicle_type_id: Optional[str] = None):
+async def calculate_fare_from_locations(
+    pickup: str,
+    dropoff: str,
+    vehicle_type_id: Optional[str] = None,
+    dropoff_lat: Optional[float] = None,
+    dropoff_lng: Optional[float] = None,
+):
     """Calculate fare based on locations and vehicle type - check zones first, then use mile rates"""
-    # Check if dropoff matches any zone
-    zones = await db.fare_zones.find({}, {"_id": 0}).to_list(100)
-    
-    for zone in zones:
-        if zone.get("zone_type") in ["dropoff", "both"]:
-            zone_matches = False
-            
-            # Check postcodes
-            for postcode in zone.get("postcodes", []):
-                if postcode.upper() in dropoff.upper():
-                    zone_matches = True
-                    break
-            
-            # Check area names if no postcode match
-            if not zone_matches:
-                for area in zone.get("areas", []):
-                    if area.lower() in dropoff.lower():
-                        zone_matches = True
-                        break
-            
-            # Check boundary (point-in-polygon) if available
-            # TODO: Implement boundary check with lat/lng
-            
-            if zone_matches:
-                # Get fare for the specific vehicle type
-                vehicle_fares = zone.get("vehicle_fares", {})
-                
-                if vehicle_type_id and vehicle_type_id in vehicle_fares:
-                    fare = vehicle_fares[vehicle_type_id]
-                elif vehicle_fares:
-                    # Return first available fare or average as fallback
-                    fare = list(vehicle_fares.values())[0]
-                else:
-                    # Legacy support for old fixed_fare field
-                    fare = zone.get("fixed_fare", 0)
-                
-                return {
-                    "fare": fare,
-                    "type": "zone",
-                    "zone_name": zone["name"],
-                    "vehicle_fares": vehicle_fares,
-                    "message": f"Fixed fare for {zone['name']}"
-                }
+    # Check if dropoff matches any zone (postcode, area name or, with coordinates, boundary)
+    zones = await get_reference(db, "fare_zones")
+    matcher = matcher_for(zones)
+    if dropoff_lat is None or dropoff_lng is None:
+        located = (await stored_dropoff_coordinates(matcher, [dropoff])).get(dropoff)
+        if located:
+            dropoff_lat, dropoff_lng = located["lat"], located["lng"]
+    zone = matcher.match(dropoff, dropoff_lat, dropoff_lng)
+    if zone:
+        return zone_fare(zone, vehicle_type_id)
     
     # No zone match - would need to calculate based on distance
     return {
@@ -9090,6 +9229,104 @@ async def calculate_fare_from_locations(pickup: str, dropoff: str, vehicle_type_
         "message": "No matching zone - calculate based on distance"
     }
 
+FARE_BATCH_LIMIT = 500
+
+class FareQuoteRequest(BaseModel):
+    pickup: str
+    dropoff: str
+    booking_datetime: Optional[str] = None  # ISO; decides whether the night rate applies
+    vehicle_type_id: Optional[str] = None
+    waiting_minutes: float = 0
+    dropoff_lat: Optional[float] = None
+    dropoff_lng: Optional[float] = None
+
+class FareQuoteBatchRequest(BaseModel):
+    quotes: List[FareQuoteRequest] = Field(..., min_length=1, max_length=FARE_BATCH_LIMIT)
+
+def is_night_time(booking_datetime: Optional[str], night_start: str, night_end: str) -> bool:
+    """Whether the booking's wall-clock time falls in the night window (which may span midnight)"""
+    if not booking_datetime:
+        return False
+    try:
+        moment = datetime.fromisoformat(booking_datetime.replace('Z', '+00:00')).strftime("%H:%M")
+    except ValueError:
+        return False
+    if night_start <= night_end:
+        return night_start <= moment < night_end
+    return moment >= night_start or moment < night_end
+
+def mile_rate_fare(rates: MileRates, quote: FareQuoteRequest, route: dict) -> dict:
+    """Same sum as the Settings page calculator: base + miles, waiting, night multiplier, airport, minimum"""
+    vehicle_rates = rates.vehicle_rates.get(quote.vehicle_type_id or "", {})
+    base_fare = vehicle_rates.get("base_fare", rates.base_fare)
+    price_per_mile = vehicle_rates.get("price_per_mile", rates.price_per_mile)
+    minimum_fare = vehicle_rates.get("minimum_fare", rates.minimum_fare)
+    
+    miles = round(route["distance_meters"] / 1609.34, 1)
+    night = is_night_time(quote.booking_datetime, rates.night_start, rates.night_end)
+    airport = "airport" in f"{quote.pickup} {quote.dropoff}".lower()
+    
+    fare = base_fare + miles * price_per_mile
+    fare += quote.waiting_minutes * rates.waiting_rate_per_min
+    if night:
+        fare *= rates.night_multiplier
+    if airport:
+        fare += rates.airport_surcharge
+    fare = max(fare, minimum_fare)
+    
+    return {
+        "fare": round(fare, 2),
+        "type": "distance",
+        "distance_miles": miles,
+        "duration_minutes": round(route["duration_seconds"] / 60),
+        "night_rate": night,
+        "airport_surcharge": rates.airport_surcharge if airport else 0,
+        "message": f"{miles} miles at £{price_per_mile:.2f}/mile"
+    }
+
+@api_router.post("/settings/calculate-fares")
+async def calculate_fares(batch: FareQuoteBatchRequest):
+    """
+    Price many journeys at once - a contract schedule or a quote with options.
+    Zones are matched first; the rest are priced on mile rates from road
+    distances resolved together through the route cache.
+    """
+    zones = await get_reference(db, "fare_zones")
+    stored_rates = await get_reference(db, "mile_rates")
+    rates = MileRates(**stored_rates) if stored_rates is not None else MileRates()
+    matcher = matcher_for(zones)
+    located = await stored_dropoff_coordinates(
+        matcher, [q.dropoff for q in batch.quotes if q.dropoff_lat is None or q.dropoff_lng is None])
+    
+    results: List[Optional[dict]] = [None] * len(batch.quotes)
+    by_distance = []
+    for i, quote in enumerate(batch.quotes):
+        lat, lng = quote.dropoff_lat, quote.dropoff_lng
+        if (lat is None or lng is None) and quote.dropoff in located:
+            lat, lng = located[quote.dropoff]["lat"], located[quote.dropoff]["lng"]
+        zone = matcher.match(quote.dropoff, lat, lng)
+        if zone:
+            results[i] = zone_fare(zone, quote.vehicle_type_id)
+        else:
+            by_distance.append(i)
+    
+    routes = await resolve_routes(
+        db, [(batch.quotes[i].pickup, batch.quotes[i].dropoff) for i in by_distance], GOOGLE_MAPS_API_KEY)
+    for i in by_distance:
+        quote = batch.quotes[i]
+        route = routes.get(route_key(quote.pickup, quote.dropoff))
+        if route:
+            results[i] = mile_rate_fare(rates, quote, route)
+        else:
+            results[i] = {"fare": None, "type": "distance", "message": "Could not calculate route"}
+    
+    priced = [r for r in results if r["fare"] is not None]
+    return {
+        "quotes": [{"index": i, **result} for i, result in enumerate(results)],
+        "priced": len(priced),
+        "total": round(sum(r["fare"] for r in priced), 2)
+    }
+
 # ========== QUOTE ENDPOINTS ==========
 
 @api_router.get("/quotes")
@@ -9212,6 +9449,8 @@ async def convert_quote_to_booking(quote_id: str, authorization: str = Header(No
         "converted_from_quote_number": quote.get("quote_number"),
     }
     
+    booking_dict['phone_e164'] = normalize_phone(booking_dict.get('customer_phone'))
+    add_booking_coordinates(booking_dict, await resolve_booking_coordinates(journey_addresses(booking_dict)))
     await db.bookings.insert_one(booking_dict)
     
     # Update quote status
@@ -9242,6 +9481,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Skip", "Server-Timing", "X-Profile-Id"],
 )
 
 # Security headers middleware
@@ -9255,6 +9495,101 @@ async def add_security_headers(request: Request, call_next):
     response.headers["Permissions-Policy"] = "geolocation=(self), microphone=()"
     return response
 
+# Request capture middleware - sampled, scrubbed request log for offline replay
+@app.middleware("http")
+async def capture_sampled_requests(request: Request, call_next):
+    if not request_capture.sampled(request.url.path):
+        return await call_next(request)
+    body = await request.body()
+    started = time.perf_counter()
+    response = await call_next(request)
+    stats = current_request_stats.get()
+    try:
+        request_capture.add(capture_record(
+            request, body, response.status_code, time.perf_counter() - started,
+            caller_identity(request.headers.get("Authorization"), JWT_SECRET, JWT_ALGORITHM),
+            stats.mongo_count if stats else None,
+        ))
+    except Exception as e:
+        logger.error(f"Failed to capture request: {e}")
+    return response
+
+# Request metrics middleware - latency, Mongo commands and outbound HTTP per route
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    stats = RequestStats()
+    token = current_request_stats.set(stats)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        current_request_stats.reset(token)
+        record_request(request.method, route_label(request), status_code, elapsed, stats)
+    if SERVER_TIMING_ENABLED or request.headers.get("X-Server-Timing") == "1":
+        response.headers["Server-Timing"] = stats.server_timing(elapsed)
+    if QUERY_LOG_HEADERS:
+        response.headers["X-Mongo-Commands"] = ", ".join(stats.commands)
+        response.headers["X-Outbound-Calls"] = ", ".join(stats.http_calls)
+    return response
+
+async def _profiling_admin(request: Request) -> Optional[dict]:
+    """The admin behind an X-Profile request, or None - profiling is never offered to anyone else"""
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        payload = jwt.decode(auth[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        return None
+    if payload.get("type") != "admin" or not payload.get("sub"):
+        return None
+    return await db.admin_users.find_one({"id": payload["sub"]}, {"_id": 0, "id": 1, "email": 1})
+
+# Per-request profiler - an admin sends X-Profile: 1 to sample that one request
+@app.middleware("http")
+async def profile_admin_request(request: Request, call_next):
+    if request.headers.get("X-Profile") != "1":
+        return await call_next(request)
+    admin = await _profiling_admin(request)
+    if not admin:
+        return await call_next(request)
+
+    profiler = RequestProfiler(request.scope, asyncio.get_running_loop())
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profile = await asyncio.to_thread(profiler.stop)
+
+    profile_id = str(uuid.uuid4())
+    try:
+        await db.request_profiles.insert_one({
+            "id": profile_id,
+            "method": request.method,
+            "path": request.url.path,
+            "route": route_label(request),
+            "status_code": response.status_code,
+            "admin_id": admin["id"],
+            "created_at": datetime.now(timezone.utc),
+            **profiler.summary(),
+            # Stored as text: speedscope's "$schema" key is not a valid Mongo field name
+            "profile": json.dumps(profile),
+        })
+        response.headers["X-Profile-Id"] = profile_id
+    except Exception as e:
+        logger.error(f"Failed to store request profile: {e}")
+    return response
+
+@app.get("/api/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require a bearer token"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -9279,6 +9614,89 @@ async def migrate_booking_ids():
             )
             logger.info(f"Assigned {new_booking_id} to booking {booking['id']}")
 
+@app.on_event("startup")
+async def backfill_phone_e164():
+    """Write phone_e164 on documents stored before the field existed"""
+    sources = {
+        "bookings": ("customer_phone",),
+        "passengers": ("phone",),
+        "drivers": ("phone",),
+        "clients": ("phone", "mobile"),
+    }
+    try:
+        for collection_name, fields in sources.items():
+            collection = db[collection_name]
+            projection = {"_id": 1, **{field: 1 for field in fields}}
+            operations = []
+            updated = 0
+            async for doc in collection.find({"phone_e164": {"$exists": False}}, projection):
+                if collection_name == "clients":
+                    value = normalize_phones(*(doc.get(field) for field in fields))
+                else:
+                    value = normalize_phone(doc.get(fields[0]))
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"phone_e164": value}}))
+                if len(operations) >= 500:
+                    await collection.bulk_write(operations, ordered=False)
+                    updated += len(operations)
+                    operations = []
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+            if updated:
+                logger.info(f"Backfilled phone_e164 on {updated} {collection_name}")
+    except Exception as e:
+        logger.warning(f"phone_e164 backfill failed: {e}")
+
+@app.on_event("startup")
+async def backfill_chat_threads():
+    """Build chat thread summaries from existing messages on first run"""
+    try:
+        await rebuild_chat_threads()
+    except Exception as e:
+        logger.warning(f"Chat thread backfill failed: {e}")
+
+@app.on_event("startup")
+async def migrate_walkaround_signatures():
+    """Move inline base64 signatures from older walkaround checks into GridFS"""
+    try:
+        migrated = 0
+        async for check in db.walkaround_checks.find({"signature": {"$type": "string"}}, {"_id": 1, "id": 1, "signature": 1}):
+            file_id = await store_walkaround_image(check["id"], "signature", check["signature"])
+            if not file_id:
+                # The inline value is the only copy; load_walkaround_signature still reads it
+                logger.warning(f"Keeping inline signature on walkaround check {check['id']}")
+                continue
+            await db.walkaround_checks.update_one(
+                {"_id": check["_id"]},
+                {"$set": {"signature_file_id": file_id}, "$unset": {"signature": ""}}
+            )
+            migrated += 1
+        if migrated:
+            logger.info(f"Moved {migrated} walkaround signatures to GridFS")
+    except Exception as e:
+        logger.warning(f"Walkaround signature migration failed: {e}")
+
+@app.on_event("startup")
+async def backfill_walkaround_search_keys():
+    """Write search_keys on walkaround checks submitted before the field existed"""
+    try:
+        operations = []
+        updated = 0
+        projection = {"_id": 1, "check_number": 1, "vehicle_reg": 1, "driver_name": 1}
+        async for check in db.walkaround_checks.find({"search_keys": {"$exists": False}}, projection):
+            operations.append(UpdateOne({"_id": check["_id"]}, {"$set": {"search_keys": walkaround_search_keys(check)}}))
+            if len(operations) >= 500:
+                await db.walkaround_checks.bulk_write(operations, ordered=False)
+                updated += len(operations)
+                operations = []
+        if operations:
+            await db.walkaround_checks.bulk_write(operations, ordered=False)
+            updated += len(operations)
+        if updated:
+            logger.info(f"Backfilled search_keys on {updated} walkaround checks")
+    except Exception as e:
+        logger.warning(f"Walkaround search key backfill failed: {e}")
+
 @app.on_event("startup")
 async def start_whatsapp_keep_alive():
     """Start the daily WhatsApp keep-alive background task"""
@@ -9319,61 +9737,61 @@ async def create_default_admin():
 
 @app.on_event("startup")
 async def create_database_indexes():
-    """Create database indexes for better query performance"""
+    """Create the indexes declared in db_indexes.INDEX_MANIFEST"""
     try:
-        # Bookings indexes
-        await db.bookings.create_index("id", unique=True)
-        await db.bookings.create_index("booking_id", unique=True, sparse=True)
-        await db.bookings.create_index("status")
-        await db.bookings.create_index("driver_id")
-        await db.bookings.create_index("created_at")
-        await db.bookings.create_index("booking_datetime")
-        await db.bookings.create_index("client_id")
-        await db.bookings.create_index([("status", 1), ("booking_datetime", -1)])
-        
-        # Drivers indexes
-        await db.drivers.create_index("id", unique=True)
-        await db.drivers.create_index("email", unique=True)
-        await db.drivers.create_index("status")
-        await db.drivers.create_index("shift_status")
-        
-        # Vehicles indexes
-        await db.vehicles.create_index("id", unique=True)
-        await db.vehicles.create_index("registration", unique=True)
-        await db.vehicles.create_index("is_active")
-        await db.vehicles.create_index("current_driver_id")
-        
-        # Admin users indexes
-        await db.admin_users.create_index("id", unique=True)
-        await db.admin_users.create_index("email", unique=True)
-        
-        # Clients indexes
-        await db.clients.create_index("id", unique=True)
-        await db.clients.create_index("email", unique=True, sparse=True)
-        await db.clients.create_index("company_name")
-        
-        # Chat messages indexes
-        await db.chat_messages.create_index("booking_id")
-        await db.chat_messages.create_index("driver_id")
-        await db.chat_messages.create_index("created_at")
-        await db.chat_messages.create_index([("booking_id", 1), ("created_at", -1)])
-        
-        # Invoices indexes
-        await db.invoices.create_index("id", unique=True)
-        await db.invoices.create_index([("invoice_number", 1)], unique=True, sparse=True)
-        await db.invoices.create_index("client_id")
-        await db.invoices.create_index("status")
-        
-        # Quotes indexes
-        await db.quotes.create_index("id", unique=True)
-        await db.quotes.create_index("quote_number", unique=True, sparse=True)
-        await db.quotes.create_index("status")
-        await db.quotes.create_index("created_at")
-        
-        logger.info("Database indexes created successfully")
+        result = await apply_index_manifest(db)
+        if result["failed"]:
+            logger.warning(f"Database indexes applied with {len(result['failed'])} failures - see GET /api/admin/indexes/drift")
+        else:
+            logger.info("Database indexes created successfully")
     except Exception as e:
         logger.warning(f"Error creating indexes (may already exist): {e}")
 
+@app.on_event("startup")
+async def start_event_loop_watchdog():
+    """Opt-in: set LOOP_WATCHDOG_MS to log any call that blocks the loop longer than that"""
+    start_loop_watchdog()
+
+@app.on_event("startup")
+async def warm_reference_cache():
+    """Load vehicles, vehicle types, fare zones and mile rates and start polling cache_versions"""
+    try:
+        await reference_cache.start(db)
+    except Exception as e:
+        logger.warning(f"Reference cache warm-up failed, loading on first use: {e}")
+
+@app.on_event("startup")
+async def fit_travel_model():
+    """Fit the offline travel-time model from route_cache and refit it in the background"""
+    try:
+        await travel_model.start(db)
+    except Exception as e:
+        logger.warning(f"Travel model fit failed, using default speeds: {e}")
+
+async def _resume_invoice_emails():
+    try:
+        sent = await drain_invoice_emails({})
+        if sent:
+            logger.info(f"Sent {sent} queued invoice emails")
+    except Exception as e:
+        logger.warning(f"Queued invoice emails not sent: {e}")
+
+@app.on_event("startup")
+async def resume_invoice_emails():
+    """Send invoice emails a batch run queued but did not get to"""
+    asyncio.create_task(_resume_invoice_emails())
+
+@app.on_event("startup")
+async def start_request_capture():
+    """Opt-in: REQUEST_CAPTURE_RATE samples scrubbed requests to REQUEST_CAPTURE_DIR for replay"""
+    if request_capture.rate > 0:
+        request_capture.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    stop_loop_watchdog()
+    reference_cache.stop()
+    travel_model.stop()
+    request_capture.stop()
+    shutdown_pdf_executor()
     client.close()
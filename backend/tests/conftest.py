@@ -0,0 +1,91 @@
+"""
+Shared fixtures
+
+Most suites in this directory hit a live deployment through
+REACT_APP_BACKEND_URL and use no fixtures. The fixtures here run the app
+in-process instead - seeded synthetic data, providers stubbed - for tests
+that need to see inside a request, such as query budgets. They skip when no
+local mongod is reachable (BENCH_MONGO_URL, default mongodb://localhost:27017).
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OFFLINE_DB_NAME = "cjs_query_budget_tests"
+
+# Cursor housekeeping - a page fetch, not a separate query
+CURSOR_COMMANDS = ("getMore", "killCursors")
+
+
+def _split_header(value):
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+@pytest.fixture(scope="session")
+def offline_app():
+    """TestClient for the app on a freshly seeded throwaway database"""
+    from benchmarks import harness
+
+    harness.configure(OFFLINE_DB_NAME)
+    harness.stub_providers()
+
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    mongo = MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000)
+    try:
+        mongo.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("No local mongod for offline tests")
+
+    from benchmarks.synthetic import seed_fresh_database
+    fleet = asyncio.run(seed_fresh_database(
+        os.environ["MONGO_URL"], OFFLINE_DB_NAME, vehicles=10, bookings_per_day=60, clients=20, days=3,
+    ))
+
+    from fastapi.testclient import TestClient
+    server = harness.load_server()
+    with TestClient(server.app) as client:
+        client.fleet = fleet
+        client.database = mongo[OFFLINE_DB_NAME]
+        yield client
+
+    mongo.drop_database(OFFLINE_DB_NAME)
+    mongo.close()
+
+
+class QueryBudget:
+    """Send a request and fail if it issues more Mongo commands or outbound calls than allowed"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, method, path, max_queries=None, max_http=None, **kwargs):
+        response = self.client.request(method, path, **kwargs)
+        assert "X-Mongo-Commands" in response.headers, "Query log headers missing - is QUERY_LOG_HEADERS set?"
+        commands = [c for c in _split_header(response.headers["X-Mongo-Commands"]) if not c.startswith(CURSOR_COMMANDS)]
+        calls = _split_header(response.headers.get("X-Outbound-Calls"))
+        if max_queries is not None and len(commands) > max_queries:
+            pytest.fail(
+                f"{method} {path} issued {len(commands)} Mongo commands, budget is {max_queries}:\n    "
+                + "\n    ".join(commands)
+            )
+        if max_http is not None and len(calls) > max_http:
+            pytest.fail(
+                f"{method} {path} made {len(calls)} outbound calls, budget is {max_http}:\n    "
+                + "\n    ".join(calls)
+            )
+        response.mongo_commands = commands
+        response.outbound_calls = calls
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+
+@pytest.fixture
+def query_budget(offline_app):
+    return QueryBudget(offline_app)
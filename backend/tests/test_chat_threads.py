@@ -0,0 +1,61 @@
+"""
+Chat Thread Summary Tests
+Tests that chat_threads follows its booking: reassignment, rejection, edits, deletion and driver renames
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+"""
+import uuid
+
+from benchmarks import harness
+
+
+def booking_with_thread(client, driver_id):
+    booking_id = str(uuid.uuid4())
+    client.database.bookings.insert_one({
+        "id": booking_id, "booking_id": f"CT-{booking_id[:4]}", "driver_id": driver_id, "status": "assigned",
+        "first_name": "Chat", "last_name": "Thread", "customer_phone": "07700900456",
+        "pickup_location": "Sunderland SR1 3LE", "dropoff_location": "Newcastle NE1 6EE",
+        "booking_datetime": "2026-04-07T10:00:00",
+    })
+    response = client.post("/api/dispatch/chat/send", json={"booking_id": booking_id, "message": "On time?"})
+    assert response.status_code == 200
+    return booking_id
+
+
+def driver_inbox(client, driver_id):
+    response = client.get("/api/driver/all-chats", headers=harness.driver_headers(driver_id))
+    assert response.status_code == 200
+    return {thread["booking_id"]: thread for thread in response.json()}
+
+
+class TestChatThreadSync:
+    def test_rejected_booking_leaves_driver_inbox(self, offline_app):
+        driver_id = offline_app.fleet["driver_ids"][1]
+        booking_id = booking_with_thread(offline_app, driver_id)
+        assert booking_id in driver_inbox(offline_app, driver_id)
+        response = offline_app.put(f"/api/driver/bookings/{booking_id}/reject", headers=harness.driver_headers(driver_id))
+        assert response.status_code == 200
+        assert booking_id not in driver_inbox(offline_app, driver_id)
+
+    def test_deleted_booking_leaves_dispatch_chats(self, offline_app):
+        booking_id = booking_with_thread(offline_app, offline_app.fleet["driver_ids"][1])
+        assert offline_app.delete(f"/api/bookings/{booking_id}").status_code == 200
+        assert booking_id not in {t["booking_id"] for t in offline_app.get("/api/dispatch/active-chats").json()}
+        assert offline_app.database.chat_threads.count_documents({"booking_id": booking_id}) == 0
+
+    def test_booking_edit_refreshes_thread(self, offline_app):
+        driver_id = offline_app.fleet["driver_ids"][1]
+        booking_id = booking_with_thread(offline_app, driver_id)
+        response = offline_app.put(f"/api/bookings/{booking_id}", json={"first_name": "Renamed", "pickup_location": "Durham DH1 4RH"})
+        assert response.status_code == 200
+        thread = driver_inbox(offline_app, driver_id)[booking_id]
+        assert thread["customer_name"] == "Renamed Thread"
+        assert thread["pickup_location"] == "Durham DH1 4RH"
+
+    def test_driver_rename_refreshes_threads(self, offline_app):
+        driver_id = offline_app.fleet["driver_ids"][2]
+        booking_id = booking_with_thread(offline_app, driver_id)
+        new_name = f"Renamed Driver {uuid.uuid4().hex[:4]}"
+        assert offline_app.put(f"/api/drivers/{driver_id}", json={"name": new_name}).status_code == 200
+        threads = {t["booking_id"]: t for t in offline_app.get("/api/dispatch/active-chats").json()}
+        assert threads[booking_id]["driver_name"] == new_name
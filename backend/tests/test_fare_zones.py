@@ -0,0 +1,116 @@
+"""
+Fare Zone Matching Tests
+Tests POST /api/settings/calculate-fare against zones defined by postcode, area name and boundary
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+"""
+import uuid
+
+import pytest
+
+from geocodes import address_key
+
+VEHICLE_TYPE_ID = "zone-test-taxi"
+
+
+@pytest.fixture(scope="module")
+def zones(offline_app):
+    suffix = uuid.uuid4().hex[:6]
+    definitions = [
+        {"name": f"TS2 District {suffix}", "postcodes": ["TS2"], "vehicle_fares": {VEHICLE_TYPE_ID: 21.0}},
+        {"name": f"Hartlepool Marina {suffix}", "areas": ["Hartlepool Marina"], "vehicle_fares": {VEHICLE_TYPE_ID: 34.0}},
+        {"name": f"Kielder Box {suffix}", "vehicle_fares": {VEHICLE_TYPE_ID: 95.0}, "boundary": [
+            {"lat": 55.15, "lng": -2.65}, {"lat": 55.15, "lng": -2.45},
+            {"lat": 55.30, "lng": -2.45}, {"lat": 55.30, "lng": -2.65},
+        ]},
+    ]
+    names = {}
+    for zone in definitions:
+        response = offline_app.post("/api/settings/fare-zones", json={"zone_type": "dropoff", **zone})
+        assert response.status_code == 200
+        names[zone["name"].split(" ")[0]] = zone["name"]
+    return names
+
+
+def quote(client, dropoff, **params):
+    response = client.post("/api/settings/calculate-fare", params={
+        "pickup": "Sunderland SR1 3LE", "dropoff": dropoff, "vehicle_type_id": VEHICLE_TYPE_ID, **params,
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+class TestFareZoneMatching:
+    def test_postcode_district(self, offline_app, zones):
+        """A full postcode inside the district matches"""
+        data = quote(offline_app, "Middlesbrough Station, Zetland Road, Middlesbrough TS2 1NA")
+        assert data["type"] == "zone"
+        assert data["zone_name"] == zones["TS2"]
+        assert data["fare"] == 21.0
+
+    def test_postcode_prefix_is_not_a_match(self, offline_app, zones):
+        """TS2 must not match TS25 - the old substring check did"""
+        data = quote(offline_app, "Seaton Carew, Hartlepool TS25 1AA")
+        assert data["type"] == "distance"
+
+    def test_area_name_whole_words(self, offline_app, zones):
+        """Area names match case-insensitively, on word boundaries"""
+        assert quote(offline_app, "hartlepool marina, Hartlepool")["zone_name"] == zones["Hartlepool"]
+        assert quote(offline_app, "Hartlepool Marinas Ltd, Hartlepool")["type"] == "distance"
+
+    def test_boundary_with_coordinates(self, offline_app, zones):
+        """A dropoff inside a zone boundary matches when coordinates are given"""
+        data = quote(offline_app, "Kielder Water", dropoff_lat=55.2, dropoff_lng=-2.55)
+        assert data["zone_name"] == zones["Kielder"]
+        assert quote(offline_app, "Kielder Water", dropoff_lat=55.2, dropoff_lng=-2.3)["type"] == "distance"
+
+    def test_boundary_from_stored_geocode(self, query_budget, offline_app, zones):
+        """Without coordinates, a dropoff already in the geocode store is tested against boundaries - no API call"""
+        dropoff = f"Kielder Castle {uuid.uuid4().hex[:6]}, Kielder"
+        offline_app.database.geocodes.insert_one({"key": address_key(dropoff), "lat": 55.23, "lng": -2.58, "source": "geocoding"})
+        response = query_budget.request("POST", "/api/settings/calculate-fare", params={
+            "pickup": "Sunderland SR1 3LE", "dropoff": dropoff, "vehicle_type_id": VEHICLE_TYPE_ID,
+        }, max_http=0)
+        assert response.json()["zone_name"] == zones["Kielder"]
+
+    def test_zone_edit_rebuilds_matcher(self, offline_app, zones):
+        """Adding a postcode to a zone takes effect on the next quote"""
+        zone = next(z for z in offline_app.get("/api/settings/fare-zones").json() if z["name"] == zones["TS2"])
+        assert quote(offline_app, "Stockton TS18 1AA")["type"] == "distance"
+        response = offline_app.put(f"/api/settings/fare-zones/{zone['id']}", json={"postcodes": ["TS2", "TS18"]})
+        assert response.status_code == 200
+        assert quote(offline_app, "Stockton TS18 1AA")["zone_name"] == zones["TS2"]
+
+
+class TestBatchFareQuotes:
+    """POST /settings/calculate-fares - stub Directions answers 10.0 miles for every route"""
+
+    def test_batch_prices_zones_and_distances(self, query_budget, offline_app, zones):
+        """Zone fares, mile-rate fares and night/airport adjustments in one call"""
+        tag = uuid.uuid4().hex[:6]
+        body = {"quotes": [
+            {"pickup": f"{tag} Sunderland SR1 3LE", "dropoff": "Middlesbrough TS2 1NA", "vehicle_type_id": VEHICLE_TYPE_ID},
+            {"pickup": f"{tag} Sunderland SR1 3LE", "dropoff": f"{tag} Gateshead NE8 1AA",
+             "booking_datetime": "2026-03-02T14:00:00"},
+            {"pickup": f"{tag} Sunderland SR1 3LE", "dropoff": f"{tag} Gateshead NE8 1AA",
+             "booking_datetime": "2026-03-02T23:30:00"},
+            {"pickup": f"{tag} Sunderland SR1 3LE", "dropoff": f"{tag} Newcastle Airport NE13 8BZ"},
+        ]}
+        response = query_budget.request("POST", "/api/settings/calculate-fares", json=body, max_http=2)
+        assert response.status_code == 200
+        quotes = response.json()["quotes"]
+        assert [q["index"] for q in quotes] == [0, 1, 2, 3]
+        assert quotes[0]["type"] == "zone" and quotes[0]["fare"] == 21.0
+        # Default mile rates: £3.50 + 10 miles at £2.00
+        assert quotes[1]["fare"] == 23.5 and quotes[1]["night_rate"] is False
+        assert quotes[2]["fare"] == 35.25 and quotes[2]["night_rate"] is True
+        assert quotes[3]["fare"] == 28.5
+        assert response.json()["priced"] == 4
+
+    def test_repeat_batch_uses_route_cache(self, query_budget):
+        """Routes priced once are not fetched again"""
+        tag = uuid.uuid4().hex[:6]
+        body = {"quotes": [{"pickup": f"{tag} Durham DH1 4RH", "dropoff": f"{tag} Seaham SR7 7EE"}] * 5}
+        query_budget.request("POST", "/api/settings/calculate-fares", json=body, max_http=1)
+        response = query_budget.request("POST", "/api/settings/calculate-fares", json=body, max_queries=1, max_http=0)
+        assert response.json()["priced"] == 5
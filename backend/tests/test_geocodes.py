@@ -0,0 +1,60 @@
+"""
+Geocode Store Tests
+Tests that bookings are created with pickup/dropoff coordinates, reusing what /directions already resolved
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+Every stubbed Google leg runs from 54.9069,-1.3838 to 54.9783,-1.6178.
+"""
+import uuid
+
+START = {"lat": 54.9069, "lng": -1.3838}
+END = {"lat": 54.9783, "lng": -1.6178}
+
+
+def new_booking(pickup, dropoff, **fields):
+    return {
+        "first_name": "Geo", "last_name": "Test", "customer_phone": "07700900123",
+        "pickup_location": pickup, "dropoff_location": dropoff,
+        "booking_datetime": "2026-03-02T14:00:00", **fields,
+    }
+
+
+def google_calls(response):
+    return [call for call in response.outbound_calls if call == "google_maps"]
+
+
+class TestBookingCoordinates:
+    def test_directions_then_booking_needs_no_geocoding(self, query_budget, offline_app):
+        """Addresses routed through /directions are placed without another Google call"""
+        tag = uuid.uuid4().hex[:6]
+        pickup, dropoff = f"{tag} Holmeside, Sunderland SR1 3JE", f"{tag} Grey Street, Newcastle NE1 6EE"
+        directions = query_budget.get("/api/directions", params={"origin": pickup, "destination": dropoff})
+        assert directions.json()["success"] is True
+
+        response = query_budget.request("POST", "/api/bookings", json=new_booking(pickup, dropoff))
+        assert response.status_code == 200
+        assert google_calls(response) == []
+        booking = offline_app.database.bookings.find_one({"id": response.json()["id"]})
+        assert booking["pickup_coords"] == {**START, "precision": "address"}
+        assert booking["dropoff_coords"] == {**END, "precision": "address"}
+
+    def test_unseen_address_is_geocoded_once(self, query_budget, offline_app):
+        """A new address is geocoded at creation and served from the store after that"""
+        tag = uuid.uuid4().hex[:6]
+        body = new_booking(f"{tag} Durham DH1 4RH", "54.8,-1.5")
+        first = query_budget.request("POST", "/api/bookings", json=body)
+        assert len(google_calls(first)) == 1
+        second = query_budget.request("POST", "/api/bookings", json=body)
+        assert google_calls(second) == []
+        booking = offline_app.database.bookings.find_one({"id": second.json()["id"]})
+        assert booking["pickup_coords"]["precision"] == "address"
+        assert booking["dropoff_coords"] == {"lat": 54.8, "lng": -1.5, "precision": "exact"}
+
+    def test_edited_address_moves_coordinates(self, offline_app):
+        """Changing the dropoff re-resolves its coordinates"""
+        tag = uuid.uuid4().hex[:6]
+        created = offline_app.post("/api/bookings", json=new_booking(f"{tag} Seaham SR7 7EE", "54.8,-1.5")).json()
+        response = offline_app.put(f"/api/bookings/{created['id']}", json={"dropoff_location": "54.7,-1.4"})
+        assert response.status_code == 200
+        booking = offline_app.database.bookings.find_one({"id": created["id"]})
+        assert booking["dropoff_coords"] == {"lat": 54.7, "lng": -1.4, "precision": "exact"}
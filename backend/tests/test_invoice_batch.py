@@ -0,0 +1,108 @@
+"""
+Test suite for month-end batch invoicing
+Tests: Period validation, job creation, job status polling, no double billing
+"""
+import pytest
+import requests
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://chauffeur-hub-6.preview.emergentagent.com')
+
+# A period far in the past, so the batch has nothing to invoice
+EMPTY_PERIOD = "2001-01"
+
+
+class TestInvoiceBatchValidation:
+    """Test period validation on the batch endpoint"""
+
+    @pytest.mark.parametrize("period", ["2026-13", "2026/01", "January", ""])
+    def test_invalid_period_rejected(self, period):
+        """Malformed periods are rejected before any job is created"""
+        response = requests.post(f"{BASE_URL}/api/invoices/batch", params={"period": period})
+        assert response.status_code == 400, f"Expected 400 for {period!r}, got {response.status_code}"
+
+    def test_unknown_job_returns_404(self):
+        """Polling a job that does not exist returns 404"""
+        response = requests.get(f"{BASE_URL}/api/invoices/batch/does-not-exist")
+        assert response.status_code == 404
+
+
+class TestInvoiceBatchJob:
+    """Test the batch job lifecycle"""
+
+    def test_batch_job_completes(self):
+        """A batch for an empty period is accepted and finishes with no invoices"""
+        response = requests.post(f"{BASE_URL}/api/invoices/batch", params={"period": EMPTY_PERIOD})
+        if response.status_code == 409:
+            pytest.skip("A batch for this period is already running")
+        assert response.status_code == 200, f"Unexpected status: {response.status_code}, body: {response.text}"
+
+        job = response.json()
+        assert job["period"] == EMPTY_PERIOD
+        assert job["status"] == "queued"
+
+        for _ in range(30):
+            status = requests.get(f"{BASE_URL}/api/invoices/batch/{job['id']}").json()
+            if status["status"] in ("completed", "failed"):
+                break
+            time.sleep(1)
+
+        assert status["status"] == "completed", f"Job did not complete: {status}"
+        assert status["invoices_created"] == 0
+        print(f"Batch job {job['id']} finished: {status}")
+
+
+class TestInvoiceBatchOffline:
+    """In-process against a seeded local mongod (see conftest.py) - runs the batch to completion"""
+
+    def add_client_with_bookings(self, database, period, count):
+        client_id = str(uuid.uuid4())
+        database.clients.insert_one({"id": client_id, "name": f"Batch Client {client_id[:6]}", "status": "active"})
+        booking_ids = [str(uuid.uuid4()) for _ in range(count)]
+        database.bookings.insert_many([{
+            "id": booking_id, "booking_id": f"IB-{booking_id[:4]}", "client_id": client_id, "status": "completed",
+            "booking_datetime": f"{period}-1{i}T10:00:00", "fare": 40.0,
+            "pickup_location": "Sunderland SR1 3LE", "dropoff_location": "Newcastle NE1 6EE",
+        } for i, booking_id in enumerate(booking_ids)])
+        return client_id, booking_ids
+
+    def test_manually_invoiced_bookings_are_not_billed_again(self, offline_app):
+        """A manual invoice covering part of the month leaves only the rest for the batch"""
+        period = "2030-06"
+        client_id, booking_ids = self.add_client_with_bookings(offline_app.database, period, 2)
+        manual = offline_app.post(f"/api/clients/{client_id}/invoice", json={"booking_ids": booking_ids[:1]})
+        assert manual.status_code == 200
+
+        response = offline_app.post("/api/invoices/batch", params={"period": period})
+        assert response.status_code == 200
+        batch = list(offline_app.database.invoices.find({"client_id": client_id, "batch_period": period}))
+        assert [invoice["booking_ids"] for invoice in batch] == [booking_ids[1:]]
+
+    def test_concurrent_start_is_rejected(self, offline_app):
+        """Only one queued or running job may hold a period"""
+        period = "2030-07"
+        offline_app.database.invoice_jobs.insert_one({
+            "id": str(uuid.uuid4()), "period": period, "status": "running", "active": True,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        })
+        assert offline_app.post("/api/invoices/batch", params={"period": period}).status_code == 409
+
+    def test_unsent_emails_stay_queued_for_the_next_run(self, offline_app):
+        """SMTP is not configured offline, so each run tries the email once and leaves it pending"""
+        period = "2030-08"
+        client_id, _ = self.add_client_with_bookings(offline_app.database, period, 2)
+        offline_app.database.clients.update_one({"id": client_id}, {"$set": {"email": f"{client_id[:6]}@client.bench.local"}})
+
+        assert offline_app.post("/api/invoices/batch", params={"period": period}).status_code == 200
+        invoice = offline_app.database.invoices.find_one({"client_id": client_id, "batch_period": period})
+        assert (invoice["email_status"], invoice["email_attempts"]) == ("pending", 1)
+
+        # The client is already invoiced for the period; the rerun only retries the email
+        job = offline_app.post("/api/invoices/batch", params={"period": period}).json()
+        assert offline_app.get(f"/api/invoices/batch/{job['id']}").json()["status"] == "completed"
+        invoices = list(offline_app.database.invoices.find({"client_id": client_id, "batch_period": period}))
+        assert len(invoices) == 1
+        assert (invoices[0]["email_status"], invoices[0]["email_attempts"]) == ("pending", 2)
@@ -0,0 +1,64 @@
+"""
+Invoice Size Tests
+Tests that invoices with more than 1000 journeys are totalled and listed in full
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+"""
+import uuid
+
+JOURNEYS = 1200
+
+
+def add_client_with_bookings(database, count):
+    client_id = str(uuid.uuid4())
+    database.clients.insert_one({"id": client_id, "name": f"Invoice Client {client_id[:6]}", "status": "active"})
+    booking_ids = [str(uuid.uuid4()) for _ in range(count)]
+    database.bookings.insert_many([{
+        "id": booking_id, "booking_id": f"IV-{booking_id[:4]}", "client_id": client_id, "status": "completed",
+        "booking_datetime": f"2030-03-{1 + i % 28:02d}T10:00:00", "fare": 10.0,
+        "first_name": "Invoice", "last_name": "Passenger", "notes": "x" * 200,
+        "pickup_location": "Sunderland SR1 3LE", "dropoff_location": "Newcastle NE1 6EE",
+    } for i, booking_id in enumerate(booking_ids)])
+    return client_id, booking_ids
+
+
+class TestLargeInvoices:
+    def test_preview_lists_every_journey(self, offline_app):
+        """The preview is not capped and carries only the listed fields"""
+        client_id, booking_ids = add_client_with_bookings(offline_app.database, JOURNEYS)
+        response = offline_app.get(f"/api/clients/{client_id}/invoice/preview")
+        assert response.status_code == 200
+        bookings = response.json()
+        assert {b["id"] for b in bookings} == set(booking_ids)
+        assert "notes" not in bookings[0]
+
+    def test_edit_totals_every_journey(self, offline_app):
+        """Changing booking_ids recomputes the subtotal over all of them"""
+        client_id, booking_ids = add_client_with_bookings(offline_app.database, JOURNEYS)
+        invoice_id = str(uuid.uuid4())
+        offline_app.database.invoices.insert_one({
+            "id": invoice_id, "client_id": client_id, "booking_ids": [], "vat_rate": "0", "status": "unpaid",
+        })
+        response = offline_app.put(f"/api/invoices/{invoice_id}", json={"booking_ids": booking_ids})
+        assert response.status_code == 200
+        assert response.json()["subtotal"] == 10.0 * JOURNEYS
+        assert response.json()["journey_count"] == JOURNEYS
+
+        details = offline_app.get(f"/api/invoices/{invoice_id}").json()
+        assert len(details["bookings"]) == JOURNEYS
+
+
+class TestInvoiceList:
+    def test_pages_with_next_skip(self, offline_app):
+        """A full page sets X-Next-Skip; the summary counts every invoice"""
+        client_id, _ = add_client_with_bookings(offline_app.database, 1)
+        tag = uuid.uuid4().hex[:6]
+        offline_app.database.invoices.insert_many([{
+            "id": str(uuid.uuid4()), "invoice_ref": f"PG-{tag}-{i:02d}", "client_id": client_id,
+            "status": "unpaid", "total": 12.0, "created_at": f"2030-04-01T10:{i:02d}:00",
+        } for i in range(3)])
+        first = offline_app.get("/api/invoices", params={"search": f"PG-{tag}", "limit": 2})
+        assert len(first.json()) == 2 and first.headers["X-Next-Skip"] == "2"
+        rest = offline_app.get("/api/invoices", params={"search": f"PG-{tag}", "limit": 2, "skip": 2})
+        assert len(rest.json()) == 1 and "X-Next-Skip" not in rest.headers
+        assert offline_app.get("/api/invoices/summary").json()["unpaid"] >= 3
@@ -0,0 +1,47 @@
+"""
+Test suite for request metrics
+Tests: Prometheus endpoint, route-template labels, Server-Timing header
+"""
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://chauffeur-hub-6.preview.emergentagent.com')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+def fetch_metrics():
+    headers = {"Authorization": f"Bearer {METRICS_TOKEN}"} if METRICS_TOKEN else {}
+    response = requests.get(f"{BASE_URL}/api/metrics", headers=headers)
+    assert response.status_code == 200, f"Unexpected status: {response.status_code}"
+    return response.text
+
+
+class TestMetricsEndpoint:
+    """Test the Prometheus exposition"""
+
+    def test_metrics_exposes_histograms(self):
+        """Request latency and Mongo command histograms are declared"""
+        requests.get(f"{BASE_URL}/api/")
+        body = fetch_metrics()
+        assert "# TYPE cjs_http_request_duration_seconds histogram" in body
+        assert "# TYPE cjs_http_request_mongo_commands histogram" in body
+
+    def test_routes_labelled_by_template(self):
+        """Path parameters are collapsed into the route template"""
+        requests.get(f"{BASE_URL}/api/invoices/batch/metrics-test-job")
+        body = fetch_metrics()
+        assert 'route="/api/invoices/batch/{job_id}"' in body
+        assert "metrics-test-job" not in body
+
+
+class TestServerTiming:
+    """Test the opt-in Server-Timing header"""
+
+    def test_server_timing_on_request(self):
+        """X-Server-Timing: 1 returns db and total timings"""
+        response = requests.get(f"{BASE_URL}/api/invoices/batch/does-not-exist", headers={"X-Server-Timing": "1"})
+        timing = response.headers.get("Server-Timing")
+        assert timing, "Server-Timing header missing"
+        assert "db;dur=" in timing
+        assert "total;dur=" in timing
+        print(f"Server-Timing: {timing}")
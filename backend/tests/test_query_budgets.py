@@ -0,0 +1,137 @@
+"""
+Test suite for per-endpoint query budgets
+Tests: Mongo command counts stay flat as collections grow (no N+1), no stray outbound calls
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+"""
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks import harness
+from principal_cache import principal_cache
+
+
+def add_clients(database, count):
+    database.clients.insert_many([{
+        "id": str(uuid.uuid4()),
+        "name": f"Budget Test Client {i}",
+        "email": f"budget{i}-{uuid.uuid4().hex[:6]}@client.bench.local",
+        "client_type": "business", "payment_method": "invoice", "status": "active",
+        "created_at": datetime.now(timezone.utc),
+    } for i in range(count)])
+
+
+def add_passengers(database, count):
+    database.passengers.insert_many([{
+        "id": str(uuid.uuid4()),
+        "name": f"Budget Passenger {i}",
+        "phone": f"07700{900000 + i}", "phone_e164": f"+447700{900000 + i}",
+        "created_at": datetime.now(timezone.utc),
+    } for i in range(count)])
+
+
+class TestAdminListBudgets:
+    """List endpoints must not query once per row"""
+
+    def test_get_clients(self, query_budget, offline_app):
+        """GET /clients issues at most 2 queries regardless of client count"""
+        before = query_budget.get("/api/clients", max_queries=2, max_http=0)
+        add_clients(offline_app.database, 150)
+        after = query_budget.get("/api/clients", max_queries=2, max_http=0)
+        assert len(after.json()) == len(before.json()) + 150
+        assert len(after.mongo_commands) == len(before.mongo_commands)
+
+    def test_get_all_passengers(self, query_budget, offline_app):
+        """GET /admin/passengers: one find and one grouped count"""
+        before = query_budget.get("/api/admin/passengers", max_queries=2, max_http=0)
+        add_passengers(offline_app.database, 120)
+        after = query_budget.get("/api/admin/passengers", max_queries=2, max_http=0)
+        assert len(after.mongo_commands) == len(before.mongo_commands)
+
+    def test_get_all_invoices(self, query_budget):
+        """GET /invoices joins client details in one pipeline"""
+        query_budget.get("/api/invoices", max_queries=1, max_http=0)
+
+
+class TestDriverBudgets:
+    """Driver-app endpoints are polled constantly, so every query counts"""
+
+    def test_available_vehicles(self, query_budget, offline_app):
+        """GET /driver/available-vehicles: driver lookup plus vehicles and drivers"""
+        headers = harness.driver_headers(offline_app.fleet["driver_ids"][0])
+        query_budget.get("/api/driver/available-vehicles", headers=headers, max_queries=3, max_http=0)
+
+    def test_driver_bookings(self, query_budget, offline_app):
+        """GET /driver/bookings: the driver comes from cache, so one find"""
+        headers = harness.driver_headers(offline_app.fleet["driver_ids"][0])
+        query_budget.get("/api/driver/bookings", headers=headers)
+        query_budget.get("/api/driver/bookings", headers=headers, max_queries=1, max_http=0)
+
+    def test_driver_bookings_pending(self, query_budget, offline_app):
+        """GET /driver/bookings/pending: one find once the driver is cached"""
+        headers = harness.driver_headers(offline_app.fleet["driver_ids"][0])
+        query_budget.get("/api/driver/bookings/pending", headers=headers)
+        query_budget.get("/api/driver/bookings/pending", headers=headers, max_queries=1, max_http=0)
+
+
+class TestPrincipalCache:
+    """Auth dependencies serve the driver from cache until the record is written"""
+
+    def test_repeat_lookup_is_cached(self, query_budget, offline_app):
+        """Second GET /driver/profile needs no driver lookup"""
+        headers = harness.driver_headers(offline_app.fleet["driver_ids"][1])
+        query_budget.get("/api/driver/profile", headers=headers)
+        response = query_budget.get("/api/driver/profile", headers=headers, max_queries=0)
+        assert response.status_code == 200
+
+    def test_update_invalidates(self, query_budget, offline_app):
+        """An admin edit to the driver shows up on the next request"""
+        driver_id = offline_app.fleet["driver_ids"][2]
+        headers = harness.driver_headers(driver_id)
+        query_budget.get("/api/driver/profile", headers=headers)
+        response = offline_app.put(f"/api/drivers/{driver_id}", json={"name": "Renamed Driver"})
+        assert response.status_code == 200
+        response = query_budget.get("/api/driver/profile", headers=headers, max_queries=1)
+        assert response.json()["driver"]["name"] == "Renamed Driver"
+
+    def test_deleted_driver_rejected(self, offline_app):
+        """Deleting a driver locks it out of claims-only endpoints too"""
+        driver_id = offline_app.fleet["driver_ids"][3]
+        headers = harness.driver_headers(driver_id)
+        assert offline_app.get("/api/driver/bookings", headers=headers).status_code == 200
+        assert offline_app.delete(f"/api/drivers/{driver_id}").status_code == 200
+        assert offline_app.get("/api/driver/bookings", headers=headers).status_code == 401
+        assert offline_app.get("/api/driver/profile", headers=headers).status_code == 404
+
+    def test_deleted_driver_rejected_after_restart(self, offline_app):
+        """Nothing about the deletion lives only in this process: an empty cache still refuses the token"""
+        driver_id = offline_app.fleet["driver_ids"][4]
+        headers = harness.driver_headers(driver_id)
+        assert offline_app.delete(f"/api/drivers/{driver_id}").status_code == 200
+        principal_cache.invalidate("driver")
+        assert offline_app.get("/api/driver/bookings/pending", headers=headers).status_code == 401
+
+
+class TestReferenceCache:
+    """Vehicles, vehicle types, fare zones and mile rates come from the in-process cache"""
+
+    def test_check_availability(self, query_budget, offline_app):
+        """POST /scheduling/check-availability: one bookings find, no vehicle or type lookups"""
+        body = {"date": offline_app.fleet["start"], "time": "10:30", "duration_minutes": 60}
+        query_budget.request("POST", "/api/scheduling/check-availability", json=body)
+        query_budget.request("POST", "/api/scheduling/check-availability", json=body, max_queries=1, max_http=0)
+
+    def test_mile_rates_cached(self, query_budget):
+        """GET /settings/mile-rates is served from cache once loaded"""
+        query_budget.get("/api/settings/mile-rates")
+        query_budget.get("/api/settings/mile-rates", max_queries=0)
+
+    def test_fare_zone_write_invalidates(self, query_budget, offline_app):
+        """A new fare zone is visible on the next read"""
+        before = query_budget.get("/api/settings/fare-zones").json()
+        response = offline_app.post("/api/settings/fare-zones", json={
+            "name": f"Budget Zone {uuid.uuid4().hex[:6]}", "zone_type": "dropoff", "postcodes": ["SR9"],
+        })
+        assert response.status_code == 200
+        after = query_budget.get("/api/settings/fare-zones", max_queries=1).json()
+        assert len(after) == len(before) + 1
@@ -0,0 +1,73 @@
+"""
+Straight-Line Travel Bound Tests
+Tests that POST /api/scheduling/check-travel-time decides clear-cut legs without a routing call
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+"""
+import uuid
+
+SUNDERLAND = {"lat": 54.9069, "lng": -1.3838, "precision": "address"}
+NEWCASTLE = {"lat": 54.9783, "lng": -1.6178, "precision": "address"}
+HEATHROW = {"lat": 51.4700, "lng": -0.4543, "precision": "address"}
+
+
+def add_booking(database, vehicle_id, start, pickup, dropoff, **fields):
+    booking_id = str(uuid.uuid4())
+    database.bookings.insert_one({
+        "id": booking_id, "booking_id": f"BT-{booking_id[:4]}", "vehicle_id": vehicle_id,
+        "booking_datetime": start, "duration_minutes": 60, "status": "confirmed",
+        "pickup_location": pickup[0], "pickup_coords": pickup[1],
+        "dropoff_location": dropoff[0], "dropoff_coords": dropoff[1], **fields,
+    })
+    return booking_id
+
+
+def check(query_budget, vehicle_id, booking_id, start, **budget):
+    response = query_budget.request("POST", "/api/scheduling/check-travel-time", json={
+        "vehicle_id": vehicle_id, "booking_id": booking_id, "booking_datetime": start,
+        "pickup_location": "Sunderland SR1 3LE", "duration_minutes": 60,
+    }, **budget)
+    assert response.status_code == 200
+    return response.json()
+
+
+class TestStraightLineBounds:
+    def test_unreachable_leg_needs_no_routing(self, query_budget, offline_app):
+        """Heathrow at 11:00 to Sunderland at 12:00 is impossible even in a straight line"""
+        vehicle_id = f"bounds-{uuid.uuid4().hex[:8]}"
+        add_booking(offline_app.database, vehicle_id, "2026-04-07T10:00:00",
+                    ("Central London", None), ("Heathrow Airport TW6 1EW", HEATHROW))
+        booking_id = add_booking(offline_app.database, None, "2026-04-07T12:00:00",
+                                 ("Sunderland SR1 3LE", SUNDERLAND), ("Newcastle NE1 6EE", NEWCASTLE))
+        data = check(query_budget, vehicle_id, booking_id, "2026-04-07T12:00:00", max_http=0)
+        assert data["feasible"] is False
+        conflict = data["conflicts"][0]
+        assert conflict["travel_time_estimated"] is True
+        assert conflict["travel_time_minutes"] > 200
+
+    def test_long_gap_needs_no_routing(self, query_budget, offline_app):
+        """Newcastle at 08:00 to Sunderland at 12:00 fits however slow the roads are"""
+        vehicle_id = f"bounds-{uuid.uuid4().hex[:8]}"
+        add_booking(offline_app.database, vehicle_id, "2026-04-07T07:00:00",
+                    ("Durham DH1 4RH", None), ("Newcastle NE1 6EE", NEWCASTLE))
+        booking_id = add_booking(offline_app.database, None, "2026-04-07T12:00:00",
+                                 ("Sunderland SR1 3LE", SUNDERLAND), ("Newcastle NE1 6EE", NEWCASTLE))
+        data = check(query_budget, vehicle_id, booking_id, "2026-04-07T12:00:00", max_http=0)
+        assert data["feasible"] is True and data["warnings"] == []
+
+    def test_ambiguous_leg_is_routed(self, query_budget, offline_app):
+        """A one-hour gap over ten miles is neither clearly fine nor clearly impossible"""
+        vehicle_id = f"bounds-{uuid.uuid4().hex[:8]}"
+        tag = uuid.uuid4().hex[:6]
+        add_booking(offline_app.database, vehicle_id, "2026-04-07T10:00:00",
+                    ("Durham DH1 4RH", None), (f"{tag} Newcastle NE1 6EE", NEWCASTLE))
+        booking_id = add_booking(offline_app.database, None, "2026-04-07T12:00:00",
+                                 ("Sunderland SR1 3LE", SUNDERLAND), ("Newcastle NE1 6EE", NEWCASTLE))
+        response = query_budget.request("POST", "/api/scheduling/check-travel-time", json={
+            "vehicle_id": vehicle_id, "booking_id": booking_id, "booking_datetime": "2026-04-07T12:00:00",
+            "pickup_location": "Sunderland SR1 3LE", "duration_minutes": 60,
+        }, max_http=1)
+        assert response.outbound_calls == ["google_maps"]
+        # Stub route: 20 minutes
+        assert response.json()["feasible"] is True
+        assert response.json()["conflicts"] == []
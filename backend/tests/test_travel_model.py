@@ -0,0 +1,70 @@
+"""
+Travel Model Tests
+Tests fitting drive times from cached routes, and POST /api/scheduling/auto-assign?dry_run=true
+planning with them
+
+Runs in-process against a seeded local mongod (see conftest.py), not the live deployment.
+"""
+import random
+import uuid
+from datetime import datetime
+
+from travel_model import TravelTimeModel, FittedTravelModel
+
+SUNDERLAND = {"lat": 54.9069, "lng": -1.3838}
+NEWCASTLE = {"lat": 54.9783, "lng": -1.6178}
+HEATHROW = {"lat": 51.4700, "lng": -0.4543}
+
+
+def cached_route(start, end, road_miles, minutes):
+    return {
+        "start_location": start, "end_location": end,
+        "distance_meters": road_miles * 1609.34, "duration_seconds": minutes * 60,
+        "fetched_at": datetime(2026, 3, 2, 14),
+    }
+
+
+class TestTravelTimeModel:
+    def test_fit_recovers_detour_and_speed(self):
+        """Routes at 1.4x the crow-flies distance and 30mph give back those figures"""
+        rng = random.Random(7)
+        routes = []
+        for _ in range(60):
+            end = {"lat": 54.9069 + rng.uniform(0.035, 0.065), "lng": -1.3838}
+            crow = (end["lat"] - 54.9069) * 69.0
+            routes.append(cached_route(SUNDERLAND, end, crow * 1.4, crow * 1.4 / 30 * 60))
+        model = TravelTimeModel.fit(routes)
+        assert model.samples == 60
+        assert abs(model.detour[1] - 1.4) < 0.02
+        assert abs(model.mph[1] - 30) < 0.5
+
+    def test_unknown_ends_have_no_estimate(self):
+        """Default speeds until fitted; no coordinates, no estimate"""
+        fitted = FittedTravelModel(refit_seconds=3600)
+        assert fitted.estimate_minutes(SUNDERLAND, None) is None
+        assert 15 <= fitted.estimate_minutes(SUNDERLAND, NEWCASTLE) <= 40
+
+
+class TestAutoAssignDryRun:
+    def test_plan_respects_travel_time_without_writes(self, query_budget, offline_app):
+        """A Heathrow dropoff at 11:00 can't be followed by a Sunderland pickup at 11:30 in the same vehicle"""
+        day = f"2031-0{random.randint(1, 9)}-1{random.randint(0, 9)}"
+        first, second = str(uuid.uuid4()), str(uuid.uuid4())
+        offline_app.database.bookings.insert_many([{
+            "id": first, "booking_id": f"TM-{first[:4]}", "vehicle_id": None, "status": "confirmed",
+            "booking_datetime": f"{day}T10:00:00", "duration_minutes": 60, "passenger_count": 1,
+            "pickup_location": "Terminal 5, Heathrow", "dropoff_location": "Heathrow Airport TW6 1EW",
+            "pickup_coords": HEATHROW, "dropoff_coords": HEATHROW,
+        }, {
+            "id": second, "booking_id": f"TM-{second[:4]}", "vehicle_id": None, "status": "confirmed",
+            "booking_datetime": f"{day}T11:30:00", "duration_minutes": 30, "passenger_count": 1,
+            "pickup_location": "Sunderland SR1 3LE", "dropoff_location": "Newcastle NE1 6EE",
+            "pickup_coords": SUNDERLAND, "dropoff_coords": NEWCASTLE,
+        }])
+        response = query_budget.request(
+            "POST", "/api/scheduling/auto-assign", params={"date": day, "dry_run": "true"}, max_http=0)
+        assert response.status_code == 200
+        plan = {a["booking_id"]: a["vehicle_id"] for a in response.json()["assignments"]}
+        assert plan[f"TM-{first[:4]}"] != plan[f"TM-{second[:4]}"]
+        # Nothing was assigned
+        assert offline_app.database.bookings.count_documents({"id": {"$in": [first, second]}, "vehicle_id": None}) == 2
@@ -0,0 +1,74 @@
+"""
+Straight-line travel-time bounds for CJ's Executive Travel
+
+Most dropoff -> pickup legs the travel-time check and the auto-assigner look
+at are decided before any road is considered: either the gap is so long
+that even a slow, winding drive fits, or the crow-flies distance at motorway
+speed already does not. With pickup_coords / dropoff_coords on bookings
+these bounds are a few array operations over every candidate leg at once:
+
+    lower bound  haversine / STRAIGHT_LINE_MAX_MPH
+    upper bound  haversine * MAX_DETOUR_FACTOR / SLOW_ROAD_MPH + LEG_OVERHEAD_MINUTES
+
+classify_legs() sorts legs into INFEASIBLE, CLEAR and AMBIGUOUS; only the
+ambiguous band is worth a routing lookup. A leg with an end that has no
+coordinates is always ambiguous, so bookings without coordinates behave as
+they did before.
+"""
+
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+STRAIGHT_LINE_MAX_MPH = float(os.environ.get('STRAIGHT_LINE_MAX_MPH', '70') or 70)
+SLOW_ROAD_MPH = float(os.environ.get('SLOW_ROAD_MPH', '12') or 12)
+MAX_DETOUR_FACTOR = float(os.environ.get('MAX_DETOUR_FACTOR', '2.0') or 2.0)
+LEG_OVERHEAD_MINUTES = 10.0
+
+INFEASIBLE = -1
+AMBIGUOUS = 0
+CLEAR = 1
+
+
+def coords_array(points: Sequence[Optional[dict]]) -> np.ndarray:
+    """(n, 2) lat/lng array from booking coordinate fields; missing ones are NaN"""
+    array = np.full((len(points), 2), np.nan)
+    for i, point in enumerate(points):
+        if point and point.get("lat") is not None and point.get("lng") is not None:
+            array[i] = (point["lat"], point["lng"])
+    return array
+
+
+def haversine_miles(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """Great-circle miles between lat/lng arrays of shape (..., 2); broadcasts like any ufunc"""
+    lat1, lng1 = np.radians(origins[..., 0]), np.radians(origins[..., 1])
+    lat2, lng2 = np.radians(destinations[..., 0]), np.radians(destinations[..., 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def min_drive_minutes(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """No road journey is quicker than this; 0 where either end is unknown"""
+    minutes = haversine_miles(origins, destinations) / STRAIGHT_LINE_MAX_MPH * 60
+    return np.nan_to_num(minutes, nan=0.0)
+
+
+def max_drive_minutes(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """Comfortably more than any real journey takes; inf where either end is unknown"""
+    minutes = haversine_miles(origins, destinations) * MAX_DETOUR_FACTOR / SLOW_ROAD_MPH * 60 + LEG_OVERHEAD_MINUTES
+    return np.nan_to_num(minutes, nan=np.inf)
+
+
+def classify_legs(origins: np.ndarray, destinations: np.ndarray, slack_minutes: np.ndarray,
+                  clear_margin: float = 0.0) -> np.ndarray:
+    """
+    INFEASIBLE where even the lower bound exceeds the slack, CLEAR where the
+    upper bound plus clear_margin fits inside it, AMBIGUOUS otherwise.
+    """
+    slack_minutes = np.asarray(slack_minutes, dtype=float)
+    verdicts = np.full(slack_minutes.shape, AMBIGUOUS, dtype=np.int8)
+    verdicts[max_drive_minutes(origins, destinations) + clear_margin <= slack_minutes] = CLEAR
+    verdicts[min_drive_minutes(origins, destinations) > slack_minutes] = INFEASIBLE
+    return verdicts
@@ -0,0 +1,151 @@
+"""
+Offline travel-time model for CJ's Executive Travel
+
+When the Directions API was slow or over quota the travel-time check got
+no answer and skipped the leg. TravelTimeModel predicts drive time from
+coordinates alone, and travel_time_estimate falls back to it:
+
+    minutes = crow-flies miles * detour[band] / mph[band] * 60
+
+with the crow-flies distance split into DISTANCE_BAND_EDGES bands. It is
+fitted from our own route_cache - every cached route with both end
+locations is a sample of road miles and seconds - taking medians per band.
+Bands without enough samples keep the defaults below.
+
+There is no time-of-day term: route_cache holds Directions' duration, which
+is the no-traffic time and the same whenever the route was fetched, and no
+departure time, so it says nothing about when roads are slow.
+
+travel_model refits every TRAVEL_MODEL_REFIT_SECONDS (default 3600). It makes
+no network calls, so it is also what bulk planning (auto-assign dry runs)
+uses for every leg.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+
+from route_cache import METERS_PER_MILE
+from travel_bounds import coords_array, haversine_miles, min_drive_minutes
+
+logger = logging.getLogger("cjs_travel.travel_model")
+
+TRAVEL_MODEL_REFIT_SECONDS = float(os.environ.get('TRAVEL_MODEL_REFIT_SECONDS', '3600') or 3600)
+TRAVEL_MODEL_SAMPLE_LIMIT = 20000
+MIN_SAMPLES = 5
+MIN_MINUTES = 3.0
+
+# Crow-flies miles: <2, 2-5, 5-10, 10-20, 20-50, 50+
+DISTANCE_BAND_EDGES = np.array([2.0, 5.0, 10.0, 20.0, 50.0])
+DEFAULT_DETOUR = np.array([1.45, 1.35, 1.3, 1.25, 1.2, 1.15])
+DEFAULT_MPH = np.array([14.0, 20.0, 27.0, 35.0, 45.0, 52.0])
+
+
+def distance_band(crow_miles: np.ndarray) -> np.ndarray:
+    return np.searchsorted(DISTANCE_BAND_EDGES, np.nan_to_num(crow_miles), side="right")
+
+
+class TravelTimeModel:
+    def __init__(self, detour: Optional[np.ndarray] = None, mph: Optional[np.ndarray] = None,
+                 samples: int = 0, fitted_at: Optional[datetime] = None):
+        self.detour = DEFAULT_DETOUR.copy() if detour is None else detour
+        self.mph = DEFAULT_MPH.copy() if mph is None else mph
+        self.samples = samples
+        self.fitted_at = fitted_at
+
+    @classmethod
+    def fit(cls, routes: Iterable[dict]) -> "TravelTimeModel":
+        """Medians of detour factor and road speed from route_cache documents"""
+        rows = []
+        for route in routes:
+            start, end = route.get("start_location") or {}, route.get("end_location") or {}
+            if None in (start.get("lat"), start.get("lng"), end.get("lat"), end.get("lng")):
+                continue
+            if not route.get("distance_meters") or not route.get("duration_seconds"):
+                continue
+            rows.append((start.get("lat"), start.get("lng"), end.get("lat"), end.get("lng"),
+                         route["distance_meters"], route["duration_seconds"]))
+        if not rows:
+            return cls()
+
+        samples = np.array(rows, dtype=float)
+        crow = haversine_miles(samples[:, 0:2], samples[:, 2:4])
+        road = samples[:, 4] / METERS_PER_MILE
+        mph = road / (samples[:, 5] / 3600)
+        # Same-place routes say nothing about detours
+        usable = np.isfinite(crow) & (crow > 0.1)
+        bands = distance_band(crow)
+
+        model = cls(samples=int(usable.sum()), fitted_at=datetime.now(timezone.utc))
+        for band in range(len(DEFAULT_DETOUR)):
+            in_band = usable & (bands == band)
+            if in_band.sum() < MIN_SAMPLES:
+                continue
+            model.detour[band] = np.median(road[in_band] / crow[in_band])
+            model.mph[band] = np.median(mph[in_band])
+        return model
+
+    def predict(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """Minutes for every leg (arrays of shape (..., 2), broadcast); NaN where an end has no coordinates"""
+        crow = haversine_miles(origins, destinations)
+        bands = distance_band(crow)
+        return np.maximum(crow * self.detour[bands] / self.mph[bands] * 60, MIN_MINUTES)
+
+
+class FittedTravelModel:
+    """The current model, refitted from route_cache in the background"""
+
+    def __init__(self, refit_seconds: float):
+        self.refit_seconds = refit_seconds
+        self.model = TravelTimeModel()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refit(self, database):
+        routes = await database.route_cache.find(
+            {"start_location": {"$ne": None}, "end_location": {"$ne": None}},
+            {"_id": 0, "start_location": 1, "end_location": 1, "distance_meters": 1,
+             "duration_seconds": 1},
+        ).sort("fetched_at", -1).to_list(TRAVEL_MODEL_SAMPLE_LIMIT)
+        self.model = TravelTimeModel.fit(routes)
+        logger.info(f"Travel model fitted from {self.model.samples} cached routes")
+
+    def predict(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        return self.model.predict(origins, destinations)
+
+    def leg_matrix(self, dropoffs: np.ndarray, pickups: np.ndarray) -> np.ndarray:
+        """
+        [i, j] minutes from dropoff i to pickup j, never below the straight-line
+        bound; 0 where either end is unknown, so those legs never block
+        """
+        origins, destinations = dropoffs[:, None, :], pickups[None, :, :]
+        estimate = self.predict(origins, destinations)
+        return np.nan_to_num(np.maximum(estimate, min_drive_minutes(origins, destinations)))
+
+    def estimate_minutes(self, origin: Optional[dict], destination: Optional[dict]) -> Optional[int]:
+        """One leg from {lat, lng} dicts, or None when either end is unknown"""
+        minutes = self.predict(coords_array([origin]), coords_array([destination]))[0]
+        return None if np.isnan(minutes) else round(float(minutes))
+
+    async def _poll(self, database):
+        while True:
+            await asyncio.sleep(self.refit_seconds)
+            try:
+                await self.refit(database)
+            except Exception as e:
+                logger.warning(f"Travel model refit failed: {e}")
+
+    async def start(self, database):
+        self._task = asyncio.create_task(self._poll(database))
+        await self.refit(database)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+travel_model = FittedTravelModel(TRAVEL_MODEL_REFIT_SECONDS)
@@ -97,6 +97,9 @@ const STATUS_CONFIG = {
 
 const InvoiceManagerPage = () => {
   const [invoices, setInvoices] = useState([]);
+  const [summary, setSummary] = useState({ total: 0, paid: 0, unpaid: 0, overdue: 0, outstanding_value: 0 });
+  const [nextSkip, setNextSkip] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [searchText, setSearchText] = useState("");
   const [statusFilter, setStatusFilter] = useState("all");
@@ -120,14 +123,27 @@ const InvoiceManagerPage = () => {
     booking_ids: [],
   });
 
+  // Status and search are applied by the server, so refetch from the first page when they change
   useEffect(() => {
-    fetchInvoices();
-  }, []);
+    const timer = setTimeout(() => fetchInvoices(), searchText ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [statusFilter, searchText]);
 
-  const fetchInvoices = async () => {
+  const fetchInvoices = async (skip = 0) => {
     try {
-      const response = await axios.get(`${API}/invoices`);
-      setInvoices(response.data);
+      const params = new URLSearchParams();
+      if (skip) params.append("skip", skip);
+      if (statusFilter !== "all") params.append("status", statusFilter);
+      if (searchText) params.append("search", searchText);
+
+      const [response, summaryRes] = await Promise.all([
+        axios.get(`${API}/invoices?${params.toString()}`),
+        axios.get(`${API}/invoices/summary`),
+      ]);
+      // Server pages newest-first; X-Next-Skip is set while older invoices remain
+      setNextSkip(response.headers["x-next-skip"] || null);
+      setInvoices(prev => (skip ? [...prev, ...response.data] : response.data));
+      setSummary(summaryRes.data);
     } catch (error) {
       console.error("Error fetching invoices:", error);
       toast.error("Failed to load invoices");
@@ -136,6 +152,12 @@ const InvoiceManagerPage = () => {
     }
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    await fetchInvoices(Number(nextSkip));
+    setLoadingMore(false);
+  };
+
   const fetchInvoiceDetails = async (invoiceId) => {
     setLoadingDetails(true);
     try {
@@ -195,15 +217,18 @@ const InvoiceManagerPage = () => {
       notes: invoice.notes || "",
       booking_ids: invoice.booking_ids || [],
     });
-    // Fetch bookings for this invoice if it has booking_ids
+    setEditBookings([]);
+    setShowEditModal(true);
+    // Fetch bookings for this invoice only when the edit modal opens
     if (invoice.booking_ids && invoice.booking_ids.length > 0) {
-      setEditBookings(invoice.bookings || []);
-    } else if (invoice.bookings) {
-      setEditBookings(invoice.bookings);
-    } else {
-      setEditBookings([]);
+      try {
+        const response = await axios.get(`${API}/invoices/${invoice.id}/bookings`);
+        setEditBookings(response.data);
+      } catch (error) {
+        console.error("Error fetching invoice bookings:", error);
+        toast.error("Failed to load invoice journeys");
+      }
     }
-    setShowEditModal(true);
   };
 
   const handleRemoveJourney = (bookingId) => {
@@ -296,30 +321,13 @@ const InvoiceManagerPage = () => {
     }
   };
 
-  // Filter invoices
-  const filteredInvoices = invoices.filter((invoice) => {
-    const matchesSearch = 
-      searchText === "" ||
-      invoice.invoice_ref?.toLowerCase().includes(searchText.toLowerCase()) ||
-      invoice.client_name?.toLowerCase().includes(searchText.toLowerCase()) ||
-      invoice.client_account_no?.toLowerCase().includes(searchText.toLowerCase());
-    
-    const matchesStatus = 
-      statusFilter === "all" || invoice.status === statusFilter;
-    
-    return matchesSearch && matchesStatus;
-  });
-
-  // Calculate stats
+  // Stats cover every invoice, not just the loaded pages
   const stats = {
-    total: invoices.length,
-    paid: invoices.filter(i => i.status === "paid").length,
-    unpaid: invoices.filter(i => i.status === "unpaid").length,
-    overdue: invoices.filter(i => i.status === "overdue").length,
-    totalValue: invoices.reduce((sum, i) => sum + (i.total || 0), 0),
-    outstandingValue: invoices
-      .filter(i => i.status === "unpaid" || i.status === "overdue")
-      .reduce((sum, i) => sum + (i.total || 0), 0),
+    total: summary.total,
+    paid: summary.paid,
+    unpaid: summary.unpaid,
+    overdue: summary.overdue,
+    outstandingValue: summary.outstanding_value,
   };
 
   const formatDate = (dateStr) => {
@@ -453,7 +461,7 @@ const InvoiceManagerPage = () => {
             </TableRow>
           </TableHeader>
           <TableBody>
-            {filteredInvoices.length === 0 ? (
+            {invoices.length === 0 ? (
               <TableRow>
                 <TableCell colSpan={9} className="text-center py-12">
                   <FileText className="w-12 h-12 text-slate-300 mx-auto mb-3" />
@@ -461,7 +469,7 @@ const InvoiceManagerPage = () => {
                 </TableCell>
               </TableRow>
             ) : (
-              filteredInvoices.map((invoice) => {
+              invoices.map((invoice) => {
                 const statusConfig = STATUS_CONFIG[invoice.status] || STATUS_CONFIG.unpaid;
                 const StatusIcon = statusConfig.icon;
                 const vatLabel = invoice.vat_rate === '0' ? 'No VAT' : 
@@ -582,6 +590,19 @@ const InvoiceManagerPage = () => {
             )}
           </TableBody>
         </Table>
+        {nextSkip && (
+          <div className="flex justify-center px-4 py-3 border-t">
+            <Button
+              variant="outline"
+              size="sm"
+              onClick={handleLoadMore}
+              disabled={loadingMore}
+              data-testid="load-more-invoices"
+            >
+              {loadingMore ? "Loading..." : "Load older invoices"}
+            </Button>
+          </div>
+        )}
       </div>
 
       {/* Invoice Detail Modal */}
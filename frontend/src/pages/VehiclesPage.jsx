@@ -1220,9 +1220,9 @@ const WalkaroundTab = ({ vehicles }) => {
               <div>
                 <Label className="text-muted-foreground mb-2 block">Driver Signature</Label>
                 <div className="border rounded-lg p-3 bg-slate-50">
-                  {viewCheck.signature ? (
+                  {viewCheck.signature_file_id ? (
                     <img 
-                      src={viewCheck.signature} 
+                      src={`${API}/walkaround-checks/${viewCheck.id}/signature`} 
                       alt="Driver Signature" 
                       className="max-h-24 object-contain"
                     />
@@ -23,6 +23,8 @@ const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
 const WalkaroundCertificatesPage = () => {
   const [certificates, setCertificates] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [vehicles, setVehicles] = useState([]);
   const [drivers, setDrivers] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -69,9 +71,10 @@ const WalkaroundCertificatesPage = () => {
     }
   };
 
-  const fetchCertificates = async () => {
+  const fetchCertificates = async (cursor = null) => {
     try {
       const params = new URLSearchParams();
+      if (cursor) params.append("before", cursor);
       if (selectedVehicle) params.append("vehicle_id", selectedVehicle);
       if (selectedDriver) params.append("driver_id", selectedDriver);
       if (dateFrom) params.append("date_from", format(dateFrom, "yyyy-MM-dd"));
@@ -79,8 +82,14 @@ const WalkaroundCertificatesPage = () => {
       if (searchQuery) params.append("search", searchQuery);
 
       const response = await axios.get(`${API}/walkaround-checks?${params.toString()}`);
-      setCertificates(response.data || []);
-      setCurrentPage(1);
+      // Server pages newest-first; X-Next-Cursor is set while older checks remain
+      setNextCursor(response.headers["x-next-cursor"] || null);
+      if (cursor) {
+        setCertificates(prev => [...prev, ...(response.data || [])]);
+      } else {
+        setCertificates(response.data || []);
+        setCurrentPage(1);
+      }
     } catch (error) {
       console.error("Error fetching certificates:", error);
       toast.error("Failed to load certificates");
@@ -91,6 +100,12 @@ const WalkaroundCertificatesPage = () => {
     fetchCertificates();
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    await fetchCertificates(nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleViewPdf = async (certificate) => {
     setViewingPdf(certificate);
     setLoadingPdf(true);
@@ -449,6 +464,21 @@ const WalkaroundCertificatesPage = () => {
                   </div>
                 </div>
               )}
+
+              {nextCursor && (
+                <div className="flex justify-center px-4 py-3 border-t border-[#3d3d3d]">
+                  <Button
+                    variant="outline"
+                    size="sm"
+                    onClick={handleLoadMore}
+                    disabled={loadingMore}
+                    className="bg-[#1a1a1a] border-[#3d3d3d]"
+                    data-testid="load-more-certificates"
+                  >
+                    {loadingMore ? "Loading..." : "Load older certificates"}
+                  </Button>
+                </div>
+              )}
             </>
           )}
         </CardContent>